@@ -3,24 +3,39 @@
 # DON'T CHANGE THIS FILE UNLESS YOU KNOW WHAT YOU'RE DOING
 #
 
-from mutua.utils import (
+from mutua.utils.core import startup
+
+# Profiles the imports below and the startup phases when SDS_STARTUP_PROFILE=1
+startup.start_profiling()
+
+from mutua.utils import (  # noqa: E402
     Config,
     Logger,
 )
+from mutua.utils.core.sharding import (  # noqa: E402
+    get_task_count,
+    get_task_index,
+)
 
 this_package = globals()["__package__"]
 
-Config.initialize(this_package)
-Logger.initialize(this_package)
+with startup.profile_phase("CONFIG_INITIALIZE"):
+    Config.initialize(this_package)
+with startup.profile_phase("LOGGER_INITIALIZE"):
+    Logger.initialize(this_package)
 
 
 def entrypoint() -> str:
     status_code: str = "OK"
     try:
-        Logger.sys("START")
-        from .main import main
-
-        main()
+        # main() can split its work between the tasks and the CPUs with mutua.utils.core.sharding.run_sharded().
+        # Set CLOUD_RUN_TASK_INDEX and CLOUD_RUN_TASK_COUNT to simulate a task locally.
+        Logger.sys("START", task_index=get_task_index(), task_count=get_task_count())
+        with startup.profile_phase("MAIN_IMPORT"):
+            from .main import main
+
+        with startup.profile_phase("FIRST_MAIN"):
+            main()
     except Exception as e:
         import traceback
 
@@ -28,8 +43,12 @@ def entrypoint() -> str:
         Logger.error(traceback.format_exc())
         status_code = "ERR"
     finally:
+        startup.finish_profiling()
         Logger.sys("FINISH", status_code=status_code)
 
+        # Write the log entries still queued by the async logging mode
+        Logger.shutdown()
+
     return status_code
 
 
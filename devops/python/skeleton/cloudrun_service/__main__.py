@@ -0,0 +1,80 @@
+#
+# THIS FILE IS PRODUCED BY 'sds module create'
+# DON'T CHANGE THIS FILE UNLESS YOU KNOW WHAT YOU'RE DOING
+#
+
+import math
+import os
+
+from mutua.utils.core import startup
+
+# Profiles the imports below and the startup phases when SDS_STARTUP_PROFILE=1,
+# until the first request handled (in every worker process)
+startup.start_profiling()
+
+from mutua.utils import (  # noqa: E402
+    Config,
+    Logger,
+)
+from mutua.utils.core.asgi import ServiceApp  # noqa: E402
+from mutua.utils.core.runtime import get_worker_count  # noqa: E402
+
+this_package = globals()["__package__"]
+
+# Executed by every worker process, since the workers import this module to create the app
+with startup.profile_phase("CONFIG_INITIALIZE"):
+    Config.initialize(this_package)
+with startup.profile_phase("LOGGER_INITIALIZE"):
+    Logger.initialize(this_package)
+
+
+def create_app() -> ServiceApp:
+    """Create the ASGI application of the service: the app of main.py with the health endpoint and request logging."""
+    with startup.profile_phase("MAIN_IMPORT"):
+        from . import main
+
+    return ServiceApp(
+        main.app,
+        health_path=Config.get("server.health_path", "/health"),
+        on_startup=getattr(main, "on_startup", None),
+        on_shutdown=getattr(main, "on_shutdown", None),
+    )
+
+
+def entrypoint() -> None:
+    import uvicorn
+
+    # One worker process per CPU of the container quota, unless configured
+    workers = get_worker_count(Config.get("server.workers", None))
+
+    # The requests Cloud Run sends to the instance at once, split between the workers.
+    # Requests over the limit are answered with a 503 instead of queuing.
+    concurrency = Config.get("server.concurrency", None)
+    limit_concurrency = math.ceil(int(concurrency) / workers) if concurrency else None
+
+    Logger.sys("START", workers=workers, limit_concurrency=limit_concurrency)
+
+    uvicorn.run(
+        # The workers are separate processes, which create the app by importing this module
+        f"{this_package}.__main__:create_app" if workers > 1 else create_app(),
+        factory=workers > 1,
+        host=Config.get("server.host", "0.0.0.0"),
+        port=int(os.environ.get("PORT", Config.get("server.port", 8080))),
+        workers=workers,
+        limit_concurrency=limit_concurrency,
+        backlog=int(Config.get("server.backlog", 2048)),
+        # Longer than the idle timeout of the Google front end, so it never reuses a closed connection
+        timeout_keep_alive=int(Config.get("server.keep_alive_seconds", 620)),
+        # Cloud Run kills the instance 10 seconds after SIGTERM: in-flight requests get most of them
+        timeout_graceful_shutdown=int(Config.get("server.graceful_shutdown_seconds", 8)),
+        # Requests are logged by ServiceApp, with the Logger
+        access_log=False,
+        log_level=Config.get("server.log_level", "warning"),
+    )
+
+    Logger.sys("FINISH")
+    Logger.shutdown()
+
+
+if __name__ == "__main__":
+    entrypoint()
@@ -0,0 +1,102 @@
+"""Local load test of the service: measures the throughput (req/s) and the latency percentiles.
+
+Start the service, then run:
+
+    python loadtest.py --url http://127.0.0.1:8080/ --connections 64 --duration 10
+
+Each connection sends its requests one after the other over a keep-alive HTTP/1.1 connection,
+like the Cloud Run front end does. Only the standard library is used.
+"""
+
+import argparse
+import asyncio
+import math
+import time
+from typing import (
+    List,
+    Tuple,
+)
+from urllib.parse import urlsplit
+
+
+async def run_connection(host: str, port: int, request: bytes, deadline: float, latencies: List[float]) -> int:
+    """Send requests over one connection until the deadline. Returns the number of errors."""
+    errors = 0
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start_time = time.perf_counter()
+            writer.write(request)
+
+            status_line = await reader.readline()
+            if not status_line:
+                errors += 1
+                break
+
+            content_length = 0
+            while True:
+                header_line = await reader.readline()
+                if header_line in (b"\r\n", b""):
+                    break
+                name, _, value = header_line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    content_length = int(value.strip())
+            await reader.readexactly(content_length)
+
+            latencies.append(time.perf_counter() - start_time)
+            if status_line.split(b" ", 2)[1] != b"200":
+                errors += 1
+    finally:
+        writer.close()
+    return errors
+
+
+def get_percentile(sorted_values: List[float], quantile: float) -> float:
+    return sorted_values[max(0, math.ceil(quantile * len(sorted_values)) - 1)]
+
+
+async def run_load_test(url: str, connections: int, duration: float) -> Tuple[int, int, List[float]]:
+    url_parts = urlsplit(url)
+    host = url_parts.hostname or "127.0.0.1"
+    port = url_parts.port or 80
+    path = url_parts.path or "/"
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+
+    latencies: List[float] = []
+    deadline = time.perf_counter() + duration
+    results = await asyncio.gather(
+        *(run_connection(host, port, request, deadline, latencies) for _ in range(connections)),
+        return_exceptions=True,
+    )
+    errors = sum(result if isinstance(result, int) else 1 for result in results)
+    return len(latencies), errors, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local load test of the service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/", help="The URL requested")
+    parser.add_argument("--connections", type=int, default=64, help="The number of concurrent connections")
+    parser.add_argument("--duration", type=float, default=10, help="The duration of the test, in seconds")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    request_count, error_count, latencies = asyncio.run(run_load_test(args.url, args.connections, args.duration))
+    elapsed_seconds = time.perf_counter() - start_time
+
+    if not latencies:
+        print(f"No response from {args.url} ({error_count} errors)")
+        return
+
+    latencies.sort()
+    print(f"Requests:   {request_count} in {elapsed_seconds:.1f}s with {args.connections} connections")
+    print(f"Throughput: {request_count / elapsed_seconds:.0f} req/s")
+    print(
+        f"Latency:    p50 {get_percentile(latencies, 0.5) * 1000:.2f} ms, "
+        f"p99 {get_percentile(latencies, 0.99) * 1000:.2f} ms, "
+        f"max {latencies[-1] * 1000:.2f} ms"
+    )
+    print(f"Errors:     {error_count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import json
+
+from mutua.utils import Logger
+
+
+async def on_startup() -> None:
+    """Called once per worker process before it accepts requests (e.g. to open connection pools)."""
+
+
+async def on_shutdown() -> None:
+    """Called once per worker process after the in-flight requests are drained (e.g. to close connection pools)."""
+
+
+async def app(scope, receive, send) -> None:
+    """The ASGI application of the service.
+
+    Replace it by the application of any ASGI framework (FastAPI, Starlette, etc...). The health
+    endpoint and the request logging are added by the entrypoint.
+    """
+    Logger.debug("Handling %s", scope["path"])
+
+    body = json.dumps({"service": "ready"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
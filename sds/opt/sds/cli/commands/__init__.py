@@ -0,0 +1,28 @@
+"""
+Registry of the sds commands.
+
+A command module is imported only when the command is invoked, so the startup
+time of the CLI doesn't grow with the number of commands. The help of every
+command is listed here, so 'sds --help' stays complete without importing them.
+
+To add a command, create its package with a register(subparsers) function and
+add it below. Its register() reads its help from here, with get_help().
+"""
+
+# (name, help, module), in the order shown by 'sds --help'
+COMMANDS = [
+    ('version', 'Shows the version of the environment', 'commands.version'),
+    ('status', 'Shows the environment status', 'commands.status'),
+    ('repo', 'Repository operations', 'commands.repo'),
+    ('service', 'Service operations', 'commands.service'),
+    ('config', 'Configuration management', 'commands.config'),
+]
+
+def get_help(name):
+    """
+    Returns the help of a command, as listed in COMMANDS.
+    """
+    for command_name, help_text, _ in COMMANDS:
+        if command_name == name:
+            return help_text
+    raise KeyError(f"Unknown command: {name}")
@@ -1,7 +1,8 @@
+from commands import get_help
 from .edit import run_config_edit
 
 def register(subparsers):
-    config_parser = subparsers.add_parser('config', help='Configuration management')
+    config_parser = subparsers.add_parser('config', help=get_help('config'))
     config_subparsers = config_parser.add_subparsers(dest='config_subcommand', help='Config subcommands')
     
     # sds config edit
@@ -1,7 +1,7 @@
 import os
 import sys
 import subprocess
-from utils import BLUE, RESET, run_git, GREEN, RED
+from utils import BLUE, RESET, run_git, GREEN, RED, YELLOW, CONFIG_RELATIVE_PATH, validate_config
 
 def run_config_edit(args):
     """
@@ -11,7 +11,7 @@ def run_config_edit(args):
     repo_root = run_git(['git', 'rev-parse', '--show-toplevel'], "Identifying repository root")
     
     # Configuration file is always at [REPO_ROOT]/devops/sds/etc/sds.conf
-    config_path = os.path.join(repo_root, "devops/sds/etc/sds.conf")
+    config_path = os.path.join(repo_root, CONFIG_RELATIVE_PATH)
     
     print(f"\n{BLUE}SDS Configuration File{RESET}")
     print(f"Path: {config_path}\n")
@@ -27,17 +27,7 @@ def run_config_edit(args):
         # Validation
         print(f"\n{BLUE}Validating configuration{RESET}")
         
-        sds_root = os.path.join(repo_root, "devops/sds")
-        validation_script = os.path.join(sds_root, "bootstrap/sds-check-config.sh")
-        
-        # Prepare environment for the validation script
-        env = os.environ.copy()
-        env["SDS_SDS_ROOT_PATH_IN_HOST"] = sds_root
-        # Add the SDS utilities folder to the PATH so sds-check-config.sh can find printf_color
-        sds_utils_path = os.path.join(sds_root, "opt/sds")
-        env["PATH"] = f"{env.get('PATH', '')}:{sds_utils_path}"
-        
-        result = subprocess.run(['bash', validation_script], env=env, capture_output=True, text=True)
+        result = validate_config(repo_root)
         
         if result.returncode == 0:
             print(f"  - sds-check-config.sh....................... {GREEN}PASSED{RESET}")
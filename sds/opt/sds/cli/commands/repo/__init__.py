@@ -1,7 +1,8 @@
+from commands import get_help
 from . import merge as merge_cmd
 
 def register(subparsers):
-    repo_parser = subparsers.add_parser('repo', help='Repository operations')
+    repo_parser = subparsers.add_parser('repo', help=get_help('repo'))
     repo_subparsers = repo_parser.add_subparsers(dest='subcommand', help='Repo subcommands')
     
     # Register sub-subcommands
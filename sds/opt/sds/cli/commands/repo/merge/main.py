@@ -1,12 +1,62 @@
 import os
 import sys
 import subprocess
-from utils import GREEN, RED, RESET, YELLOW, BLUE, print_aligned, run_git
+import time
+from utils import GREEN, RED, RESET, YELLOW, BLUE, print_aligned, run_command, run_git
+
+def get_worktree_of_branch(branch):
+    """
+    Returns the path of the worktree where a branch is checked out, or None.
+    """
+    output = run_command(['git', 'worktree', 'list', '--porcelain']) or ''
+    worktree_path = None
+    for line in output.splitlines():
+        if line.startswith('worktree '):
+            worktree_path = line[len('worktree '):]
+        elif line == f"branch refs/heads/{branch}":
+            return worktree_path
+    return None
+
+def update_main_from_origin():
+    """
+    Fast-forwards the local 'main' branch to 'origin/main', without checking it out.
+    Only the ref moves: the working tree isn't touched, so the file mtimes (and the build caches) are kept.
+    """
+    main_worktree = get_worktree_of_branch('main')
+    if main_worktree is not None:
+        # Moving the branch under its worktree would leave the worktree out of sync with it
+        raise RuntimeError(f"'main' is checked out in the worktree '{main_worktree}'. Update it there with 'git pull --ff-only'.")
+
+    origin_main = run_git(['git', 'rev-parse', '--verify', 'refs/remotes/origin/main'], "  - Resolving origin/main", show_time=True)
+    local_main = run_command(['git', 'rev-parse', '--verify', '--quiet', 'refs/heads/main'])
+
+    if local_main is None:
+        run_git(['git', 'branch', 'main', origin_main], "  - Creating local main", show_time=True)
+        return
+    if local_main == origin_main:
+        print_aligned("  - Updating local main")
+        print(f"{GREEN}UP TO DATE{RESET}")
+        return
+
+    # Same check as 'git merge --ff-only': local main must not have commits missing from origin/main
+    is_fast_forward = subprocess.run(['git', 'merge-base', '--is-ancestor', local_main, origin_main], capture_output=True).returncode == 0
+    if not is_fast_forward:
+        print_aligned("  - Updating local main")
+        print(f"{RED}ERROR{RESET}")
+        raise RuntimeError("Local 'main' has commits that aren't in 'origin/main', so it can't be fast-forwarded.")
+
+    # The old value makes the update atomic: it fails if main moved since it was read
+    run_git(
+        ['git', 'update-ref', '-m', 'sds repo merge main: fast-forward to origin/main', 'refs/heads/main', origin_main, local_main],
+        "  - Updating local main", show_time=True,
+    )
 
 def run_repo_merge_main(args):
     """
     Merges the latest changes from the 'main' branch into the current branch.
     """
+    start_time = time.perf_counter()
+
     # Identify current branch
     current_branch = run_git(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], "Identifying current branch")
     
@@ -18,17 +68,15 @@ def run_repo_merge_main(args):
     
     try:
         # 1. Fetch latest status from origin
-        run_git(['git', 'fetch', 'origin'], "  - Fetching from origin")
+        run_git(['git', 'fetch', 'origin'], "  - Fetching from origin", show_time=True)
         
-        # 2. Update local main branch to match origin/main
-        run_git(['git', 'checkout', 'main'], "  - Switching to main")
-        run_git(['git', 'merge', 'origin/main', '--ff-only'], "  - Updating local main")
+        # 2. Update local main branch to match origin/main, without switching to it
+        update_main_from_origin()
         
-        # 3. Switch back and merge
-        run_git(['git', 'checkout', current_branch], f"  - Switching back to '{current_branch}'")
-        run_git(['git', 'merge', 'main'], f"  - Merging 'main' into '{current_branch}'")
+        # 3. Merge into the current branch
+        run_git(['git', 'merge', 'main'], f"  - Merging 'main' into '{current_branch}'", show_time=True)
             
-        print(f"\n{GREEN}Repo merge main completed successfully.{RESET}")
+        print(f"\n{GREEN}Repo merge main completed successfully in {time.perf_counter() - start_time:.1f}s.{RESET}")
         
     finally:
         # Robust restoration: ensure we are back on the original branch regardless of errors
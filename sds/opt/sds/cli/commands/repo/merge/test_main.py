@@ -0,0 +1,93 @@
+import os
+import subprocess
+
+import pytest
+
+from commands.repo.merge.main import update_main_from_origin
+
+def git(*args, cwd=None):
+    return subprocess.run(
+        ['git', '-c', 'user.name=sds', '-c', 'user.email=sds@example.com', *args],
+        cwd=cwd, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+def commit_file(repo, name, content):
+    (repo / name).write_text(content)
+    git('add', name, cwd=repo)
+    git('commit', '-q', '-m', f"Change {name}", cwd=repo)
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """
+    A clone on the branch 'feature', whose 'origin/main' is one commit ahead of its local 'main'.
+    """
+    git('init', '-q', '--bare', '-b', 'main', str(tmp_path / 'origin.git'))
+    other_path = tmp_path / 'other'
+    git('clone', '-q', str(tmp_path / 'origin.git'), str(other_path))
+    commit_file(other_path, 'README.md', 'first')
+    git('push', '-q', 'origin', 'HEAD:main', cwd=other_path)
+
+    clone_path = tmp_path / 'clone'
+    git('clone', '-q', str(tmp_path / 'origin.git'), str(clone_path))
+    git('checkout', '-q', '-b', 'feature', cwd=clone_path)
+    commit_file(clone_path, 'feature.py', 'feature')
+
+    commit_file(other_path, 'README.md', 'second')
+    git('push', '-q', 'origin', 'HEAD:main', cwd=other_path)
+    git('fetch', '-q', 'origin', cwd=clone_path)
+    monkeypatch.chdir(clone_path)
+    return clone_path
+
+def get_ref(repo, ref):
+    return git('rev-parse', ref, cwd=repo)
+
+def test_main_is_fast_forwarded_without_touching_the_working_tree(repo):
+    head = get_ref(repo, 'HEAD')
+    mtimes = {name: os.stat(repo / name).st_mtime_ns for name in ['README.md', 'feature.py']}
+
+    update_main_from_origin()
+
+    assert get_ref(repo, 'refs/heads/main') == get_ref(repo, 'refs/remotes/origin/main')
+    assert 'fast-forward to origin/main' in git('reflog', '-1', 'main', cwd=repo)
+    assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=repo) == 'feature'
+    assert get_ref(repo, 'HEAD') == head
+    assert git('status', '--porcelain', cwd=repo) == ''
+    assert (repo / 'README.md').read_text() == 'first'
+    assert {name: os.stat(repo / name).st_mtime_ns for name in mtimes} == mtimes
+
+def test_main_already_up_to_date_is_left_as_is(repo, capsys):
+    update_main_from_origin()
+    main = get_ref(repo, 'refs/heads/main')
+
+    update_main_from_origin()
+
+    assert get_ref(repo, 'refs/heads/main') == main
+    assert 'UP TO DATE' in capsys.readouterr().out
+
+def test_missing_main_is_created_from_origin(repo):
+    git('branch', '-q', '-D', 'main', cwd=repo)
+
+    update_main_from_origin()
+
+    assert get_ref(repo, 'refs/heads/main') == get_ref(repo, 'refs/remotes/origin/main')
+    assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=repo) == 'feature'
+
+def test_diverged_main_is_not_updated(repo):
+    git('checkout', '-q', 'main', cwd=repo)
+    commit_file(repo, 'local.py', 'local')
+    git('checkout', '-q', 'feature', cwd=repo)
+    main = get_ref(repo, 'refs/heads/main')
+
+    with pytest.raises(RuntimeError, match="can't be fast-forwarded"):
+        update_main_from_origin()
+
+    assert get_ref(repo, 'refs/heads/main') == main
+
+def test_main_checked_out_in_another_worktree_is_not_updated(repo, tmp_path):
+    git('worktree', 'add', '-q', str(tmp_path / 'main-worktree'), 'main', cwd=repo)
+    main = get_ref(repo, 'refs/heads/main')
+
+    with pytest.raises(RuntimeError, match="checked out in the worktree"):
+        update_main_from_origin()
+
+    assert get_ref(repo, 'refs/heads/main') == main
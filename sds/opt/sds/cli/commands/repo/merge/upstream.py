@@ -1,7 +1,7 @@
 import os
 import sys
 import subprocess
-from utils import GREEN, RED, RESET, YELLOW, BLUE, print_aligned, run_git
+from utils import GREEN, RED, RESET, YELLOW, BLUE, fetch_remotes, print_aligned, run_git
 
 def run_repo_merge_upstream(args=None):
     """
@@ -9,7 +9,7 @@ def run_repo_merge_upstream(args=None):
     
     This function performs the following steps:
     1. Ensures the 'upstream' remote is configured.
-    2. Fetches the latest changes from upstream.
+    2. Fetches the latest changes from upstream, and from origin to push to it.
     3. Merges 'upstream/main' into the local branch (fast-forward only).
     4. Pushes the updated branch to 'origin'.
     """
@@ -32,9 +32,9 @@ def run_repo_merge_upstream(args=None):
         print(f"\nError checking remotes: {e}", file=sys.stderr)
         sys.exit(1)
     
-    # 2. Fetches the latest changes from upstream.
+    # 2. Fetches the latest changes from upstream, and from origin to push to it, at the same time.
     print(f"\n{BLUE}Fetching updates from upstream{RESET}")
-    run_git(['git', 'fetch', 'upstream'], "  - git fetch upstream")
+    fetch_remotes(['upstream', 'origin'])
 
     # 3. Merges 'upstream/main' into the local branch (fast-forward only).
     print(f"\n{BLUE}Merging updated from upstream into local branch{RESET}")
@@ -1,9 +1,10 @@
+from commands import get_help
 from . import list as list_cmd
 from . import build as build_cmd
 from . import deploy as deploy_cmd
 
 def register(subparsers):
-    service_parser = subparsers.add_parser('service', help='Service operations')
+    service_parser = subparsers.add_parser('service', help=get_help('service'))
     service_subparsers = service_parser.add_subparsers(dest='subcommand', help='Service subcommands')
 
     # Register sub-subcommands
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+class DeployBackend(ABC):
+    """
+    Runs the stages of the deployment of a service. Subclass it to deploy with another tool.
+    """
+
+    def __init__(self, repo_root, cache_dir):
+        self.repo_root = repo_root
+        self.cache_dir = cache_dir
+
+    @abstractmethod
+    def run_stage(self, stage, service, source_tag, destination_env):
+        """
+        Runs a stage of the deployment of a service. Raises an exception if it fails.
+        Called from several threads at once, for different services.
+        """
+
+class MakeDeployBackend(DeployBackend):
+    """
+    Runs the stages with the Makefile of the service: 'make publish', 'make deploy' and 'make verify'.
+    """
+
+    def run_stage(self, stage, service, source_tag, destination_env):
+        result = subprocess.run(
+            [
+                'make', '-C', os.path.join(self.repo_root, service['path']), stage,
+                f"SDS_SERVICE_NAME={service['name']}",
+                f"SDS_SERVICE_TYPE={service['type']}",
+                f"SDS_SOURCE_TAG={source_tag}",
+                f"SDS_DESTINATION_ENV={destination_env}",
+            ],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"'make {stage}' failed:\n{result.stdout}{result.stderr}")
+
+class LocalDeployBackend(DeployBackend):
+    """
+    Deploys nothing: records the stages in .git/sds/local_deploys.log, one JSON object per line.
+    A stand-in for trying a release, or testing the pipeline.
+    """
+
+    LOG_FILE_NAME = 'local_deploys.log'
+
+    def __init__(self, repo_root, cache_dir):
+        super().__init__(repo_root, cache_dir)
+        self.log_path = os.path.join(cache_dir, self.LOG_FILE_NAME)
+        self._lock = threading.Lock()
+
+    def run_stage(self, stage, service, source_tag, destination_env):
+        entry = {
+            'stage': stage,
+            'service': service['path'],
+            'source_tag': source_tag,
+            'destination_env': destination_env,
+            'at': datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.log_path, 'a') as log_file:
+                log_file.write(json.dumps(entry) + '\n')
+
+# The backends selected with 'sds service deploy --backend'
+BACKENDS = {
+    'make': MakeDeployBackend,
+    'local': LocalDeployBackend,
+}
@@ -1,12 +1,175 @@
+import hashlib
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from utils import (
+    BLUE, GREEN, RED, RESET, YELLOW,
+    get_repo_paths, load_cache, print_aligned, run_command, run_git, save_cache,
+)
+from .index import get_services, load_index, record_build
+
+# The sources shared by every service: a change in them rebuilds all the services
+SHARED_INPUT_PATHS = ['src/py/sds/core', 'src/py/3rdparty']
+
+# Builds a service from its directory. Part of the input hash, so changing it rebuilds everything.
+BUILD_COMMAND = ['pants', 'package']
+
+BUILD_CACHE_FILE_NAME = 'builds.json'
+# The number of builds remembered by the cache, the oldest are forgotten first
+BUILD_CACHE_SIZE = 1000
+
 def register(subparsers):
     build_parser = subparsers.add_parser('build', help='Build a service')
-    build_parser.add_argument('service_name', help='Name of the service to build')
+    build_parser.add_argument('service_name', help="Name of the service to build, or 'all' for every service")
     build_parser.add_argument('branch_name', nargs='?', default='main', help='Branch to build from (default: main)')
+    build_parser.add_argument('--force', action='store_true', help='Build even the services whose inputs are unchanged')
     build_parser.set_defaults(func=run_service_build)
     return build_parser
 
+def get_input_hash(commit, service_path):
+    """
+    Returns the hash of the inputs of a service at a commit: its sources and the shared sources.
+    Git already knows the hash of every file, so nothing is read from the disk.
+    """
+    output = run_command(['git', 'ls-tree', '-r', '--full-tree', commit, '--', service_path, *SHARED_INPUT_PATHS])
+    if output is None:
+        return None
+    # The files of the service, without the shared ones
+    if not any(line.split('\t', 1)[1].startswith(f"{service_path}/") for line in output.splitlines()):
+        return None
+    input_hash = hashlib.sha256(' '.join(BUILD_COMMAND).encode())
+    input_hash.update(output.encode())
+    return input_hash.hexdigest()
+
+def is_clean_checkout(repo_root, commit, paths):
+    """
+    Returns whether the working tree has the inputs of the commit, so it can be built in place.
+    """
+    head = run_command(['git', 'rev-parse', 'HEAD'])
+    if head != commit:
+        return False
+    return run_command(['git', '--no-optional-locks', 'status', '--porcelain', '--', *paths]) == ''
+
+def build_services(services, build_root):
+    """
+    Builds services with a single Pants run, and returns whether it succeeded, the time it took and the build output.
+    Pants builds the targets in parallel itself, while concurrent runs would only queue up behind pantsd.
+    """
+    start_time = time.perf_counter()
+    try:
+        result = subprocess.run(
+            [*BUILD_COMMAND, *(f"{service['path']}::" for service in services)],
+            cwd=build_root, capture_output=True, text=True,
+        )
+        succeeded, output = result.returncode == 0, result.stdout + result.stderr
+    except OSError as e:
+        succeeded, output = False, str(e)
+    return succeeded, time.perf_counter() - start_time, output
+
+def build_batch(services, build_root):
+    """
+    Builds services with a single Pants run, and returns the (succeeded, seconds, output, batch_size) of each service.
+    Pants neither times its targets nor says which ones failed: when the run fails, the services are built one by
+    one to find the failed ones, and the services Pants already built come from its cache. The seconds of a service
+    are the time of the run that built it, shared by the batch_size services of that run.
+    """
+    succeeded, elapsed_seconds, output = build_services(services, build_root)
+    if succeeded or len(services) == 1:
+        return [(succeeded, elapsed_seconds, output, len(services)) for _ in services]
+    print(f"{YELLOW}The build failed, building the services one by one to find the failed ones{RESET}")
+    return [(*build_services([service], build_root), 1) for service in services]
+
+def select_services(service_name):
+    services = get_services(load_index())
+    if service_name == 'all':
+        return services
+    selected = [service for service in services if service['name'] == service_name]
+    if not selected:
+        raise RuntimeError(f"Unknown service '{service_name}'. Run 'sds service list' to see the services.")
+    return selected
+
 def run_service_build(args):
     """
-    Handles the service build command.
+    Builds the services whose inputs changed since their last successful build, with a single Pants run.
     """
-    print("Not implemented yet.")
+    # Imported here, since only a build pays for it (it imports logging)
+    from concurrent.futures import ThreadPoolExecutor
+
+    repo_root, cache_dir = get_repo_paths()
+    if repo_root is None:
+        raise RuntimeError("Not in a git repository")
+
+    services = select_services(args.service_name)
+    commit = run_git(['git', 'rev-parse', '--verify', f"{args.branch_name}^{{commit}}"], f"Resolving branch '{args.branch_name}'")
+
+    # 1. Hash the inputs of the services, and skip the ones already built
+    print(f"\n{BLUE}Checking the inputs of {len(services)} services{RESET}")
+    cache_path = os.path.join(cache_dir, BUILD_CACHE_FILE_NAME)
+    build_cache = load_cache(cache_path) or {}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        input_hashes = list(executor.map(lambda service: get_input_hash(commit, service['path']), services))
+
+    to_build = []
+    for service, input_hash in zip(services, input_hashes):
+        print_aligned(f"  - {service['name']}")
+        if input_hash is None:
+            print(f"{YELLOW}NOT IN BRANCH{RESET}")
+        elif input_hash in build_cache and not args.force:
+            print(f"{GREEN}UNCHANGED{RESET}")
+        else:
+            print(f"{YELLOW}CHANGED{RESET}")
+            to_build.append((service, input_hash))
+
+    if not to_build:
+        print(f"\n{GREEN}All services are up to date.{RESET}")
+        return
+
+    # 2. Build the changed services, from a worktree of the branch unless it's checked out
+    build_root = repo_root
+    worktree_path = None
+    if not is_clean_checkout(repo_root, commit, [service['path'] for service, _ in to_build] + SHARED_INPUT_PATHS):
+        worktree_path = os.path.join(cache_dir, 'worktrees', commit)
+        run_git(['git', 'worktree', 'add', '--force', '--detach', worktree_path, commit], f"Checking out '{args.branch_name}' in a worktree")
+        build_root = worktree_path
+
+    print(f"\n{BLUE}Building {len(to_build)} services{RESET}")
+    start_time = time.perf_counter()
+    failed_outputs = []
+    try:
+        results = build_batch([service for service, _ in to_build], build_root)
+        built_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+        for (service, input_hash), (succeeded, elapsed_seconds, output, batch_size) in zip(to_build, results):
+            print_aligned(f"  - {service['name']}")
+            if not succeeded:
+                print(f"{RED}FAILED{RESET}")
+                if output not in failed_outputs:
+                    failed_outputs.append(output)
+                continue
+
+            print(f"{GREEN}BUILT{RESET}")
+            build = {
+                'service': service['path'],
+                'branch': args.branch_name,
+                'commit': commit,
+                'built_at': built_at,
+                'seconds': round(elapsed_seconds, 3),
+                'batch_size': batch_size,
+            }
+            build_cache[input_hash] = build
+            record_build(cache_dir, repo_root, service['path'], build)
+    finally:
+        # Dicts keep their insertion order: the first entries are the oldest builds
+        for input_hash in list(build_cache)[:-BUILD_CACHE_SIZE]:
+            del build_cache[input_hash]
+        save_cache(cache_path, build_cache)
+        if worktree_path is not None:
+            run_command(['git', 'worktree', 'remove', '--force', worktree_path])
+
+    elapsed_seconds = time.perf_counter() - start_time
+    if failed_outputs:
+        print(f"\n{RED}Build output:{RESET}\n" + '\n'.join(failed_outputs), file=sys.stderr)
+        sys.exit(1)
+    print(f"\nBuilt {len(to_build)} services in {elapsed_seconds:.1f}s")
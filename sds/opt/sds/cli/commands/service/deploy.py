@@ -1,13 +1,236 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from utils import (
+    BLUE, GREEN, RED, RESET, YELLOW,
+    get_repo_paths, load_cache, print_aligned, save_cache,
+)
+from .backends import BACKENDS
+from .index import get_services, load_index
+
+# The stages of the deployment of a service, in order
+STAGES = ['publish', 'deploy', 'verify']
+
+DEFAULT_JOBS = 4
+
+# The states of the releases, to resume them
+RELEASES_DIRECTORY_NAME = 'deploys'
+
 def register(subparsers):
     deploy_parser = subparsers.add_parser('deploy', help='Deploy a service')
-    deploy_parser.add_argument('service_name', help='Name of the service to deploy')
-    deploy_parser.add_argument('source_tag', help='Source tag/version to deploy')
-    deploy_parser.add_argument('destination_env', help='Destination environment (e.g., staging, production)')
+    deploy_parser.add_argument('service_name', nargs='?', help='Name of the service to deploy, or a comma separated list of services')
+    deploy_parser.add_argument('source_tag', nargs='?', help='Source tag/version to deploy')
+    deploy_parser.add_argument('destination_env', nargs='?', help='Destination environment (e.g., staging, production)')
+    deploy_parser.add_argument('--manifest', help='Release manifest (JSON) listing the services to deploy, instead of the arguments')
+    deploy_parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help=f"Number of services deployed at once (default: {DEFAULT_JOBS})")
+    deploy_parser.add_argument('--on-error', choices=['stop', 'continue'], default='stop', help='Stop starting new deployments after a failure, or deploy the other services anyway (default: stop)')
+    deploy_parser.add_argument('--restart', action='store_true', help='Deploy every service again, instead of resuming the release')
+    deploy_parser.add_argument('--backend', choices=sorted(BACKENDS), default='make', help="How the services are deployed (default: make). 'local' only records the stages")
     deploy_parser.set_defaults(func=run_service_deploy)
     return deploy_parser
 
+def load_release(args):
+    """
+    Returns the release to deploy, from the manifest or the arguments: its id, environment and deployments.
+
+    A manifest looks like:
+        {
+            "release": "2024-06-release-1",
+            "source_tag": "v1.4.0",
+            "destination_env": "production",
+            "services": ["orders", {"name": "billing", "source_tag": "v1.4.1"}]
+        }
+    """
+    if args.manifest:
+        if args.service_name or args.source_tag or args.destination_env:
+            raise RuntimeError("Give either a manifest or the service, source tag and destination environment, not both")
+        with open(args.manifest, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    else:
+        if not (args.service_name and args.source_tag and args.destination_env):
+            raise RuntimeError("The service, source tag and destination environment are required without a manifest")
+        manifest = {
+            'source_tag': args.source_tag,
+            'destination_env': args.destination_env,
+            'services': args.service_name.split(','),
+        }
+
+    deployments = []
+    for entry in manifest['services']:
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        if any(deployment['name'] == entry['name'] for deployment in deployments):
+            raise RuntimeError(f"Service '{entry['name']}' is listed more than once in the release")
+        deployments.append({'name': entry['name'], 'source_tag': entry.get('source_tag', manifest.get('source_tag'))})
+        if not deployments[-1]['source_tag']:
+            raise RuntimeError(f"No source tag for service '{entry['name']}'")
+
+    destination_env = manifest['destination_env']
+    # Without a release name, the same services, tags and environment are the same release
+    release_id = manifest.get('release') or hashlib.sha1(
+        json.dumps([destination_env, sorted(deployments, key=lambda deployment: deployment['name'])]).encode()
+    ).hexdigest()[:12]
+    return release_id, destination_env, deployments
+
+def get_state_path(cache_dir, release_id, destination_env, backend_name):
+    """
+    Returns the path of the saved state of a release. The same release deployed to another environment,
+    or with another backend, is another deployment: it has its own state, and doesn't resume this one.
+    """
+    file_name = re.sub(r'[^\w.-]', '_', f"{release_id}.{destination_env}.{backend_name}")
+    return os.path.join(cache_dir, RELEASES_DIRECTORY_NAME, f"{file_name}.json")
+
+def resolve_services(deployments):
+    services = {service['name']: service for service in get_services(load_index())}
+    unknown_names = [deployment['name'] for deployment in deployments if deployment['name'] not in services]
+    if unknown_names:
+        raise RuntimeError(f"Unknown services: {', '.join(unknown_names)}. Run 'sds service list' to see the services.")
+    return [dict(deployment, service=services[deployment['name']]) for deployment in deployments]
+
+class ReleasePipeline:
+    """
+    Deploys services through the stages, several services at once.
+
+    Every service goes through the stages in order, so a service is verified while others are still published.
+    The completed stages are saved after each stage, so a release stopped by a failure (or a Ctrl-C) resumes
+    where it stopped: the services already deployed are skipped, and a failed service restarts at its failed stage.
+    """
+
+    def __init__(self, backend, destination_env, state, state_path, jobs, stop_on_error):
+        self.backend = backend
+        self.destination_env = destination_env
+        self.state = state
+        self.state_path = state_path
+        self.jobs = max(1, jobs)
+        self.stop_on_error = stop_on_error
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def _update(self, name, **changes):
+        with self._lock:
+            self.state['services'][name].update(changes)
+            save_cache(self.state_path, self.state)
+
+    def _print(self, name, text, result):
+        # One line at a time, since the services report from several threads
+        with self._lock:
+            print_aligned(f"  - {name}: {text}")
+            print(result)
+
+    def deploy_service(self, deployment):
+        name = deployment['name']
+        service_state = self.state['services'][name]
+        if self._stop_event.is_set():
+            self._update(name, status='SKIPPED')
+            return
+
+        for stage in STAGES:
+            if stage in service_state['completed_stages']:
+                continue
+            if self._stop_event.is_set():
+                self._update(name, status='STOPPED')
+                return
+
+            start_time = time.perf_counter()
+            try:
+                self.backend.run_stage(stage, deployment['service'], deployment['source_tag'], self.destination_env)
+            except Exception as e:
+                elapsed_seconds = time.perf_counter() - start_time
+                self._update(name, status='FAILED', failed_stage=stage, error=str(e))
+                self._print(name, stage, f"{RED}FAILED{RESET} ({elapsed_seconds:.1f}s)")
+                if self.stop_on_error:
+                    self._stop_event.set()
+                return
+
+            elapsed_seconds = time.perf_counter() - start_time
+            with self._lock:
+                service_state['completed_stages'].append(stage)
+                service_state['stage_seconds'][stage] = round(elapsed_seconds, 3)
+            self._update(name, status='IN_PROGRESS')
+            self._print(name, stage, f"{GREEN}DONE{RESET} ({elapsed_seconds:.1f}s)")
+
+        self._update(name, status='DEPLOYED', failed_stage=None, error=None)
+
+    def run(self, deployments):
+        # Imported here, since only a deployment pays for it (it imports logging)
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for future in [executor.submit(self.deploy_service, deployment) for deployment in deployments]:
+                future.result()
+
+def print_summary(state, deployments):
+    print(f"\n{BLUE}Summary{RESET}")
+    rows = [('SERVICE', 'SOURCE TAG', *(stage.upper() for stage in STAGES), 'STATUS')]
+    for deployment in deployments:
+        service_state = state['services'][deployment['name']]
+        stage_seconds = service_state['stage_seconds']
+        rows.append((
+            deployment['name'],
+            deployment['source_tag'],
+            *(f"{stage_seconds[stage]:.1f}s" if stage in stage_seconds else '-' for stage in STAGES),
+            service_state['status'],
+        ))
+
+    colors = {'DEPLOYED': GREEN, 'FAILED': RED}
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    for row in rows:
+        line = '  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        color = colors.get(row[-1], YELLOW if row is not rows[0] else BLUE)
+        print(f"  {color}{line}{RESET}")
+
 def run_service_deploy(args):
     """
-    Handles the service deploy command.
+    Deploys services to an environment, through the publish, deploy and verify stages.
     """
-    print("Not implemented yet.")
+    repo_root, cache_dir = get_repo_paths()
+    if repo_root is None:
+        raise RuntimeError("Not in a git repository")
+
+    release_id, destination_env, deployments = load_release(args)
+    deployments = resolve_services(deployments)
+
+    state_path = get_state_path(cache_dir, release_id, destination_env, args.backend)
+    state = None if args.restart else load_cache(state_path)
+    if state is None or state.get('destination_env') != destination_env or state.get('backend') != args.backend:
+        state = {'release': release_id, 'destination_env': destination_env, 'backend': args.backend, 'services': {}}
+
+    for deployment in deployments:
+        service_state = state['services'].get(deployment['name'])
+        # A service is deployed again when its source tag changed in the manifest
+        if service_state is None or service_state['source_tag'] != deployment['source_tag']:
+            state['services'][deployment['name']] = {
+                'source_tag': deployment['source_tag'],
+                'completed_stages': [],
+                'stage_seconds': {},
+                'status': 'PENDING',
+            }
+
+    to_deploy = [deployment for deployment in deployments if state['services'][deployment['name']]['status'] != 'DEPLOYED']
+    print(f"\n{BLUE}Release '{release_id}' to '{destination_env}'{RESET}")
+    if len(to_deploy) < len(deployments):
+        print(f"Resuming: {len(deployments) - len(to_deploy)} of {len(deployments)} services already deployed (--restart to deploy them again)")
+
+    if to_deploy:
+        print(f"\n{BLUE}Deploying {len(to_deploy)} services ({args.jobs} at once){RESET}")
+        backend = BACKENDS[args.backend](repo_root, cache_dir)
+        pipeline = ReleasePipeline(backend, destination_env, state, state_path, args.jobs, stop_on_error=args.on_error == 'stop')
+        start_time = time.perf_counter()
+        pipeline.run(to_deploy)
+        print(f"\nDeployed in {time.perf_counter() - start_time:.1f}s")
+
+    print_summary(state, deployments)
+
+    failed = [deployment['name'] for deployment in deployments if state['services'][deployment['name']]['status'] != 'DEPLOYED']
+    for name in failed:
+        error = state['services'][name].get('error')
+        if error:
+            print(f"\n{RED}Error of '{name}' at stage '{state['services'][name]['failed_stage']}':{RESET}\n{error}", file=sys.stderr)
+    if failed:
+        print(f"\n{YELLOW}Run the same command again to resume the release.{RESET}")
+        sys.exit(1)
+    print(f"\n{GREEN}Release '{release_id}' deployed successfully.{RESET}")
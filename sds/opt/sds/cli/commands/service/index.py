@@ -0,0 +1,148 @@
+import os
+import time
+from utils import get_repo_paths, get_worktree_cache_path, load_cache, run_command, save_cache
+
+# A service is a directory with both files, as created from devops/python/skeleton/*.
+# A BUILD file alone is a Pants target, like a library.
+SERVICE_FILE_NAMES = ('BUILD', 'DEPLOY')
+
+# The skeletons of the services aren't services
+SKELETON_PATH = 'devops/python/skeleton'
+
+# Directories that never contain services
+SKIPPED_DIRECTORY_NAMES = {'node_modules', '__pycache__', 'venv'}
+
+INDEX_FILE_NAME = 'services.json'
+INDEX_VERSION = 2
+
+# A file modified this recently may change again within the resolution of its mtime,
+# so it's read again by the next update rather than trusted
+RACY_MTIME_NS = 2 * 10**9
+
+def get_service_type(path):
+    """
+    Returns the type of the service in a directory: cloud_function, cloudrun_service or cloudrun_job.
+    """
+    try:
+        with open(os.path.join(path, '__main__.py'), 'r') as main_file:
+            content = main_file.read()
+    except FileNotFoundError:
+        return 'cloud_function'
+    except OSError:
+        return None
+    # The entrypoint of a service runs its app with the ServiceApp of the core library
+    return 'cloudrun_service' if 'ServiceApp' in content else 'cloudrun_job'
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def is_skipped(relative_path):
+    if relative_path == SKELETON_PATH or relative_path.startswith(f"{SKELETON_PATH}/"):
+        return True
+    return any(name.startswith('.') or name in SKIPPED_DIRECTORY_NAMES for name in relative_path.split('/'))
+
+def list_service_paths(repo_root):
+    """
+    Returns the directories of the services, relative to the repository root.
+
+    Git lists the DEPLOY files from its index, and only walks the untracked directories that
+    aren't ignored, so this is much cheaper than walking the whole repository.
+    """
+    output = run_command([
+        'git', '-C', repo_root, 'ls-files', '-z', '--cached', '--others', '--exclude-standard',
+        '--', 'DEPLOY', '*/DEPLOY',
+    ])
+    if output is None:
+        raise RuntimeError(f"Could not list the files of the repository in {repo_root}")
+
+    service_paths = set()
+    for file_path in output.split('\0'):
+        relative_path = os.path.dirname(file_path)
+        if file_path and not is_skipped(relative_path) and all(
+            os.path.isfile(os.path.join(repo_root, relative_path, name)) for name in SERVICE_FILE_NAMES
+        ):
+            service_paths.add(relative_path)
+    return service_paths
+
+def update_index(repo_root, index):
+    """
+    Updates the index of the services of the repository, and returns whether it changed.
+
+    The type of a service depends on its __main__.py, so it's read again only when its mtime
+    changed, or when it appeared or disappeared.
+    """
+    old_services = index['services']
+    services = {}
+    changed = False
+    now_ns = time.time_ns()
+
+    for relative_path in sorted(list_service_paths(repo_root)):
+        path = os.path.join(repo_root, relative_path)
+        main_mtime = get_mtime(os.path.join(path, '__main__.py'))
+        entry = old_services.get(relative_path)
+        if entry is None or entry['racy'] or entry['main_mtime'] != main_mtime:
+            entry = {
+                'main_mtime': main_mtime,
+                'racy': main_mtime is not None and now_ns - main_mtime < RACY_MTIME_NS,
+                # Without an entrypoint, a service is a function: there's nothing to read
+                'service_type': 'cloud_function' if main_mtime is None else get_service_type(path),
+            }
+            changed = True
+        services[relative_path] = entry
+
+    changed = changed or services.keys() != old_services.keys()
+    index['services'] = services
+    return changed
+
+def get_index_path(cache_dir, repo_root):
+    """
+    Returns the path of the index of a worktree: each worktree may have other services.
+    """
+    return get_worktree_cache_path(cache_dir, INDEX_FILE_NAME, repo_root)
+
+def load_index(refresh=False):
+    """
+    Returns the up-to-date index of the services of the repository.
+    With refresh, the index is rebuilt from scratch.
+    """
+    repo_root, cache_dir = get_repo_paths()
+    if repo_root is None:
+        raise RuntimeError("Not in a git repository")
+
+    index_path = get_index_path(cache_dir, repo_root)
+    index = None if refresh else load_cache(index_path)
+    is_new = not index or index.get('version') != INDEX_VERSION or index.get('repo_root') != repo_root
+    if is_new:
+        index = {'version': INDEX_VERSION, 'repo_root': repo_root, 'services': {}, 'builds': {}}
+
+    if update_index(repo_root, index) or is_new:
+        save_cache(index_path, index)
+    return index
+
+def get_services(index):
+    """
+    Returns the services of an index, sorted by name: their name, type, path and last build.
+    """
+    services = []
+    for relative_path, entry in index['services'].items():
+        if entry['service_type'] is not None:
+            services.append({
+                'name': os.path.basename(relative_path),
+                'type': entry['service_type'],
+                'path': relative_path,
+                'last_build': index['builds'].get(relative_path),
+            })
+    return sorted(services, key=lambda service: (service['name'], service['path']))
+
+def record_build(cache_dir, repo_root, service_path, build):
+    """
+    Records the last successful build of a service in the index of a worktree, for 'sds service list'.
+    """
+    index_path = get_index_path(cache_dir, repo_root)
+    index = load_cache(index_path)
+    if index and index.get('version') == INDEX_VERSION:
+        index['builds'][service_path] = build
+        save_cache(index_path, index)
@@ -1,5 +1,9 @@
+from utils import BLUE, RESET, YELLOW
+from .index import get_services, load_index
+
 def register(subparsers):
     list_parser = subparsers.add_parser('list', help='List all services')
+    list_parser.add_argument('--refresh', action='store_true', help='Rebuild the service index from scratch')
     list_parser.set_defaults(func=run_service_list)
     return list_parser
 
@@ -7,4 +11,22 @@ def run_service_list(args):
     """
     Shows the list of available services.
     """
-    print("Not implemented yet.")
+    services = get_services(load_index(refresh=args.refresh))
+    if not services:
+        print(f"{YELLOW}No services found.{RESET}")
+        return
+
+    rows = [('NAME', 'TYPE', 'PATH', 'LAST BUILD')]
+    for service in services:
+        last_build = service['last_build']
+        rows.append((
+            service['name'],
+            service['type'],
+            service['path'],
+            last_build['built_at'] if last_build else '-',
+        ))
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    for row_index, row in enumerate(rows):
+        line = '  '.join(value.ljust(width) for value, width in zip(row, widths)) + '  ' + row[-1]
+        print(f"{BLUE}{line}{RESET}" if row_index == 0 else line)
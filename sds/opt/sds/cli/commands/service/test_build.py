@@ -0,0 +1,114 @@
+import argparse
+import subprocess
+
+import pytest
+
+from commands.service import build
+from utils import load_cache
+
+class CompletedProcess:
+    def __init__(self, returncode, stdout):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = ''
+
+def test_services_are_built_by_a_single_pants_run(monkeypatch):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append((command, kwargs['cwd']))
+        return CompletedProcess(1, 'failed')
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    services = [{'name': 'orders', 'path': 'src/py/orders'}, {'name': 'billing', 'path': 'src/py/billing'}]
+
+    succeeded, _, output = build.build_services(services, '/repo')
+
+    assert commands == [(['pants', 'package', 'src/py/orders::', 'src/py/billing::'], '/repo')]
+    assert (succeeded, output) == (False, 'failed')
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """
+    A repository with two services and the core library, committed on main.
+    """
+    for name in ['orders', 'billing']:
+        service_path = tmp_path / 'src/py' / name
+        service_path.mkdir(parents=True)
+        for file_name in ['BUILD', 'DEPLOY']:
+            (service_path / file_name).write_text('')
+    (tmp_path / 'src/py/sds/core').mkdir(parents=True)
+    (tmp_path / 'src/py/sds/core/logging.py').write_text('')
+    subprocess.run(['git', 'init', '-q', '-b', 'main'], cwd=tmp_path, check=True)
+    monkeypatch.chdir(tmp_path)
+    commit()
+    return tmp_path
+
+@pytest.fixture
+def built_services(monkeypatch):
+    """
+    The services built by every Pants run, which fails for the services in failing_paths.
+    """
+    runs = []
+    failing_paths = set()
+
+    def build_services(services, build_root):
+        runs.append([service['name'] for service in services])
+        succeeded = not any(service['path'] in failing_paths for service in services)
+        return succeeded, 0.5, '' if succeeded else 'failed'
+
+    monkeypatch.setattr(build, 'build_services', build_services)
+    return runs, failing_paths
+
+def commit():
+    subprocess.run(['git', 'add', '-A'], check=True)
+    subprocess.run(
+        ['git', '-c', 'user.name=sds', '-c', 'user.email=sds@example.com', 'commit', '-q', '-m', 'change'], check=True,
+    )
+
+def run_build(service_name='all', force=False):
+    build.run_service_build(argparse.Namespace(service_name=service_name, branch_name='main', force=force))
+
+def get_input_hashes():
+    return {name: build.get_input_hash('main', f"src/py/{name}") for name in ['orders', 'billing']}
+
+def test_input_hash_changes_with_the_service_or_the_shared_sources(repo):
+    initial_hashes = get_input_hashes()
+    (repo / 'src/py/orders/app.py').write_text('')
+    commit()
+    orders_hashes = get_input_hashes()
+    (repo / 'src/py/sds/core/logging.py').write_text('# changed')
+    commit()
+    core_hashes = get_input_hashes()
+
+    assert orders_hashes['orders'] != initial_hashes['orders']
+    assert orders_hashes['billing'] == initial_hashes['billing']
+    assert core_hashes['orders'] != orders_hashes['orders']
+    assert core_hashes['billing'] != orders_hashes['billing']
+    assert build.get_input_hash('main', 'src/py/unknown') is None
+
+def test_unchanged_services_are_skipped_unless_forced(repo, built_services):
+    runs, _ = built_services
+    run_build()
+    (repo / 'src/py/orders/app.py').write_text('')
+    commit()
+    run_build()
+    run_build()
+    run_build(force=True)
+
+    assert runs == [['billing', 'orders'], ['orders'], ['billing', 'orders']]
+
+def test_failed_services_are_isolated_and_built_again(repo, built_services):
+    runs, failing_paths = built_services
+    failing_paths.add('src/py/billing')
+    with pytest.raises(SystemExit):
+        run_build()
+
+    build_cache = load_cache(str(repo / '.git/sds' / build.BUILD_CACHE_FILE_NAME))
+    assert [build_entry['service'] for build_entry in build_cache.values()] == ['src/py/orders']
+    assert next(iter(build_cache.values()))['batch_size'] == 1
+
+    failing_paths.clear()
+    run_build()
+
+    assert runs == [['billing', 'orders'], ['billing'], ['orders'], ['billing']]
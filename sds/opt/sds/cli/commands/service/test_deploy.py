@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import subprocess
+
+import pytest
+
+from commands.service import deploy
+from commands.service.backends import BACKENDS, DeployBackend, LocalDeployBackend
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """
+    A repository with two services.
+    """
+    for name in ['orders', 'billing']:
+        service_path = tmp_path / 'src/py' / name
+        service_path.mkdir(parents=True)
+        for file_name in ['BUILD', 'DEPLOY']:
+            (service_path / file_name).write_text('')
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def run_deploy(destination_env='staging', backend='local', **arguments):
+    args = argparse.Namespace(
+        service_name='orders,billing', source_tag='v1', destination_env=destination_env, manifest=None,
+        jobs=2, on_error='stop', restart=False, backend=backend,
+    )
+    vars(args).update(arguments)
+    deploy.run_service_deploy(args)
+
+def get_deployed_stages(repo):
+    with open(repo / '.git/sds' / LocalDeployBackend.LOG_FILE_NAME, 'r') as log_file:
+        entries = [json.loads(line) for line in log_file]
+    return sorted((entry['service'], entry['stage'], entry['destination_env']) for entry in entries)
+
+def test_release_is_deployed_then_skipped(repo):
+    run_deploy()
+    run_deploy()
+
+    assert get_deployed_stages(repo) == sorted(
+        (f"src/py/{name}", stage, 'staging') for name in ['orders', 'billing'] for stage in deploy.STAGES
+    )
+
+def test_failed_release_resumes_at_the_failed_stage(repo, monkeypatch):
+    class FailingBackend(LocalDeployBackend):
+        failures = [('src/py/billing', 'deploy')]
+
+        def run_stage(self, stage, service, source_tag, destination_env):
+            if (service['path'], stage) in self.failures:
+                self.failures.remove((service['path'], stage))
+                raise RuntimeError('deploy failed')
+            super().run_stage(stage, service, source_tag, destination_env)
+
+    monkeypatch.setitem(BACKENDS, 'failing', FailingBackend)
+
+    with pytest.raises(SystemExit):
+        run_deploy(backend='failing', on_error='continue')
+    run_deploy(backend='failing')
+
+    billing_stages = [stage for path, stage, _ in get_deployed_stages(repo) if path == 'src/py/billing']
+    assert sorted(billing_stages) == sorted(deploy.STAGES)
+
+def test_release_to_another_environment_or_backend_starts_fresh(repo):
+    run_deploy('staging')
+    run_deploy('production')
+
+    assert [env for _, _, env in get_deployed_stages(repo)].count('production') == 6
+    assert len(os.listdir(repo / '.git/sds' / deploy.RELEASES_DIRECTORY_NAME)) == 2
+    assert deploy.get_state_path('/cache', 'r1', 'staging', 'local') != deploy.get_state_path('/cache', 'r1', 'staging', 'make')
+
+def test_failure_with_on_error_stop_skips_the_remaining_services_until_the_next_run(repo, monkeypatch):
+    class FailingBackend(LocalDeployBackend):
+        failures = [('src/py/orders', 'publish')]
+
+        def run_stage(self, stage, service, source_tag, destination_env):
+            if (service['path'], stage) in self.failures:
+                self.failures.remove((service['path'], stage))
+                raise RuntimeError('publish failed')
+            super().run_stage(stage, service, source_tag, destination_env)
+
+    monkeypatch.setitem(BACKENDS, 'failing', FailingBackend)
+
+    with pytest.raises(SystemExit):
+        run_deploy(backend='failing', jobs=1)
+    (state_file_name,) = os.listdir(repo / '.git/sds' / deploy.RELEASES_DIRECTORY_NAME)
+    with open(repo / '.git/sds' / deploy.RELEASES_DIRECTORY_NAME / state_file_name, 'r') as state_file:
+        services_state = json.load(state_file)['services']
+
+    assert services_state['orders']['status'] == 'FAILED'
+    assert services_state['billing']['status'] in ('SKIPPED', 'STOPPED')
+    assert not os.path.exists(repo / '.git/sds' / LocalDeployBackend.LOG_FILE_NAME)
+
+    run_deploy(backend='failing', jobs=1)
+
+    assert get_deployed_stages(repo) == sorted(
+        (f"src/py/{name}", stage, 'staging') for name in ['orders', 'billing'] for stage in deploy.STAGES
+    )
+
+def test_release_with_a_service_listed_twice_is_rejected(repo):
+    with pytest.raises(RuntimeError, match="'orders' is listed more than once"):
+        run_deploy(service_name='orders,billing,orders')
+
+def test_backend_must_implement_run_stage():
+    class IncompleteBackend(DeployBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteBackend('/repo', '/cache')
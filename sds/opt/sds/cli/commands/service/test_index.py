@@ -0,0 +1,114 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from commands.service import index as service_index
+
+# Old enough for the mtimes to be trusted by the next update
+OLD_MTIME_NS = 10**18
+
+def write_file(path, content=''):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    os.utime(path, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+def create_service(path, main_content=None):
+    write_file(path / 'BUILD')
+    write_file(path / 'DEPLOY')
+    if main_content is not None:
+        write_file(path / '__main__.py', main_content)
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """
+    A repository with services of every type, tracked or not, and directories that aren't services.
+    """
+    create_service(tmp_path / 'src/py/orders', 'app = ServiceApp(create_app())')
+    create_service(tmp_path / 'src/py/reports', 'main()')
+    create_service(tmp_path / 'src/py/functions/notify')
+    create_service(tmp_path / 'devops/python/skeleton/cloudrun_job', 'main()')
+    create_service(tmp_path / 'build/orders')
+    write_file(tmp_path / 'src/py/library/BUILD')
+    write_file(tmp_path / '.gitignore', 'build/\n')
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    subprocess.run(['git', 'add', 'src/py/orders', 'devops', '.gitignore'], cwd=tmp_path, check=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def get_service_types(index):
+    return {service['path']: service['type'] for service in service_index.get_services(index)}
+
+def test_services_are_listed_from_git(repo):
+    assert get_service_types(service_index.load_index()) == {
+        'src/py/functions/notify': 'cloud_function',
+        'src/py/orders': 'cloudrun_service',
+        'src/py/reports': 'cloudrun_job',
+    }
+    assert os.path.basename(service_index.get_index_path(str(repo / '.git/sds'), str(repo))).startswith('services-')
+    assert os.path.isfile(service_index.get_index_path(str(repo / '.git/sds'), str(repo)))
+
+def test_update_reads_only_the_changed_services(repo, monkeypatch):
+    service_index.load_index()
+    read_paths = []
+    get_service_type = service_index.get_service_type
+
+    def record_read(path):
+        read_paths.append(os.path.relpath(path, repo))
+        return get_service_type(path)
+
+    monkeypatch.setattr(service_index, 'get_service_type', record_read)
+
+    assert get_service_types(service_index.load_index())['src/py/reports'] == 'cloudrun_job'
+    assert read_paths == []
+
+    # The type follows the __main__.py, and the new and removed services are found
+    write_file(repo / 'src/py/reports/__main__.py', 'app = ServiceApp(create_app())')
+    os.utime(repo / 'src/py/reports/__main__.py', ns=(OLD_MTIME_NS + 1, OLD_MTIME_NS + 1))
+    create_service(repo / 'src/py/billing', 'main()')
+    os.remove(repo / 'src/py/functions/notify/DEPLOY')
+
+    assert get_service_types(service_index.load_index()) == {
+        'src/py/billing': 'cloudrun_job',
+        'src/py/orders': 'cloudrun_service',
+        'src/py/reports': 'cloudrun_service',
+    }
+    assert sorted(read_paths) == ['src/py/billing', 'src/py/reports']
+
+def test_recently_modified_main_is_read_again(repo, monkeypatch):
+    create_service(repo / 'src/py/billing')
+    (repo / 'src/py/billing/__main__.py').write_text('main()')
+
+    service_index.load_index()
+    (repo / 'src/py/billing/__main__.py').write_text('app = ServiceApp(create_app())')
+
+    assert get_service_types(service_index.load_index())['src/py/billing'] == 'cloudrun_service'
+
+@pytest.mark.benchmark
+def test_benchmark_large_repo(tmp_path, monkeypatch):
+    """
+    Lists the services of a repository with thousands of directories, most of them not services.
+    """
+    for package_index in range(200):
+        package_path = tmp_path / 'src/py/package{}'.format(package_index)
+        for module_index in range(20):
+            write_file(package_path / 'module{}/__init__.py'.format(module_index))
+        write_file(package_path / 'BUILD')
+        if package_index % 4 == 0:
+            create_service(package_path, 'main()')
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    subprocess.run(['git', 'add', 'src/py/package1*'], cwd=tmp_path, check=True)
+    monkeypatch.chdir(tmp_path)
+
+    start_time = time.perf_counter()
+    index = service_index.load_index()
+    build_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    service_index.load_index()
+    update_seconds = time.perf_counter() - start_time
+
+    print('4200 directories: index built in {:.3f} s, updated in {:.3f} s'.format(build_seconds, update_seconds))
+    assert len(service_index.get_services(index)) == 50
+    assert build_seconds < 1
+    assert update_seconds < 1
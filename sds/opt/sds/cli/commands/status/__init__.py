@@ -1,10 +1,208 @@
+import json
+import os
+import shutil
+import time
+from commands import get_help
+from utils import (
+    BLUE, GREEN, RED, RESET, YELLOW, CONFIG_RELATIVE_PATH,
+    get_git_paths, get_worktree_cache_path, load_cache, print_aligned, run_command, save_cache, validate_config,
+)
+
+# Repeated calls within this delay (e.g. from the shell prompt) reuse the last status.
+# The cache is also dropped as soon as HEAD, the index, a fetch or sds.conf changes it.
+CACHE_TTL_SECONDS = 10
+CACHE_FILE_NAME = 'status.json'
+
+# Set in the SDS container by sds-start.run-container.sh
+CONTAINER_ENVVAR = 'SDS_HOST_UNAME'
+
 def register(subparsers):
-    status_parser = subparsers.add_parser('status', help='Shows the environment status')
+    status_parser = subparsers.add_parser('status', help=get_help('status'))
+    status_parser.add_argument('--json', action='store_true', help='Print the status as JSON, for scripts')
+    status_parser.add_argument('--refresh', action='store_true', help='Ignore the cached status')
     status_parser.set_defaults(func=run_status)
     return status_parser
 
+def get_ahead_behind(ref):
+    """
+    Returns the number of commits HEAD is ahead and behind a ref, or None if the ref doesn't exist.
+    Only the local refs are compared: run a fetch first for an up-to-date result.
+    """
+    output = run_command(['git', 'rev-list', '--left-right', '--count', f"HEAD...{ref}"])
+    if not output:
+        return None
+    ahead, behind = output.split()
+    return {'ref': ref, 'ahead': int(ahead), 'behind': int(behind)}
+
+def get_dirty_files():
+    """
+    Returns the number of modified, staged and untracked files.
+    """
+    output = run_command(['git', '--no-optional-locks', 'status', '--porcelain'])
+    if output is None:
+        return None
+    return len(output.splitlines())
+
+def get_container_status():
+    """
+    Returns whether we're running in the SDS container, and the containers Docker runs (if Docker is available).
+    """
+    status = {
+        'in_sds_container': bool(os.environ.get(CONTAINER_ENVVAR)) or os.path.exists('/.dockerenv'),
+        'docker_available': False,
+        'containers': [],
+    }
+    if shutil.which('docker'):
+        output = run_command(['docker', 'ps', '--format', '{{.Names}}\t{{.Status}}'], timeout=10)
+        if output is not None:
+            status['docker_available'] = True
+            for line in output.splitlines():
+                name, _, container_status = line.partition('\t')
+                status['containers'].append({'name': name, 'status': container_status})
+    return status
+
+def get_config_status(repo_root):
+    """
+    Returns whether sds.conf exists and passes sds-check-config.sh.
+    """
+    config_path = os.path.join(repo_root, CONFIG_RELATIVE_PATH)
+    if not os.path.exists(config_path):
+        return {'path': config_path, 'valid': False, 'error': 'File not found'}
+    try:
+        result = validate_config(repo_root)
+    except OSError as e:
+        return {'path': config_path, 'valid': None, 'error': str(e)}
+    error = None if result.returncode == 0 else (result.stdout + result.stderr).strip()
+    return {'path': config_path, 'valid': result.returncode == 0, 'error': error}
+
+def get_cache_signature(repo_root, git_dir, cache_dir):
+    """
+    Returns the modification times of the files changed by a commit, a checkout, a fetch or a config edit.
+    HEAD and the index belong to the worktree, while a fetch from any worktree updates the shared refs.
+    """
+    common_dir = os.path.dirname(cache_dir)
+    paths = [
+        os.path.join(git_dir, 'HEAD'),
+        os.path.join(git_dir, 'index'),
+        os.path.join(git_dir, 'FETCH_HEAD'),
+        os.path.join(common_dir, 'FETCH_HEAD'),
+        os.path.join(repo_root, CONFIG_RELATIVE_PATH),
+    ]
+    signature = []
+    for path in paths:
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return signature
+
+def collect_status(repo_root):
+    """
+    Collects the status of the environment. The probes run concurrently, since they mostly wait on git and docker.
+    """
+    # Imported here, so a cached status doesn't pay for it (it imports logging)
+    from concurrent.futures import ThreadPoolExecutor
+
+    branch = run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'])
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        dirty_files = executor.submit(get_dirty_files)
+        origin = executor.submit(get_ahead_behind, f"origin/{branch}")
+        upstream = executor.submit(get_ahead_behind, 'upstream/main')
+        container = executor.submit(get_container_status)
+        config = executor.submit(get_config_status, repo_root)
+
+        return {
+            'repo': {
+                'root': repo_root,
+                'branch': branch,
+                'dirty_files': dirty_files.result(),
+                'origin': origin.result(),
+                'upstream': upstream.result(),
+            },
+            'container': container.result(),
+            'config': config.result(),
+            'collected_at': time.time(),
+        }
+
+def get_status(refresh=False):
+    """
+    Returns the status of the environment, from the cache when it's recent enough.
+    """
+    repo_root, git_dir, cache_dir = get_git_paths()
+    if repo_root is None:
+        raise RuntimeError("Not in a git repository")
+
+    # One cache per worktree, since each has its own branch and dirty files
+    cache_path = get_worktree_cache_path(cache_dir, CACHE_FILE_NAME, repo_root)
+    signature = get_cache_signature(repo_root, git_dir, cache_dir)
+
+    if not refresh:
+        cache = load_cache(cache_path)
+        if (
+            cache
+            and cache.get('signature') == signature
+            and 0 <= time.time() - cache['status']['collected_at'] < CACHE_TTL_SECONDS
+        ):
+            return cache['status'], True
+
+    status = collect_status(repo_root)
+    save_cache(cache_path, {'signature': signature, 'status': status})
+    return status, False
+
+def format_ahead_behind(ahead_behind):
+    if ahead_behind is None:
+        return f"{YELLOW}UNKNOWN{RESET}"
+    text = f"{ahead_behind['ahead']} ahead, {ahead_behind['behind']} behind {ahead_behind['ref']}"
+    color = GREEN if ahead_behind['behind'] == 0 else YELLOW
+    return f"{color}{text}{RESET}"
+
+def print_status(status, cached):
+    repo = status['repo']
+    container = status['container']
+    config = status['config']
+
+    print(f"\n{BLUE}Repository{RESET}")
+    print_aligned("  - Branch")
+    print(repo['branch'] or f"{RED}UNKNOWN{RESET}")
+    print_aligned("  - Origin")
+    print(format_ahead_behind(repo['origin']))
+    print_aligned("  - Upstream")
+    print(format_ahead_behind(repo['upstream']))
+    print_aligned("  - Dirty files")
+    print(f"{GREEN}0{RESET}" if repo['dirty_files'] == 0 else f"{YELLOW}{repo['dirty_files']}{RESET}")
+
+    print(f"\n{BLUE}Container{RESET}")
+    print_aligned("  - Running in the SDS container")
+    print(f"{GREEN}YES{RESET}" if container['in_sds_container'] else f"{YELLOW}NO{RESET}")
+    print_aligned("  - Docker")
+    if container['docker_available']:
+        print(f"{GREEN}{len(container['containers'])} RUNNING{RESET}")
+        for running_container in container['containers']:
+            print_aligned(f"    - {running_container['name']}")
+            print(running_container['status'])
+    else:
+        print(f"{YELLOW}NOT AVAILABLE{RESET}")
+
+    print(f"\n{BLUE}Configuration{RESET}")
+    print_aligned("  - sds.conf")
+    if config['valid']:
+        print(f"{GREEN}VALID{RESET}")
+    else:
+        print(f"{RED}INVALID{RESET}" if config['valid'] is False else f"{YELLOW}UNKNOWN{RESET}")
+        print(f"\n{config['error']}")
+
+    if cached:
+        age_seconds = time.time() - status['collected_at']
+        print(f"\n(Cached {age_seconds:.0f}s ago. Run 'sds status --refresh' for a fresh status.)")
+
 def run_status(args):
     """
-    Shows the environment status.
+    Shows the environment status: the repository, the containers and the configuration.
     """
-    print("Not implemented yet.")
+    status, cached = get_status(refresh=args.refresh)
+
+    if args.json:
+        print(json.dumps(dict(status, cached=cached), indent=2))
+    else:
+        print_status(status, cached)
@@ -0,0 +1,55 @@
+import subprocess
+import time
+
+import pytest
+
+from commands import status
+from utils import get_git_paths
+
+def git(*args, cwd):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+@pytest.fixture
+def worktrees(tmp_path, monkeypatch):
+    """
+    A repository with a linked worktree.
+    """
+    main_root = tmp_path / 'repo'
+    main_root.mkdir()
+    monkeypatch.setenv('GIT_AUTHOR_NAME', 'test')
+    monkeypatch.setenv('GIT_AUTHOR_EMAIL', 'test@example.com')
+    monkeypatch.setenv('GIT_COMMITTER_NAME', 'test')
+    monkeypatch.setenv('GIT_COMMITTER_EMAIL', 'test@example.com')
+    git('init', '-q', '-b', 'main', cwd=main_root)
+    git('commit', '-q', '--allow-empty', '-m', 'initial', cwd=main_root)
+    linked_root = tmp_path / 'linked'
+    git('worktree', 'add', '-q', '-b', 'feature', str(linked_root), cwd=main_root)
+    return main_root, linked_root
+
+def test_signature_follows_the_head_and_index_of_a_linked_worktree(worktrees, monkeypatch):
+    main_root, linked_root = worktrees
+    monkeypatch.chdir(linked_root)
+    repo_root, git_dir, cache_dir = get_git_paths()
+
+    assert repo_root == str(linked_root)
+    assert cache_dir == str(main_root / '.git' / 'sds')
+    signature = status.get_cache_signature(repo_root, git_dir, cache_dir)
+
+    (linked_root / 'file.txt').write_text('content')
+    git('add', 'file.txt', cwd=linked_root)
+    git('commit', '-q', '-m', 'change', cwd=linked_root)
+
+    assert status.get_cache_signature(repo_root, git_dir, cache_dir) != signature
+
+def test_each_worktree_has_its_own_cache(worktrees, monkeypatch):
+    main_root, linked_root = worktrees
+    monkeypatch.setattr(status, 'collect_status', lambda repo_root: {'root': repo_root, 'collected_at': time.time()})
+
+    statuses = []
+    for root in [main_root, linked_root, main_root]:
+        monkeypatch.chdir(root)
+        statuses.append(status.get_status())
+
+    assert [(result['root'], cached) for result, cached in statuses] == [
+        (str(main_root), False), (str(linked_root), False), (str(main_root), True),
+    ]
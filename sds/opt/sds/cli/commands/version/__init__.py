@@ -1,5 +1,7 @@
+from commands import get_help
+
 def register(subparsers):
-    version_parser = subparsers.add_parser('version', help='Shows the version of the environment')
+    version_parser = subparsers.add_parser('version', help=get_help('version'))
     version_parser.set_defaults(func=run_version)
     return version_parser
 
@@ -0,0 +1,18 @@
+import pytest
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', help="Also run the benchmarks (marked with 'benchmark')")
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: a timing check, not a behavior check. Only runs with --benchmark.')
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Skips the benchmarks unless asked for: wall clock timings depend on the machine and its load.
+    """
+    if config.getoption('--benchmark'):
+        return
+    skip_benchmark = pytest.mark.skip(reason='benchmark: run with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip_benchmark)
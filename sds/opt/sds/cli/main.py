@@ -1,6 +1,16 @@
 import argparse
+import importlib
 import sys
-from commands import version, status, repo, service, config
+from commands import COMMANDS
+
+def get_invoked_command(argv):
+    """
+    Returns the name of the command invoked (the first positional argument), or None.
+    """
+    for arg in argv:
+        if not arg.startswith('-'):
+            return arg
+    return None
 
 def get_deepest_parser(parser, args):
     """
@@ -24,12 +34,14 @@ def main():
     
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
-    # Register commands
-    version.register(subparsers)
-    status.register(subparsers)
-    repo.register(subparsers)
-    service.register(subparsers)
-    config.register(subparsers)
+    # Register commands. Only the invoked command is imported, with its whole argparse tree:
+    # the others only need their name and help, for 'sds --help' and the invalid choice errors.
+    invoked_command = get_invoked_command(sys.argv[1:])
+    for name, help_text, module_name in COMMANDS:
+        if name == invoked_command:
+            importlib.import_module(module_name).register(subparsers)
+        else:
+            subparsers.add_parser(name, help=help_text)
 
     args = parser.parse_args()
 
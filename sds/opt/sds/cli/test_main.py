@@ -0,0 +1,50 @@
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+
+from commands import COMMANDS
+
+CLI_PATH = os.path.dirname(os.path.abspath(__file__))
+
+def get_imported_modules(argv):
+    """
+    Runs the CLI in a fresh interpreter and returns the names of the modules it imported.
+    """
+    code = (
+        "import sys\n"
+        f"sys.argv = {['sds'] + argv!r}\n"
+        "import main\n"
+        "main.main()\n"
+        "print('\\n'.join(sys.modules))\n"
+    )
+    completed_process = subprocess.run(
+        [sys.executable, '-c', code], cwd=CLI_PATH, capture_output=True, text=True, check=True
+    )
+    return completed_process.stdout.splitlines()
+
+def test_only_the_invoked_command_is_imported():
+    imported_modules = get_imported_modules(['version'])
+
+    assert [name for name in imported_modules if name.startswith('commands.')] == ['commands.version']
+    # The other commands run git, and their imports aren't needed by a simple command
+    assert 'subprocess' not in imported_modules
+    assert 'concurrent.futures' not in imported_modules
+
+def test_help_lists_every_command():
+    completed_process = subprocess.run(
+        [sys.executable, 'main.py', '--help'], cwd=CLI_PATH, capture_output=True, text=True, check=True
+    )
+
+    for name, help_text, _ in COMMANDS:
+        assert name in completed_process.stdout
+        assert help_text in completed_process.stdout
+
+def test_commands_register_the_help_of_the_registry():
+    for name, help_text, module_name in COMMANDS:
+        subparsers = argparse.ArgumentParser().add_subparsers()
+        importlib.import_module(module_name).register(subparsers)
+
+        help_texts = {action.dest: action.help for action in subparsers._choices_actions}
+        assert help_texts == {name: help_text}
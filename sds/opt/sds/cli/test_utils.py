@@ -0,0 +1,28 @@
+import subprocess
+
+import pytest
+
+from utils import fetch_remotes
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """
+    A repository whose 'origin' can be fetched, and whose 'upstream' can't.
+    """
+    subprocess.run(['git', 'init', '-q', '--bare', str(tmp_path / 'origin.git')], check=True)
+    clone_path = tmp_path / 'clone'
+    subprocess.run(['git', 'clone', '-q', str(tmp_path / 'origin.git'), str(clone_path)], check=True, capture_output=True)
+    subprocess.run(['git', 'remote', 'add', 'upstream', str(tmp_path / 'missing.git')], cwd=clone_path, check=True)
+    monkeypatch.chdir(clone_path)
+    return clone_path
+
+def test_failed_fetch_of_an_optional_remote_is_a_warning(repo, capsys):
+    fetch_remotes(['origin'], ['upstream'])
+
+    output = capsys.readouterr()
+    assert 'SKIPPED' in output.out
+    assert "'upstream' could not be fetched" in output.err
+
+def test_failed_fetch_exits(repo):
+    with pytest.raises(SystemExit):
+        fetch_remotes(['origin', 'upstream'])
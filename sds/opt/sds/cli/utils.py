@@ -1,6 +1,12 @@
+import hashlib
+import json
 import subprocess
 import os
 import sys
+import time
+
+# The SDS configuration file, relative to the repository root
+CONFIG_RELATIVE_PATH = "devops/sds/etc/sds.conf"
 
 # ANSI Color Escape Codes
 GREEN = '\033[92m'
@@ -16,16 +22,140 @@ def print_aligned(text, width=60):
     dots = max(3, width - len(text))
     print(f"{text}{'.' * dots} ", end='', flush=True)
 
-def run_git(cmd, description):
+def run_git(cmd, description, show_time=False):
     """
     Executes a git command with aligned terminal output and color-coded results.
+    With show_time, the time the command took is printed after the result.
     """
     print_aligned(description)
+    start_time = time.perf_counter()
     try:
         result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print(f"{GREEN}DONE{RESET}")
+        elapsed = f" ({time.perf_counter() - start_time:.2f}s)" if show_time else ""
+        print(f"{GREEN}DONE{RESET}{elapsed}")
         return result.stdout.strip()
     except subprocess.CalledProcessError as e:
         print(f"{RED}ERROR{RESET}")
         print(f"\nError Details:\n{e.stderr}", file=sys.stderr)
         sys.exit(1)
+
+def fetch_remotes(remotes, optional_remotes=(), description_prefix="  - "):
+    """
+    Fetches several remotes at once, then prints the result and the time of each fetch.
+    Exits if a fetch of the remotes failed, like run_git. A failed fetch of the optional remotes
+    only prints a warning, since the command doesn't depend on them.
+    """
+    # Imported here, since most commands don't need it (it imports logging)
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch(remote):
+        start_time = time.perf_counter()
+        result = subprocess.run(['git', 'fetch', remote], capture_output=True, text=True)
+        return result, time.perf_counter() - start_time
+
+    all_remotes = [*remotes, *optional_remotes]
+    with ThreadPoolExecutor(max_workers=len(all_remotes)) as executor:
+        results = list(executor.map(fetch, all_remotes))
+
+    errors = []
+    warnings = []
+    for remote, (result, elapsed_seconds) in zip(all_remotes, results):
+        print_aligned(f"{description_prefix}git fetch {remote}")
+        if result.returncode == 0:
+            print(f"{GREEN}DONE{RESET} ({elapsed_seconds:.2f}s)")
+        elif remote in optional_remotes:
+            print(f"{YELLOW}SKIPPED{RESET}")
+            warnings.append(f"'{remote}' could not be fetched:\n{result.stderr}")
+        else:
+            print(f"{RED}ERROR{RESET}")
+            errors.append(result.stderr)
+
+    for warning in warnings:
+        print(f"\n{YELLOW}Warning:{RESET} {warning}", file=sys.stderr)
+    if errors:
+        print(f"\nError Details:\n{''.join(errors)}", file=sys.stderr)
+        sys.exit(1)
+
+def run_command(cmd, timeout=30):
+    """
+    Executes a command quietly and returns its output, or None if it fails.
+    Unlike run_git, it prints nothing, so it can run in several threads at once.
+    """
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+def get_git_paths():
+    """
+    Returns the root of the current worktree, its git folder and the folder of the SDS cache
+    files (.git/sds), or (None, None, None) outside of a repository.
+    In a linked worktree, the git folder (with its own HEAD and index) is .git/worktrees/<name>,
+    while the cache folder is shared by the worktrees of the repository. It's never committed.
+    """
+    output = run_command(['git', 'rev-parse', '--show-toplevel', '--git-dir', '--git-common-dir'])
+    if not output:
+        return None, None, None
+    repo_root, git_dir, common_dir = output.splitlines()
+    return repo_root, os.path.abspath(git_dir), os.path.join(os.path.abspath(common_dir), 'sds')
+
+def get_repo_paths():
+    """
+    Returns the root of the current worktree and the folder of the SDS cache files (.git/sds),
+    or (None, None) outside of a repository.
+    """
+    repo_root, _, cache_dir = get_git_paths()
+    return repo_root, cache_dir
+
+def get_worktree_cache_path(cache_dir, file_name, repo_root):
+    """
+    Returns the path of a cache file kept per worktree, since the cache folder is shared by the
+    worktrees of the repository: e.g. status-<hash of the worktree root>.json for status.json.
+    """
+    name, extension = os.path.splitext(file_name)
+    root_hash = hashlib.sha1(repo_root.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{name}-{root_hash}{extension}")
+
+def validate_config(repo_root):
+    """
+    Runs sds-check-config.sh on the sds.conf of the repository.
+    Returns the completed process: the configuration is valid if its return code is 0.
+    """
+    sds_root = os.path.join(repo_root, "devops/sds")
+    validation_script = os.path.join(sds_root, "bootstrap/sds-check-config.sh")
+
+    # Prepare environment for the validation script
+    env = os.environ.copy()
+    env["SDS_SDS_ROOT_PATH_IN_HOST"] = sds_root
+    # Add the SDS utilities folder to the PATH so sds-check-config.sh can find printf_color
+    sds_utils_path = os.path.join(sds_root, "opt/sds")
+    env["PATH"] = f"{env.get('PATH', '')}:{sds_utils_path}"
+
+    return subprocess.run(['bash', validation_script], env=env, capture_output=True, text=True)
+
+def load_cache(cache_path):
+    """
+    Returns the content of a JSON cache file, or None if it's missing or unreadable.
+    """
+    try:
+        with open(cache_path, 'r') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+def save_cache(cache_path, content):
+    """
+    Writes a JSON cache file. The file is replaced at once, so concurrent readers never see a partial file.
+    """
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as cache_file:
+            json.dump(content, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # A cache that can't be written only costs time
+        pass
@@ -1,4 +1,35 @@
-from cr8d.utils.core.config import Config
-from cr8d.utils.core.logging import Logger
+import importlib
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+)
 
-__all__ = ["Logger", "Config"]
\ No newline at end of file
+if TYPE_CHECKING:
+    from .config import Config
+    from .logging import Logger
+
+# The public names of the package, by module. They're imported on first access, so importing the
+# package (or only one of its modules, like the config) doesn't import the others.
+_LAZY_EXPORTS: Dict[str, str] = {
+    "Config": "config",
+    "Logger": "logging",
+}
+
+__all__ = ["Logger", "Config"]
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f"{__name__}.{module_name}"), name)
+    # Cached in the module, so __getattr__ is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,206 @@
+import inspect
+import json
+from time import perf_counter
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    MutableMapping,
+    Optional,
+)
+
+from sds.utils.core.context import (
+    reset_request_context,
+    set_request_context,
+)
+from sds.utils.core.logging import Logger
+from sds.utils.core.spans import start_benchmark
+from sds.utils.core.startup import (
+    finish_profiling,
+    is_profiling,
+    profile_phase,
+)
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# The header set by the Google front end, in the "TRACE_ID/SPAN_ID;o=1" format
+CLOUD_TRACE_HEADER = b"x-cloud-trace-context"
+
+
+class RequestLoggingMiddleware:
+    """ASGI middleware recording an API request log entry and the latency of every HTTP request.
+
+    The request context (tracking id, route, method and start time) is set for the whole request,
+    so the entries logged while handling it carry its tracking id, and the timings of the spans
+    finished during the request are recorded as the benchmark of the API request entry. The latency
+    is also recorded with Logger.perf() as "API_LATENCY", so it's aggregated in AGGREGATE perf mode.
+
+    Works with any ASGI framework:
+
+        app = RequestLoggingMiddleware(app)
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        tracking_header: bytes = CLOUD_TRACE_HEADER,
+        excluded_paths: Collection[str] = ("/health",),
+    ):
+        """Wrap an ASGI application.
+
+        :param app: The ASGI application
+        :param bytes tracking_header: The (lower case) header holding the tracking id of the request
+        :param excluded_paths: The paths of the requests not recorded, like health checks
+        """
+        self.app = app
+        self.tracking_header = tracking_header.lower()
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        tracking_id: Optional[str] = None
+        for header_name, header_value in scope.get("headers", ()):
+            if header_name == self.tracking_header:
+                tracking_id = header_value.decode("latin-1")
+                break
+
+        method: str = scope.get("method", "")
+        context_token = set_request_context(tracking_id=tracking_id, route=scope["path"], method=method)
+        start_benchmark()
+
+        response: Dict[str, Any] = {"status_code": None}
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status_code"] = message["status"]
+            await send(message)
+
+        start_time = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            if response["status_code"] is None:
+                response["status_code"] = 500
+            raise
+        finally:
+            latency_ms = round((perf_counter() - start_time) * 1000, 3)
+            route = self._get_route(scope)
+
+            try:
+                Logger.perf("API_LATENCY", latency_ms, "ms", route=route)
+                Logger.api_request(
+                    route,
+                    None,
+                    None,
+                    method=method,
+                    status_code=response["status_code"],
+                    tracking_id=tracking_id,
+                    latency_ms=latency_ms,
+                )
+            finally:
+                # The next requests handled by this task must not inherit the context, even if logging failed
+                reset_request_context(context_token)
+
+    def _get_route(self, scope: Scope) -> str:
+        """Get the route template of the request (set by frameworks like Starlette), or its path."""
+        route = scope.get("route")
+        route_path = getattr(route, "path", None)
+        return route_path if isinstance(route_path, str) else scope["path"]
+
+
+class ServiceApp:
+    """The ASGI application of a Cloud Run service, wrapping the application of the service.
+
+    It adds what every service needs:
+    - A health endpoint, answering 200 once started and 503 while shutting down, so the traffic
+      stops being routed to the instance while the in-flight requests are drained.
+    - The lifespan events: `on_startup` and `on_shutdown` (functions or coroutine functions) are
+      called, and the pending log entries are written at shutdown.
+    - The request logging of RequestLoggingMiddleware.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        health_path: str = "/health",
+        on_startup: Optional[Callable[[], Any]] = None,
+        on_shutdown: Optional[Callable[[], Any]] = None,
+    ):
+        self.app = RequestLoggingMiddleware(app, excluded_paths=(health_path,))
+        self.health_path = health_path
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self.started = False
+        self.shutting_down = False
+        # The startup profile ends with the first request (see sds.core.startup)
+        self._first_request_pending = is_profiling()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == self.health_path:
+            await self._handle_health_check(send)
+        elif self._first_request_pending:
+            self._first_request_pending = False
+            try:
+                with profile_phase("FIRST_REQUEST"):
+                    await self.app(scope, receive, send)
+            finally:
+                finish_profiling()
+        else:
+            await self.app(scope, receive, send)
+
+    async def _handle_health_check(self, send: Send) -> None:
+        healthy = self.started and not self.shutting_down
+        body = json.dumps({"status": "ok" if healthy else "unavailable"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200 if healthy else 503,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _handle_lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    with profile_phase("STARTUP_HOOK"):
+                        await self._call_hook(self.on_startup)
+                except Exception as e:
+                    Logger.exception(f"STARTUP_ERROR|{str(e)}")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                self.started = True
+                Logger.sys("SERVICE_STARTED")
+                await send({"type": "lifespan.startup.complete"})
+
+            elif message["type"] == "lifespan.shutdown":
+                # The server stopped accepting connections and drained the in-flight requests
+                self.shutting_down = True
+                try:
+                    await self._call_hook(self.on_shutdown)
+                except Exception as e:
+                    Logger.exception(f"SHUTDOWN_ERROR|{str(e)}")
+                Logger.sys("SERVICE_STOPPED")
+                Logger.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _call_hook(self, hook: Optional[Callable[[], Any]]) -> None:
+        if hook is None:
+            return
+        result = hook()
+        if inspect.isawaitable(result):
+            await result
@@ -0,0 +1,287 @@
+import os
+import re
+import threading
+import time
+import uuid
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+from sds.utils.core.config import Config
+from sds.utils.core.logging import Logger
+
+T = TypeVar("T")
+
+# Set by Cloud Run jobs: the execution name is kept when a failed task is retried
+EXECUTION_ENVVAR = "CLOUD_RUN_EXECUTION"
+
+
+def _get_safe_name(checkpoint_id: str) -> str:
+    """Get a checkpoint id usable in a file or object name."""
+    return re.sub(r"[^\w.-]", "_", checkpoint_id)
+
+
+class CheckpointBackend(ABC):
+    """Where the checkpoints are stored: the keys of the completed items, by checkpoint id."""
+
+    @abstractmethod
+    def load(self, checkpoint_id: str) -> Set[str]:
+        """Get the keys of the items already completed."""
+
+    @abstractmethod
+    def save(self, checkpoint_id: str, keys: List[str]) -> None:
+        """Add the keys of newly completed items. Called with batches of keys."""
+
+    @abstractmethod
+    def clear(self, checkpoint_id: str) -> None:
+        """Forget the completed items, e.g. when the work is done."""
+
+
+class LocalFileCheckpointBackend(CheckpointBackend):
+    """Stores the checkpoints in append-only files, one key per line, in a local directory.
+
+    Meant for local runs and tests, or a volume mounted in the job (e.g. a Cloud Storage bucket).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _get_file_path(self, checkpoint_id: str) -> str:
+        return os.path.join(self.directory, _get_safe_name(checkpoint_id) + ".checkpoint")
+
+    def load(self, checkpoint_id: str) -> Set[str]:
+        try:
+            with open(self._get_file_path(checkpoint_id), "r") as file:
+                # A line cut by a crash has no end of line, and is ignored
+                return {line[:-1] for line in file if line.endswith("\n")}
+        except FileNotFoundError:
+            return set()
+
+    def save(self, checkpoint_id: str, keys: List[str]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._get_file_path(checkpoint_id), "a") as file:
+            file.write("".join(f"{key}\n" for key in keys))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def clear(self, checkpoint_id: str) -> None:
+        try:
+            os.remove(self._get_file_path(checkpoint_id))
+        except FileNotFoundError:
+            pass
+
+
+class GcsCheckpointBackend(CheckpointBackend):
+    """Stores the checkpoints in a Cloud Storage bucket, so they survive the restart of a Cloud Run job task.
+
+    Objects can't be appended to, so every save (once per checkpoint interval) writes a new object
+    under "<prefix>/<checkpoint id>/", and a load reads them all. The load then compacts them in a
+    single object, so a restart only reads the objects saved since the previous one.
+    """
+
+    def __init__(self, bucket_name: str, prefix: str = "checkpoints", client: Any = None):
+        """Connect to the bucket.
+
+        :param str bucket_name: The name of the bucket
+        :param str prefix: The prefix of the objects of the checkpoints in the bucket
+        :param client: A google.cloud.storage.Client. Defaults to a client of the current project
+        """
+        if client is None:
+            # Imported here, since the storage client is slow to import and only needed by jobs using it
+            from google.cloud import storage  # type: ignore[attr-defined, import-untyped]
+
+            client = storage.Client()
+        self.bucket = client.bucket(bucket_name)
+        self.prefix = prefix
+
+    def _get_object_prefix(self, checkpoint_id: str) -> str:
+        return f"{self.prefix}/{_get_safe_name(checkpoint_id)}/"
+
+    def load(self, checkpoint_id: str) -> Set[str]:
+        blobs = list(self.bucket.list_blobs(prefix=self._get_object_prefix(checkpoint_id)))
+        keys: Set[str] = set()
+        for blob in blobs:
+            keys.update(blob.download_as_text().splitlines())
+
+        if len(blobs) > 1:
+            # Written before the objects are deleted, so a crash in between loses no key
+            self.save(checkpoint_id, sorted(keys))
+            for blob in blobs:
+                blob.delete()
+        return keys
+
+    def save(self, checkpoint_id: str, keys: List[str]) -> None:
+        # Named by the time first, so the objects are listed in the order they were saved
+        object_name = f"{self._get_object_prefix(checkpoint_id)}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        self.bucket.blob(object_name).upload_from_string("".join(f"{key}\n" for key in keys))
+
+    def clear(self, checkpoint_id: str) -> None:
+        for blob in self.bucket.list_blobs(prefix=self._get_object_prefix(checkpoint_id)):
+            blob.delete()
+
+
+def get_default_backend() -> CheckpointBackend:
+    """Get the backend configured by the "checkpoint" config entries.
+
+    "checkpoint.bucket" selects a Cloud Storage bucket, and "checkpoint.directory" a local directory.
+    The local disk of a Cloud Run container is in memory and lost on restart, so a job must configure
+    one of them. Elsewhere, the directory defaults to /tmp/checkpoints.
+    """
+    bucket_name = Config.get("checkpoint.bucket", None)
+    if bucket_name:
+        return GcsCheckpointBackend(bucket_name, Config.get("checkpoint.prefix", "checkpoints"))
+
+    directory = Config.get("checkpoint.directory", None)
+    if directory is None:
+        if EXECUTION_ENVVAR in os.environ:
+            raise RuntimeError(
+                "FATAL|CHECKPOINT_LOCATION_MISSING|A Cloud Run job must set the 'checkpoint.bucket' config "
+                "entry (or 'checkpoint.directory' to a mounted volume), since its local disk is lost on restart."
+            )
+        directory = "/tmp/checkpoints"
+    return LocalFileCheckpointBackend(directory)
+
+
+def get_default_checkpoint_id() -> str:
+    """Get a checkpoint id shared by the attempts of the current Cloud Run job task.
+
+    The retries of a task keep the execution name and the task index, so a retry resumes the work
+    of the failed attempt. A new execution starts from scratch.
+    """
+    execution = os.environ.get(EXECUTION_ENVVAR, "local")
+    task_index = os.environ.get("CLOUD_RUN_TASK_INDEX", "0")
+    return f"{execution}-task{task_index}"
+
+
+class Checkpoint:
+    """Records the progress of a job, so a restarted job skips the work already completed.
+
+    The keys of the completed items are buffered and saved in batches, every `interval_items`
+    items or `interval_seconds` seconds, whichever comes first. A larger interval costs fewer
+    writes, but more items are processed again after a crash (at most one interval of items).
+    Items must be idempotent, since the items of the last unsaved batch are processed again.
+
+        with Checkpoint() as checkpoint:
+            for item in checkpoint.pending(load_items(), key=lambda item: item.id):
+                process(item)
+                checkpoint.mark_done(item.id)
+
+    The buffered keys are saved when the block exits, even on an error. It's thread safe.
+    """
+
+    def __init__(
+        self,
+        checkpoint_id: Optional[str] = None,
+        backend: Optional[CheckpointBackend] = None,
+        interval_items: Optional[int] = None,
+        interval_seconds: Optional[float] = None,
+    ):
+        """Load a checkpoint.
+
+        :param str checkpoint_id: The id of the checkpoint. Defaults to get_default_checkpoint_id()
+        :param CheckpointBackend backend: Defaults to get_default_backend()
+        :param int interval_items: Defaults to the "checkpoint.interval_items" config entry (or 100)
+        :param float interval_seconds: Defaults to the "checkpoint.interval_seconds" config entry (or 30)
+        """
+        self.checkpoint_id = checkpoint_id or get_default_checkpoint_id()
+        self.backend = backend or get_default_backend()
+        self.interval_items = interval_items or int(Config.get("checkpoint.interval_items", 100))
+        self.interval_seconds = interval_seconds or float(Config.get("checkpoint.interval_seconds", 30))
+
+        self._lock = threading.Lock()
+        self._completed_keys: Set[str] = self.backend.load(self.checkpoint_id)
+        self._unsaved_keys: List[str] = []
+        self._saved_at = time.monotonic()
+
+        if self._completed_keys:
+            Logger.sys("CHECKPOINT_RESUME", checkpoint_id=self.checkpoint_id, completed_count=len(self._completed_keys))
+
+    @property
+    def completed_count(self) -> int:
+        return len(self._completed_keys)
+
+    def is_done(self, key: Any) -> bool:
+        return str(key) in self._completed_keys
+
+    def pending(self, items: Iterable[T], key: Callable[[T], Any] = str) -> Iterator[T]:
+        """Get the items not completed yet."""
+        completed_keys = self._completed_keys
+        for item in items:
+            if str(key(item)) not in completed_keys:
+                yield item
+
+    def mark_done(self, key: Any) -> None:
+        """Record a completed item. Saved with the next batch."""
+        self.mark_all_done((key,))
+
+    def mark_all_done(self, keys: Iterable[Any]) -> None:
+        """Record completed items. Saved with the next batch.
+
+        If the batch can't be saved, a warning is logged and its keys are saved with the next one,
+        so a transient failure of the backend doesn't stop the work.
+        """
+        with self._lock:
+            for key in keys:
+                key = str(key)
+                if key not in self._completed_keys:
+                    self._completed_keys.add(key)
+                    self._unsaved_keys.append(key)
+
+            if (
+                len(self._unsaved_keys) >= self.interval_items
+                or time.monotonic() - self._saved_at >= self.interval_seconds
+            ):
+                try:
+                    self._save()
+                except Exception as e:
+                    # Any error of the backend (the Cloud Storage errors are not OSErrors)
+                    Logger.warning(
+                        f"CHECKPOINT_SAVE_ERROR|{str(e)}",
+                        checkpoint_id=self.checkpoint_id,
+                        unsaved_count=len(self._unsaved_keys),
+                    )
+
+    def flush(self) -> None:
+        """Save the buffered keys now."""
+        with self._lock:
+            self._save()
+
+    def clear(self) -> None:
+        """Forget the progress, once the work is done and must not be skipped by a new run."""
+        with self._lock:
+            self._unsaved_keys = []
+            self._completed_keys = set()
+            self.backend.clear(self.checkpoint_id)
+
+    def _save(self) -> None:
+        """Save the buffered keys. Must be called with the lock held.
+
+        The keys stay buffered if the backend fails, and the next save is tried after an interval.
+        """
+        self._saved_at = time.monotonic()
+        if not self._unsaved_keys:
+            return
+
+        keys = self._unsaved_keys
+        start_time = time.perf_counter()
+        self.backend.save(self.checkpoint_id, keys)
+        self._unsaved_keys = []
+        elapsed_ms = round((time.perf_counter() - start_time) * 1000, 3)
+        Logger.perf("CHECKPOINT_SAVE_TIME", elapsed_ms, "ms", key_count=len(keys))
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.flush()
@@ -1,16 +1,119 @@
+import hashlib
 import importlib.resources
+import logging
+import marshal
 import os
+import sys
+import threading
 from importlib.resources.abc import Traversable
+from types import MappingProxyType
 from typing import (
     Any,
+    Callable,
     Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
 )
 
 import yaml
 
+from sds.utils.core.config_schema import load_schema
+
+_logger = logging.getLogger(__name__)
+
+# Marks a key path that is not found in the config
+_MISSING = object()
+
+# Marks a key path that is not in the get() cache yet
+_NOT_CACHED = object()
+
+# The C accelerated loader (libyaml) parses several times faster than the pure Python one
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# The config sources, merged from the lowest to the highest precedence:
+# - the config.yaml file of the service package
+# - the config.<env>.yaml file of the service package, when the CONFIG_ENV environment variable is set
+# - the file at the path in the CONFIG_YAML_PATH environment variable (a Secret mounted as a volume)
+# - the content of the CONFIG_YAML environment variable (a Secret exposed as a value)
+# - the SDS__<key>__<key>... environment variables, each overriding a single value
+CONFIG_FILENAME = "config.yaml"
+CONFIG_ENV_ENVVAR = "CONFIG_ENV"
+CONFIG_PATH_ENVVAR = "CONFIG_YAML_PATH"
+CONFIG_ENVVAR = "CONFIG_YAML"
+OVERRIDE_ENVVAR_PREFIX = "SDS__"
+
+# The precompiled config, next to config.yaml in the service package (see Config.compile_snapshot())
+SNAPSHOT_FILENAME = "config.snapshot"
+
+# The marshal format depends on the Python version: snapshots of other versions are ignored
+_SNAPSHOT_VERSION = (1, sys.version_info.major, sys.version_info.minor)
+
+# Errors of an unreadable snapshot (OSError), a corrupted one (EOFError, ValueError) or one written by
+# another Python version (TypeError when unpacked): the YAML content is parsed instead
+_SNAPSHOT_READ_ERRORS = (OSError, EOFError, ValueError, TypeError)
+
+# Errors of a change callback rejecting a value of the new config
+_CHANGE_CALLBACK_ERRORS = (ValueError, TypeError, KeyError)
+
+
+def _freeze(value: Any) -> Any:
+    """Get a read-only copy of a parsed config value (mappings become read-only proxies, lists become tuples)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _read_config_file(config_file_path: str) -> str | None:
+    """Retrieves the content of a config file, if it exists."""
+    try:
+        with open(config_file_path, "r") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+class ConfigKey:
+    """A precompiled accessor of a config value, created with Config.key().
+
+    The value is resolved once per config load, so reading it is a single attribute comparison.
+    """
+
+    __slots__ = ("key_path", "default_value", "_generation", "_value")
+
+    def __init__(self, key_path: str, default_value: Any = None):
+        self.key_path = key_path
+        self.default_value = default_value
+        self._generation: int = -1
+        self._value: Any = _MISSING
+
+    def get(self) -> Any:
+        """Get the config value, or the default value if it's not found."""
+        generation = Config._generation
+        if self._generation != generation:
+            self._value = Config.get(self.key_path, _MISSING)
+            self._generation = generation
+
+        return self.default_value if self._value is _MISSING else self._value
+
+    __call__ = get
+
 
 class Config:
-    _config_instance: Dict[str, Any] | None = None
+    # The merged config. It's read-only, so it's shared by threads without locks.
+    _config_instance: Mapping[str, Any] | None = None
+
+    # The source of every key path of the config (the last layer that set it)
+    _key_path_sources: Mapping[str, str] = MappingProxyType({})
+
+    # The values resolved by get(), by key path. Cleared when the config is loaded.
+    _key_path_cache: Dict[str, Any] = {}
+
+    # Incremented every time the config is loaded, to invalidate the ConfigKey values
+    _generation: int = 0
 
     # The package name of the Mutua service that is currently being executed
     _this_service_package: str | None = None
@@ -18,14 +121,27 @@ class Config:
     # The folder path of the Mutua service that is currently being executed
     _service_folder_path: Traversable | None = None
 
+    # The paths of the files the config was loaded from
+    _config_file_paths: List[str] = []
+    _flatten: bool = False
+
+    # The typed config, an instance of the schema given to initialize() (None without a schema).
+    # Its values are validated and converted once per load, so reading them is an attribute load.
+    settings: Any = None
+    _schema: type | None = None
+
+    # Hot reload: the functions called with (old config, new config) and the watcher stop event
+    _change_callbacks: List[Callable[[Mapping[str, Any], Mapping[str, Any]], None]] = []
+    _watcher_stop_event: threading.Event | None = None
+
     @classmethod
-    def _get_instance(cls) -> Dict[str, Any]:
+    def _get_instance(cls) -> Mapping[str, Any]:
         if cls._config_instance is None:
             raise ValueError("Config has not been initialized. Must call 'Config.initialize()'.")
         return cls._config_instance
 
     @classmethod
-    def get(cls, key_path: str, default_value: Any = None) -> str:
+    def get(cls, key_path: str, default_value: Any = None) -> Any:
         """Retrieves a value from a nested dictionary based on a path of keys.
 
         Args:
@@ -34,18 +150,92 @@ class Config:
 
         Returns:
             The value at the specified path, if found, or the default value otherwise.
+            Mappings and lists are returned as read-only mappings and tuples.
         """
+        # A reload replaces the cache: a value resolved meanwhile must not be stored in the new one
+        key_path_cache = cls._key_path_cache
+        value = key_path_cache.get(key_path, _NOT_CACHED)
+        if value is _NOT_CACHED:
+            value = cls._resolve(key_path)
+            # Key paths not found are cached too, they're as frequent as the others
+            key_path_cache[key_path] = value
+
+        return default_value if value is _MISSING else value
+
+    @classmethod
+    def key(cls, key_path: str, default_value: Any = None) -> ConfigKey:
+        """Get a precompiled accessor of a config value, for key paths read in hot paths.
+
+        Example:
+            SERVICE_NAME = Config.key("service.name")
+            ...
+            service_name = SERVICE_NAME()
+        """
+        return ConfigKey(key_path, default_value)
+
+    @classmethod
+    def _resolve(cls, key_path: str) -> Any:
+        """Walks the nested config dictionaries to find the value at a key path."""
         key_path_parts = key_path.split(".")
         current_level = cls._get_instance()
 
         for key_part in key_path_parts:
-            if isinstance(current_level, dict) and key_part in current_level:
+            if isinstance(current_level, Mapping) and key_part in current_level:
                 current_level = current_level[key_part]
             else:
-                return default_value  # Invalid path
+                return _MISSING  # Invalid path
 
         return current_level
 
+    @classmethod
+    def _set_instance(
+        cls,
+        config_dict: Mapping[str, Any],
+        flatten: bool = False,
+        key_path_sources: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Replace the config by a read-only copy and invalidate the cached values.
+
+        If `flatten` is True, every key path of the config is indexed at once, so no get()
+        call has to walk the nested dictionaries.
+        """
+        config_instance = _freeze(config_dict) if isinstance(config_dict, dict) else config_dict
+
+        key_path_cache: Dict[str, Any] = {}
+        if flatten and isinstance(config_instance, Mapping):
+
+            def index(prefix: str, level: Mapping[str, Any]) -> None:
+                for key, value in level.items():
+                    key_path = f"{prefix}{key}"
+                    key_path_cache[key_path] = value
+                    if isinstance(value, Mapping):
+                        index(f"{key_path}.", value)
+
+            index("", config_instance)
+
+        cls._config_instance = config_instance
+        cls._key_path_sources = MappingProxyType(key_path_sources or {})
+        cls._key_path_cache = key_path_cache
+        cls._generation += 1
+
+    @classmethod
+    def get_source(cls, key_path: str) -> str | None:
+        """Get the name of the source a config value comes from.
+
+        The source is the file name (e.g. "config.yaml"), the "CONFIG_YAML" environment variable
+        or the name of the overriding environment variable (e.g. "SDS__logging__level"). For a
+        mapping, it's the last source that set one of its values.
+
+        Returns:
+            The name of the source, or None if the key path is not found.
+        """
+        return cls._key_path_sources.get(key_path)
+
+    @classmethod
+    def get_sources(cls) -> Mapping[str, str]:
+        """Get the source of every key path of the config (see get_source())."""
+        return cls._key_path_sources
+
     @classmethod
     def get_service_root_folder_path(cls) -> Traversable:
         """Get the service root folder path (the python packages root folder)"""
@@ -57,68 +247,381 @@ class Config:
         return mutua_package_folder.joinpath("..")
 
     @classmethod
-    def initialize(cls, config_file_package: str) -> None:
-        """Initialize the Config singleton with configuration from a YAML content.
+    def initialize(
+        cls,
+        config_file_package: str,
+        flatten: bool = False,
+        watch: Optional[bool] = None,
+        schema: type | None = None,
+    ) -> None:
+        """Initialize the Config singleton by merging the configuration sources.
 
-        This method loads configuration from either a config.yaml file in the package
-        directory or from an environment variable. When deployed, the environment variable
-        is mapped to a Secret in the Cloud Run service.
+        The sources are merged from the lowest to the highest precedence:
+        - The config.yaml file in the package directory.
+        - The config.<env>.yaml file in the package directory, where <env> is the value of the
+          CONFIG_ENV environment variable (e.g. config.prod.yaml).
+        - The file at the path in the CONFIG_YAML_PATH environment variable.
+        - The YAML content of the CONFIG_YAML environment variable.
+        - The SDS__<key>__<key>... environment variables. Each one overrides the value at a key
+          path (e.g. SDS__logging__level=DEBUG sets "logging.level"), parsed as a YAML value.
 
-        It then parses the YAML content
-        and stores it in the singleton instance.
+        When deployed, the CONFIG_YAML* environment variables are mapped to a Secret (mounted as
+        a volume or exposed as a value) in the Cloud Run service. Mappings are merged key by key,
+        any other value replaces the value of the lower sources.
+
+        The merged config is resolved once and stored in the singleton instance as a read-only
+        mapping, so it can be shared by threads without locks. get_source() tells which source
+        each value comes from.
 
         Args:
             config_file_package: The package name where the config.yaml file is located
                                 or the suffix for the environment variable name.
+            flatten: If True, every key path is indexed at load time instead of on first use.
+            watch: If True, the config files are reloaded when they change (see watch()).
+                   Defaults to the "config.watch.enabled" entry, with the polling interval in
+                   "config.watch.interval_seconds".
+            schema: A dataclass describing the config (see config_schema.load_schema()). The config
+                    is validated and converted against it once, and the result is stored in
+                    Config.settings for typed attribute access:
+
+                        @dataclass(slots=True, frozen=True)
+                        class HttpSettings:
+                            port: int = 8080
+
+                        @dataclass(slots=True, frozen=True)
+                        class Settings:
+                            http: HttpSettings
+
+                        Config.initialize(this_package, schema=Settings)
+                        port = Config.settings.http.port
 
         Raises:
             ValueError: If no configuration is found or if the YAML content cannot be parsed.
+            ConfigValidationError: If the config doesn't match the schema, with every invalid key.
         """
+        cls.stop_watching()
 
-        CONFIG_FILENAME: str = "config.yaml"
-        CONFIG_ENVVAR: str = "CONFIG_YAML"
-
-        def get_content_from_config_file() -> str | None:
-            """Retrieves the content of the config.yaml file from the package."""
-            nonlocal CONFIG_FILENAME
+        # Get the absolute path of the Mutua service folder
+        cls._this_service_package = config_file_package
+        cls._service_folder_path: Traversable = importlib.resources.files(cls._this_service_package)
 
-            config_file_path = cls._service_folder_path.joinpath(CONFIG_FILENAME)
+        config_dict, key_path_sources, config_file_paths = cls._load_sources()
 
-            if os.path.exists(config_file_path):
-                with open(config_file_path, "r") as file:
-                    return file.read()
-            else:
-                return None
+        # Fail before anything is replaced if the config is invalid
+        config_instance = _freeze(config_dict)
+        settings = load_schema(schema, config_instance) if schema is not None else None
 
-        def get_content_from_envvar() -> str | None:
-            """Retrieves the configuration content from the environment variable."""
-            return os.environ.get(CONFIG_ENVVAR, None)
+        cls._config_file_paths = config_file_paths
+        cls._flatten = flatten
+        cls._schema = schema
+        cls._set_instance(config_instance, flatten, key_path_sources)
+        cls.settings = settings
 
-        #
-        # Start Config initialization
-        #
+        if watch is None:
+            watch = bool(cls.get("config.watch.enabled", False))
+        if watch and cls._config_file_paths:
+            cls.watch(float(cls.get("config.watch.interval_seconds", 10)))
 
-        # Get the absolute path of the Mutua service folder
-        cls._this_service_package = config_file_package
-        cls._service_folder_path: Traversable = importlib.resources.files(cls._this_service_package)
+    @classmethod
+    def _load_sources(cls) -> Tuple[Dict[str, Any], Dict[str, str], List[str]]:
+        """Reads, parses and merges the config sources.
 
-        # Look for the config YAML content (config.yaml file or environment variable)
-        config_content: str | None = get_content_from_config_file()
+        Returns:
+            The merged config, the source of every key path and the paths of the files read.
+        """
+        # (source name, parsed config) of the sources found, from the lowest to the highest precedence
+        sources: List[Tuple[str, Dict[str, Any]]] = []
+        config_file_paths: List[str] = []
 
-        # Try to find the config YAML content from file or environment variable
-        if config_content is None:
-            config_content = get_content_from_envvar()
+        cls._load_package_files(sources, config_file_paths)
+        cls._load_secret(sources, config_file_paths)
 
-        if config_content is None:
+        if not sources:
             raise RuntimeError(
                 f"FATAL|CONFIG_NOT_FOUND|"
-                f"Missing config file {CONFIG_FILENAME} or environment variable: {CONFIG_ENVVAR}"
+                f"Missing config file {CONFIG_FILENAME} or environment variables: {CONFIG_PATH_ENVVAR}, {CONFIG_ENVVAR}"
+            )
+
+        sources.extend(cls._load_overrides())
+
+        config_dict: Dict[str, Any] = {}
+        key_path_sources: Dict[str, str] = {}
+        for source_name, source_config_dict in sources:
+            cls._merge(config_dict, source_config_dict, "", source_name, key_path_sources)
+
+        return config_dict, key_path_sources, config_file_paths
+
+    @classmethod
+    def _load_package_files(cls, sources: List[Tuple[str, Dict[str, Any]]], config_file_paths: List[str]) -> None:
+        """Reads and parses the config.yaml and config.<env>.yaml files of the package, if they exist."""
+        service_folder_path = cls._service_folder_path
+        if service_folder_path is None:
+            raise ValueError("Config has not been initialized. Must call 'Config.initialize()'.")
+
+        config_filenames: List[str] = [CONFIG_FILENAME]
+        if os.environ.get(CONFIG_ENV_ENVVAR):
+            config_filenames.append(f"config.{os.environ[CONFIG_ENV_ENVVAR]}.yaml")
+
+        for config_filename in config_filenames:
+            config_file_path = str(service_folder_path.joinpath(config_filename))
+            config_content = _read_config_file(config_file_path)
+            if config_content is None:
+                continue
+
+            config_dict: Dict[str, Any] | None = None
+            if config_filename == CONFIG_FILENAME:
+                # Loaded from the snapshot if it was compiled from the same content
+                snapshot_path = str(service_folder_path.joinpath(SNAPSHOT_FILENAME))
+                config_dict = cls._load_snapshot(config_content, snapshot_path)
+
+            sources.append(
+                (config_filename, config_dict if config_dict is not None else cls._parse_content(config_content))
             )
+            config_file_paths.append(config_file_path)
+
+    @classmethod
+    def _load_secret(cls, sources: List[Tuple[str, Dict[str, Any]]], config_file_paths: List[str]) -> None:
+        """Reads and parses the config of the mounted Secret file and of the Secret value, if they're set."""
+        if os.environ.get(CONFIG_PATH_ENVVAR):
+            config_file_path = os.environ[CONFIG_PATH_ENVVAR]
+            config_content = _read_config_file(config_file_path)
+            if config_content is not None:
+                sources.append((config_file_path, cls._parse_content(config_content)))
+                config_file_paths.append(config_file_path)
+
+        config_content = os.environ.get(CONFIG_ENVVAR, None)
+        if config_content is not None:
+            sources.append((CONFIG_ENVVAR, cls._parse_content(config_content)))
+
+    @classmethod
+    def _load_overrides(cls) -> List[Tuple[str, Dict[str, Any]]]:
+        """Parses the single value overrides of the SDS__<key>__<key>... environment variables."""
+        overrides: List[Tuple[str, Dict[str, Any]]] = []
+
+        # Sorted, so the result doesn't depend on the environment order
+        for envvar_name in sorted(os.environ):
+            if envvar_name.startswith(OVERRIDE_ENVVAR_PREFIX):
+                override = cls._parse_override(envvar_name, os.environ[envvar_name])
+                if override is not None:
+                    overrides.append((envvar_name, override))
+
+        return overrides
+
+    @classmethod
+    def _parse_override(cls, envvar_name: str, envvar_value: str) -> Dict[str, Any] | None:
+        """Converts a SDS__<key>__<key>... environment variable to a nested config dictionary."""
+        key_path_parts = [
+            key_part for key_part in envvar_name.removeprefix(OVERRIDE_ENVVAR_PREFIX).split("__") if key_part
+        ]
+        if not key_path_parts:
+            return None
+
+        # The value is parsed as YAML, so numbers, booleans and lists keep their type
+        value: Any = envvar_value
+        if envvar_value:
+            try:
+                value = yaml.load(envvar_value, Loader=_YAML_LOADER)
+            except yaml.YAMLError:
+                value = envvar_value
+
+        for key_part in reversed(key_path_parts):
+            value = {key_part: value}
+        return value
+
+    @classmethod
+    def _merge(
+        cls,
+        target: Dict[str, Any],
+        source: Dict[str, Any],
+        prefix: str,
+        source_name: str,
+        key_path_sources: Dict[str, str],
+    ) -> None:
+        """Merges a source config into the target config, recording the source of every key path."""
+        for key, value in source.items():
+            key_path = f"{prefix}{key}"
+            key_path_sources[key_path] = source_name
+
+            if isinstance(value, dict):
+                if not isinstance(target.get(key), dict):
+                    target[key] = {}
+                cls._merge(target[key], value, f"{key_path}.", source_name, key_path_sources)
+            else:
+                if isinstance(target.get(key), dict):
+                    # The values of the replaced mapping are gone
+                    replaced_prefix = f"{key_path}."
+                    for replaced_key_path in [path for path in key_path_sources if path.startswith(replaced_prefix)]:
+                        del key_path_sources[replaced_key_path]
+                target[key] = value
 
-        # Config content was found. Try to load it.
+    @classmethod
+    def _parse_content(cls, config_content: str) -> Dict[str, Any]:
+        """Parses and validates the YAML content of a config."""
         try:
-            config_dict = yaml.safe_load(config_content)
+            config_dict = yaml.load(config_content, Loader=_YAML_LOADER)
         except yaml.YAMLError as e:
             raise RuntimeError(f"FATAL|CONFIG_PARSE_ERROR|{str(e)}")
 
-        cls._config_instance = config_dict
+        if config_dict is None:
+            return {}
+        if not isinstance(config_dict, dict):
+            raise RuntimeError(
+                f"FATAL|CONFIG_PARSE_ERROR|The config must be a mapping, not {type(config_dict).__name__}"
+            )
+
+        return config_dict
+
+    @classmethod
+    def compile_snapshot(cls, config_file_package: str) -> bool:
+        """Precompile the config.yaml file of a package into a snapshot, at build time.
+
+        The snapshot holds the parsed config and the hash of the YAML content it was compiled
+        from. initialize() loads it instead of parsing the YAML content when the content is
+        unchanged, which saves most of the config loading time of a cold start.
+
+        Args:
+            config_file_package: The package name where the config.yaml file is located.
+
+        Returns:
+            False if the config has values the snapshot can't store (e.g. dates) and no
+            snapshot was written.
+        """
+        service_folder_path: Traversable = importlib.resources.files(config_file_package)
+        with open(str(service_folder_path.joinpath("config.yaml")), "r") as file:
+            config_content = file.read()
+
+        config_dict = cls._parse_content(config_content)
+        try:
+            snapshot = marshal.dumps((_SNAPSHOT_VERSION, cls._get_content_hash(config_content), config_dict))
+        except ValueError:
+            return False
+
+        with open(str(service_folder_path.joinpath(SNAPSHOT_FILENAME)), "wb") as file:
+            file.write(snapshot)
+        return True
+
+    @classmethod
+    def _load_snapshot(cls, config_content: str, snapshot_path: str) -> Dict[str, Any] | None:
+        """Loads the snapshot compiled from a YAML content, if there is one."""
+        try:
+            with open(snapshot_path, "rb") as file:
+                snapshot_version, content_hash, config_dict = marshal.load(file)
+        except FileNotFoundError:
+            return None
+        except _SNAPSHOT_READ_ERRORS:
+            return None
+
+        if snapshot_version != _SNAPSHOT_VERSION or content_hash != cls._get_content_hash(config_content):
+            return None
+        return config_dict
+
+    @classmethod
+    def _get_content_hash(cls, config_content: str) -> str:
+        return hashlib.sha256(config_content.encode()).hexdigest()
+
+    @classmethod
+    def on_change(cls, callback: Callable[[Mapping[str, Any], Mapping[str, Any]], None]) -> None:
+        """Register a function called with the old and the new config when the config is reloaded.
+
+        A ValueError, TypeError or KeyError raised by the callback (an invalid value in the new
+        config) is logged and the next callbacks are called. Other errors are raised by reload().
+        """
+        cls._change_callbacks.append(callback)
+
+    @classmethod
+    def reload(cls) -> bool:
+        """Read the config sources again and replace the config if it changed.
+
+        The new content is parsed, validated and merged before the config is replaced, so the
+        current config is kept if it's invalid. The change callbacks are called after the replacement.
+
+        Returns:
+            True if the config was replaced.
+
+        Raises:
+            RuntimeError: If the config is not found, the new YAML content cannot be parsed or the
+                          new config doesn't match the schema.
+            OSError: If a config file cannot be read.
+        """
+        old_config = cls._get_instance()
+
+        config_dict, key_path_sources, config_file_paths = cls._load_sources()
+
+        new_config = _freeze(config_dict)
+        if new_config == old_config and key_path_sources == cls._key_path_sources:
+            return False
+
+        settings = load_schema(cls._schema, new_config) if cls._schema is not None else None
+
+        cls._config_file_paths = config_file_paths
+        cls._set_instance(new_config, cls._flatten, key_path_sources)
+        cls.settings = settings
+
+        for callback in list(cls._change_callbacks):
+            try:
+                callback(old_config, new_config)
+            except _CHANGE_CALLBACK_ERRORS:
+                _logger.exception("CONFIG_CHANGE_CALLBACK_ERROR")
+
+        return True
+
+    @classmethod
+    def watch(cls, interval_seconds: float = 10) -> None:
+        """Reload the config when one of its files changes, without restarting the process.
+
+        A background thread polls the inode, modification time and size of the files, which also
+        detects the updates of Secrets mounted as volumes (the file is replaced, not modified).
+        """
+        if not cls._config_file_paths:
+            raise ValueError("Config was not loaded from a file, it can't be watched.")
+
+        cls.stop_watching()
+
+        # Read before the thread starts, so a change made in the meantime is detected
+        file_paths = list(cls._config_file_paths)
+        file_signatures = [cls._get_file_signature(file_path) for file_path in file_paths]
+
+        stop_event = threading.Event()
+        cls._watcher_stop_event = stop_event
+        threading.Thread(
+            target=cls._watch_config_files,
+            args=(file_paths, file_signatures, interval_seconds, stop_event),
+            name="sds-config-watcher",
+            daemon=True,
+        ).start()
+
+    @classmethod
+    def stop_watching(cls) -> None:
+        """Stop the config file watcher, if any."""
+        if cls._watcher_stop_event is not None:
+            cls._watcher_stop_event.set()
+            cls._watcher_stop_event = None
+
+    @classmethod
+    def _get_file_signature(cls, file_path: str) -> Tuple[int, int, int] | None:
+        try:
+            file_stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size
+
+    @classmethod
+    def _watch_config_files(
+        cls,
+        file_paths: List[str],
+        file_signatures: List[Tuple[int, int, int] | None],
+        interval_seconds: float,
+        stop_event: threading.Event,
+    ) -> None:
+        """The config watcher thread loop."""
+        while not stop_event.wait(interval_seconds):
+            new_file_signatures = [cls._get_file_signature(file_path) for file_path in file_paths]
+            if None in new_file_signatures or new_file_signatures == file_signatures:
+                continue
+
+            file_signatures = new_file_signatures
+            try:
+                cls.reload()
+            except (RuntimeError, OSError) as e:
+                # An invalid file (or a file being written) must not replace a valid config
+                _logger.warning("CONFIG_RELOAD_ERROR|Keeping the current config|%s", e)
@@ -0,0 +1,326 @@
+import collections.abc
+import dataclasses
+import functools
+import types
+import typing
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+
+# Converts a config value to a generic or container type: (type, type arguments, value, key path, errors)
+_Converter = Callable[[Any, Tuple[Any, ...], Any, str, List[Tuple[str, str]]], Any]
+
+# The strings accepted for boolean values (compared in lower case)
+_TRUE_STRINGS = frozenset(("true", "yes", "on", "1"))
+_FALSE_STRINGS = frozenset(("false", "no", "off", "0"))
+
+
+class ConfigValidationError(RuntimeError):
+    """Raised when the config doesn't match its schema. Lists every invalid key path."""
+
+    def __init__(self, errors: List[Tuple[str, str]]):
+        self.errors = errors
+        details = "; ".join(f"{key_path}: {error}" for key_path, error in errors)
+        super().__init__(f"FATAL|CONFIG_INVALID|{len(errors)} invalid config key(s): {details}")
+
+
+class _SchemaField(typing.NamedTuple):
+    name: str
+    key: str
+    field_type: Any
+    required: bool
+
+
+@functools.lru_cache(maxsize=None)
+def _get_schema_fields(schema: type) -> Tuple[_SchemaField, ...]:
+    """Get the fields of a schema dataclass, with their resolved type annotations."""
+    type_hints = typing.get_type_hints(schema)
+    return tuple(
+        _SchemaField(
+            name=field.name,
+            # The config key can differ from the attribute name, e.g. for Python keywords like "async"
+            key=field.metadata.get("key", field.name),
+            field_type=type_hints[field.name],
+            required=field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING,
+        )
+        for field in dataclasses.fields(schema)
+        if field.init
+    )
+
+
+def load_schema(schema: Type[T], config: Mapping[str, Any]) -> T:
+    """Validate a config against a schema and convert it to an instance of the schema.
+
+    The schema is a dataclass (ideally with `slots=True` and `frozen=True`, so reading a value is
+    a plain attribute load). Nested dataclasses map to nested mappings, and the config key of a
+    field is its name, or the "key" of its metadata (`field(metadata={"key": "async"})`). Fields
+    without a default are required. The config keys that are not in the schema are ignored.
+
+    Values are converted to the annotated types: str, int, float, bool (also from "true", "no",
+    etc...), enums (by value or name), Optional and Union, Literal, list, tuple, set, dict and
+    Mapping (with their item types), and Any (kept as they are).
+
+    Raises:
+        ConfigValidationError: If some values are missing or invalid. Every invalid key path is
+            listed, not only the first one.
+    """
+    errors: List[Tuple[str, str]] = []
+    instance = _convert_dataclass(schema, config, "", errors)
+    if errors:
+        raise ConfigValidationError(errors)
+    return instance
+
+
+def _get_type_name(field_type: Any) -> str:
+    if isinstance(field_type, type):
+        return field_type.__name__
+    return str(field_type).replace("typing.", "")
+
+
+def _convert_dataclass(schema: type, value: Any, key_path: str, errors: List[Tuple[str, str]]) -> Any:
+    if not isinstance(value, Mapping):
+        errors.append((key_path or "<root>", f"expected a mapping, got {value!r}"))
+        return None
+
+    error_count = len(errors)
+    kwargs = {}
+    for schema_field in _get_schema_fields(schema):
+        field_key_path = f"{key_path}.{schema_field.key}" if key_path else schema_field.key
+        if schema_field.key in value:
+            kwargs[schema_field.name] = _convert(
+                schema_field.field_type, value[schema_field.key], field_key_path, errors
+            )
+        elif schema_field.required:
+            errors.append((field_key_path, "missing"))
+
+    if len(errors) > error_count:
+        return None
+    return schema(**kwargs)
+
+
+def _convert(field_type: Any, value: Any, key_path: str, errors: List[Tuple[str, str]]) -> Any:
+    """Convert a config value to a type, or add an error."""
+    if field_type is Any:
+        return value
+
+    origin = typing.get_origin(field_type)
+    args = typing.get_args(field_type)
+
+    # Union and Literal types decide themselves if None is valid
+    generic_converter = _GENERIC_CONVERTERS.get(origin)
+    if generic_converter is not None:
+        return generic_converter(field_type, args, value, key_path, errors)
+
+    if value is None:
+        errors.append((key_path, f"expected {_get_type_name(field_type)}, got None"))
+        return None
+
+    if isinstance(field_type, type) and dataclasses.is_dataclass(field_type):
+        return _convert_dataclass(field_type, value, key_path, errors)
+
+    container_type = origin or field_type
+    container_converter = _CONTAINER_CONVERTERS.get(container_type)
+    if container_converter is not None:
+        return container_converter(container_type, args, value, key_path, errors)
+
+    if isinstance(field_type, type) and issubclass(field_type, Enum):
+        return _convert_enum(field_type, value, key_path, errors)
+
+    converted = _convert_scalar(field_type, value)
+    if converted is None:
+        errors.append((key_path, f"expected {_get_type_name(field_type)}, got {value!r}"))
+    return converted
+
+
+def _convert_union(
+    field_type: Any,
+    args: Tuple[Any, ...],
+    value: Any,
+    key_path: str,
+    errors: List[Tuple[str, str]],
+) -> Any:
+    if value is None and type(None) in args:
+        return None
+    candidate_types = [arg for arg in args if arg is not type(None)]
+    if len(candidate_types) == 1:
+        return _convert(candidate_types[0], value, key_path, errors)
+    for candidate_type in candidate_types:
+        candidate_errors: List[Tuple[str, str]] = []
+        converted = _convert(candidate_type, value, key_path, candidate_errors)
+        if not candidate_errors:
+            return converted
+    errors.append((key_path, f"expected {_get_type_name(field_type)}, got {value!r}"))
+    return None
+
+
+def _convert_literal(
+    field_type: Any,
+    args: Tuple[Any, ...],
+    value: Any,
+    key_path: str,
+    errors: List[Tuple[str, str]],
+) -> Any:
+    if value not in args:
+        errors.append((key_path, f"expected one of {', '.join(repr(arg) for arg in args)}, got {value!r}"))
+    return value
+
+
+def _convert_collection(
+    container_type: Any,
+    args: Tuple[Any, ...],
+    value: Any,
+    key_path: str,
+    errors: List[Tuple[str, str]],
+) -> Any:
+    if not isinstance(value, (list, tuple)):
+        errors.append((key_path, f"expected a list, got {value!r}"))
+        return None
+
+    if container_type is tuple and args and args[-1] is not Ellipsis:
+        # Fixed length tuple, like Tuple[str, int]
+        if len(value) != len(args):
+            errors.append((key_path, f"expected {len(args)} items, got {len(value)}"))
+            return None
+        item_types = args
+    else:
+        item_types = (args[0] if args else Any,) * len(value)
+
+    items = [
+        _convert(item_type, item, f"{key_path}[{index}]", errors)
+        for index, (item_type, item) in enumerate(zip(item_types, value))
+    ]
+    if container_type is collections.abc.Sequence:
+        return tuple(items)
+    return container_type(items)
+
+
+def _convert_mapping(
+    container_type: Any,
+    args: Tuple[Any, ...],
+    value: Any,
+    key_path: str,
+    errors: List[Tuple[str, str]],
+) -> Any:
+    if not isinstance(value, Mapping):
+        errors.append((key_path, f"expected a mapping, got {value!r}"))
+        return None
+
+    key_type, value_type = args if args else (Any, Any)
+    items = {
+        _convert(key_type, key, f"{key_path}.{key}", errors): _convert(value_type, item, f"{key_path}.{key}", errors)
+        for key, item in value.items()
+    }
+    if container_type is collections.abc.Mapping:
+        return types.MappingProxyType(items)
+    return items
+
+
+def _convert_enum(enum_type: Type[Enum], value: Any, key_path: str, errors: List[Tuple[str, str]]) -> Any:
+    try:
+        return enum_type(value)
+    except ValueError:
+        pass
+
+    # Enums can also be set by name, in any case
+    if isinstance(value, str):
+        for member in enum_type:
+            if member.name.lower() == value.lower():
+                return member
+
+    names = ", ".join(member.name for member in enum_type)
+    errors.append((key_path, f"expected one of {names}, got {value!r}"))
+    return None
+
+
+def _convert_bool(value: Any) -> Any:
+    if type(value) is bool:
+        return value
+    if isinstance(value, str):
+        if value.lower() in _TRUE_STRINGS:
+            return True
+        if value.lower() in _FALSE_STRINGS:
+            return False
+    return None
+
+
+def _convert_int(value: Any) -> Any:
+    if type(value) is int:
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return _parse_number(int, value)
+    return None
+
+
+def _convert_float(value: Any) -> Any:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return _parse_number(float, value)
+    return None
+
+
+def _convert_str(value: Any) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        # Unquoted YAML values like "version: 1.0"
+        return str(value)
+    return None
+
+
+def _parse_number(number_type: Callable[[str], Any], value: str) -> Any:
+    try:
+        return number_type(value.strip())
+    except ValueError:
+        return None
+
+
+# Convert a config value to a scalar type, or return None if it's not possible
+_SCALAR_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    bool: _convert_bool,
+    int: _convert_int,
+    float: _convert_float,
+    str: _convert_str,
+}
+
+# The converters of the generic types, by origin (see typing.get_origin()), and of the containers
+_GENERIC_CONVERTERS: Dict[Any, _Converter] = {
+    Union: _convert_union,
+    types.UnionType: _convert_union,
+    Literal: _convert_literal,
+}
+_CONTAINER_CONVERTERS: Dict[Any, _Converter] = {
+    list: _convert_collection,
+    tuple: _convert_collection,
+    set: _convert_collection,
+    frozenset: _convert_collection,
+    collections.abc.Sequence: _convert_collection,
+    dict: _convert_mapping,
+    collections.abc.Mapping: _convert_mapping,
+}
+
+
+def _convert_scalar(field_type: Any, value: Any) -> Any:
+    """Convert a value to a scalar type, or return None if it's not possible."""
+    if type(value) is bool and field_type is not bool:
+        # Booleans are ints in Python, but a boolean is never a valid number or string
+        return None
+
+    scalar_converter = _SCALAR_CONVERTERS.get(field_type)
+    if scalar_converter is None:
+        return value if isinstance(value, field_type) else None
+    return scalar_converter(value)
@@ -0,0 +1,48 @@
+from contextvars import (
+    ContextVar,
+    Token,
+)
+from time import perf_counter
+from typing import Optional
+
+
+class RequestContext:
+    """The context of the request being handled, attached to the log entries recorded for it."""
+
+    __slots__ = ("tracking_id", "route", "method", "start_time")
+
+    def __init__(self, tracking_id: Optional[str], route: Optional[str], method: Optional[str] = None):
+        self.tracking_id = tracking_id
+        self.route = route
+        self.method = method
+        # The time.perf_counter() value at the start of the request
+        self.start_time: float = perf_counter()
+
+    @property
+    def elapsed_ms(self) -> float:
+        """The time since the start of the request, in milliseconds."""
+        return (perf_counter() - self.start_time) * 1000
+
+
+# The request handled by the current context (thread or asyncio task). Tasks created while handling
+# a request inherit it, since asyncio copies the context when creating a task.
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar("sds_request_context", default=None)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    """Get the context of the request handled by the current thread or asyncio task."""
+    return _request_context.get()
+
+
+def set_request_context(
+    tracking_id: Optional[str] = None,
+    route: Optional[str] = None,
+    method: Optional[str] = None,
+) -> Token:
+    """Start the context of a new request. The token must be given to reset_request_context() at the end."""
+    return _request_context.set(RequestContext(tracking_id, route, method))
+
+
+def reset_request_context(token: Token) -> None:
+    """End the context of a request, restoring the previous one."""
+    _request_context.reset(token)
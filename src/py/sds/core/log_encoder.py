@@ -0,0 +1,249 @@
+import dataclasses
+import datetime
+import json
+import math
+from enum import Enum
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+try:
+    import orjson  # type: ignore[import-not-found]
+except ImportError:  # orjson is an optional dependency
+    orjson = None
+
+
+# Encodes a Python string as a JSON string, including the quotes (C accelerated when available)
+_encode_string: Callable[[str], str] = json.encoder.encode_basestring  # type: ignore[attr-defined]
+
+DEPTH_EXCEEDED_MARKER = "<max depth exceeded>"
+
+# Appends the JSON representation of an object, at a nesting level, to a list of parts
+TypeEncoder = Callable[[Any, int, List[str]], None]
+
+# Maximum number of types in the dispatch table of an encoder, so dynamic classes can't grow it forever
+MAX_DISPATCHED_TYPES = 256
+
+# Errors of the fast encoders (orjson.JSONEncodeError is a TypeError): too deep, NaN, unsupported dict keys
+_FAST_ENCODER_ERRORS = (TypeError, ValueError, RecursionError)
+
+
+class LogEncoder:
+    """Serializes log entries to JSON in a single pass.
+
+    Native JSON types (str, int, float, bool, None) are kept as they are, bytes are decoded as
+    UTF-8, tuples and sets become arrays, read-only mappings and dataclasses become objects, dates
+    and times use the ISO format, enums use their value and any other object is converted with str().
+
+    Entries are first serialized by a fast backend (orjson when available and enabled, the C
+    accelerated json encoder otherwise), which converts the non-native types in a single pass.
+    Entries the fast backend rejects, or longer than `max_entry_length`, are serialized again by
+    a pure Python encoder that truncates strings (and decoded bytes) longer than
+    `max_string_length` and replaces containers nested deeper than `max_depth` by a marker, so
+    huge payloads can't blow up the size of a log entry.
+    """
+
+    def __init__(
+        self,
+        max_depth: int = 16,
+        max_string_length: int = 16384,
+        max_entry_length: int = 256 * 1024,
+        use_orjson: Optional[bool] = None,
+    ):
+        """Create an encoder.
+
+        :param int max_depth: Maximum nesting level of dicts, lists, etc...
+        :param int max_string_length: Maximum number of characters kept from each string
+        :param int max_entry_length: Maximum length of an entry serialized by the fast backend,
+            without the limits
+        :param bool use_orjson: Use orjson for the serialization. Defaults to True if it's installed
+        """
+        if use_orjson and orjson is None:
+            raise ValueError("The orjson package is not installed.")
+
+        self.max_depth = max_depth
+        self.max_string_length = max_string_length
+        self.max_entry_length = max_entry_length
+        self.use_orjson = orjson is not None if use_orjson is None else use_orjson
+
+        # The encoder of each type, looked up by the exact type of the objects
+        self._type_encoders: Dict[type, TypeEncoder] = {
+            str: self._encode_str,
+            type(None): self._encode_none,
+            bool: self._encode_bool,
+            int: self._encode_int,
+            float: self._encode_float,
+            dict: self._encode_mapping,
+            MappingProxyType: self._encode_mapping,
+            list: self._encode_array,
+            tuple: self._encode_array,
+            set: self._encode_array,
+            frozenset: self._encode_array,
+        }
+        # The encoders of the subclasses of the supported types, in order of precedence
+        self._base_type_encoders: List[Tuple[Tuple[type, ...], TypeEncoder]] = [
+            ((dict, MappingProxyType), self._encode_mapping),
+            ((list, tuple, set, frozenset), self._encode_array),
+            ((bytes, bytearray, memoryview), self._encode_bytes),
+            ((Enum,), self._encode_enum),
+            ((str,), self._encode_str),
+            ((int,), self._encode_int),
+            ((float,), self._encode_float),
+            ((datetime.date, datetime.time), self._encode_isoformat),
+        ]
+
+        self._json_encoder = json.JSONEncoder(
+            default=self._default,
+            ensure_ascii=False,
+            allow_nan=False,
+            check_circular=False,
+            separators=(",", ":"),
+        )
+
+    def encode(self, obj: Any) -> str:
+        """Serialize an object to a JSON string."""
+        try:
+            if self.use_orjson:
+                encoded = orjson.dumps(obj, default=self._default, option=orjson.OPT_NON_STR_KEYS).decode()
+            else:
+                encoded = self._json_encoder.encode(obj)
+
+            if len(encoded) <= self.max_entry_length:
+                return encoded
+        except _FAST_ENCODER_ERRORS:
+            # The pure Python encoder handles them
+            pass
+
+        return self.encode_with_limits(obj)
+
+    def encode_with_limits(self, obj: Any) -> str:
+        """Serialize an object to a JSON string with the pure Python encoder, applying the limits."""
+        parts: List[str] = []
+        self._encode(obj, 0, parts)
+        return "".join(parts)
+
+    def _truncate(self, text: str) -> str:
+        if len(text) > self.max_string_length:
+            return f"{text[: self.max_string_length]}...<truncated {len(text) - self.max_string_length} chars>"
+        return text
+
+    def _decode_bytes(self, data: bytes | bytearray | memoryview) -> str:
+        if len(data) > self.max_string_length:
+            # Decode only what will be kept
+            truncated_length = len(data) - self.max_string_length
+            text = bytes(data[: self.max_string_length]).decode("utf-8", errors="replace")
+            return f"{text}...<truncated {truncated_length} bytes>"
+        return bytes(data).decode("utf-8", errors="replace")
+
+    def _default(self, obj: Any) -> Any:
+        """Converts the objects the fast backends can't serialize."""
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            return self._decode_bytes(obj)
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        if isinstance(obj, MappingProxyType):
+            # Read-only mappings, like the config values
+            return dict(obj)
+        if isinstance(obj, Enum):
+            return obj.value
+        if isinstance(obj, (datetime.date, datetime.time)):
+            return obj.isoformat()
+        if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+            return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+        return self._truncate(str(obj))
+
+    def _encode_key(self, key: Any) -> str:
+        if isinstance(key, str):
+            return _encode_string(key)
+        if isinstance(key, Enum):
+            key = key.value
+        return _encode_string(str(key))
+
+    def _encode(self, obj: Any, depth: int, parts: List[str]) -> None:
+        """Append the JSON representation of an object to `parts`."""
+        obj_type = type(obj)
+        type_encoder = self._type_encoders.get(obj_type)
+        if type_encoder is None:
+            type_encoder = self._get_type_encoder(obj_type)
+        type_encoder(obj, depth, parts)
+
+    def _get_type_encoder(self, obj_type: type) -> TypeEncoder:
+        """Find the encoder of a type that is not in the dispatch table, like a subclass."""
+        for base_types, type_encoder in self._base_type_encoders:
+            if issubclass(obj_type, base_types):
+                break
+        else:
+            type_encoder = self._encode_other
+
+        if len(self._type_encoders) < MAX_DISPATCHED_TYPES:
+            self._type_encoders[obj_type] = type_encoder
+        return type_encoder
+
+    def _encode_str(self, obj: str, depth: int, parts: List[str]) -> None:
+        parts.append(_encode_string(self._truncate(str.__str__(obj))))
+
+    def _encode_none(self, obj: None, depth: int, parts: List[str]) -> None:
+        parts.append("null")
+
+    def _encode_bool(self, obj: bool, depth: int, parts: List[str]) -> None:
+        parts.append("true" if obj else "false")
+
+    def _encode_int(self, obj: int, depth: int, parts: List[str]) -> None:
+        parts.append(int.__repr__(obj))
+
+    def _encode_float(self, obj: float, depth: int, parts: List[str]) -> None:
+        # NaN and infinity are not valid JSON numbers
+        parts.append(float.__repr__(obj) if math.isfinite(obj) else _encode_string(str(obj)))
+
+    def _encode_mapping(self, obj: Mapping[Any, Any], depth: int, parts: List[str]) -> None:
+        if depth >= self.max_depth:
+            parts.append(_encode_string(DEPTH_EXCEEDED_MARKER))
+            return
+        parts.append("{")
+        first = True
+        for key, value in obj.items():
+            if not first:
+                parts.append(",")
+            first = False
+            parts.append(self._encode_key(key))
+            parts.append(":")
+            self._encode(value, depth + 1, parts)
+        parts.append("}")
+
+    def _encode_array(self, obj: Iterable[Any], depth: int, parts: List[str]) -> None:
+        if depth >= self.max_depth:
+            parts.append(_encode_string(DEPTH_EXCEEDED_MARKER))
+            return
+        parts.append("[")
+        first = True
+        for item in obj:
+            if not first:
+                parts.append(",")
+            first = False
+            self._encode(item, depth + 1, parts)
+        parts.append("]")
+
+    def _encode_bytes(self, obj: bytes | bytearray | memoryview, depth: int, parts: List[str]) -> None:
+        parts.append(_encode_string(self._decode_bytes(obj)))
+
+    def _encode_enum(self, obj: Enum, depth: int, parts: List[str]) -> None:
+        self._encode(obj.value, depth, parts)
+
+    def _encode_isoformat(self, obj: datetime.date | datetime.time, depth: int, parts: List[str]) -> None:
+        parts.append(_encode_string(obj.isoformat()))
+
+    def _encode_other(self, obj: Any, depth: int, parts: List[str]) -> None:
+        """Encode dataclasses as objects and any other object with str()."""
+        if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+            fields = {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+            self._encode_mapping(fields, depth, parts)
+        else:
+            parts.append(_encode_string(self._truncate(str(obj))))
@@ -0,0 +1,179 @@
+import collections
+import sys
+import threading
+import traceback
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    List,
+    Optional,
+    Tuple,
+)
+
+
+class OverflowPolicy(Enum):
+    """What to do with a new log record when the pipeline queue is full."""
+
+    BLOCK = "BLOCK"
+    DROP_OLDEST = "DROP_OLDEST"
+    DROP_NEWEST = "DROP_NEWEST"
+
+
+class LogPipeline:
+    """A bounded queue of log records, written in batches by a background thread.
+
+    The caller thread only appends the record to the queue. Formatting, serialization and the
+    handler I/O are done by the writer thread, which calls `batch_writer` with up to
+    `batch_size` records at a time.
+    """
+
+    def __init__(
+        self,
+        batch_writer: Callable[[List[Any]], None],
+        max_size: int = 10000,
+        batch_size: int = 100,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        on_dropped: Optional[Callable[[int, int], None]] = None,
+    ):
+        """Create the pipeline and start its writer thread.
+
+        :param batch_writer: Function that writes a list of records
+        :param int max_size: Maximum number of records waiting in the queue
+        :param int batch_size: Maximum number of records handed to `batch_writer` at once
+        :param OverflowPolicy overflow_policy: What to do when the queue is full
+        :param on_dropped: Called from the writer thread with the number of records dropped
+            since the previous call and the total number of dropped records
+        """
+        self._batch_writer = batch_writer
+        self._max_size = max_size
+        self._batch_size = batch_size
+        self._overflow_policy = overflow_policy
+        self._on_dropped = on_dropped
+
+        # The records, each with a flag telling if it can be dropped
+        self._records: Deque[Tuple[Any, bool]] = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_written = threading.Condition(self._lock)
+
+        # Number of records taken from the queue and not written yet
+        self._in_flight: int = 0
+        self._dropped_count: int = 0
+        self._unreported_dropped_count: int = 0
+        self._closed: bool = False
+
+        self._thread = threading.Thread(target=self._run, name="sds-log-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped_count(self) -> int:
+        """The total number of records dropped because the queue was full."""
+        return self._dropped_count
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, record: Any, droppable: bool = True) -> bool:
+        """Enqueue a record to be written by the writer thread.
+
+        The record is enqueued by reference and not copied, so the caller must not mutate it
+        afterwards.
+
+        With the DROP_OLDEST and DROP_NEWEST policies, a record that is not droppable (like an error)
+        is never dropped and never waits: the queue grows beyond its maximum size if needed, and
+        DROP_OLDEST drops the oldest droppable record instead.
+
+        Returns False if the record was not enqueued (dropped or pipeline closed).
+        """
+        with self._lock:
+            if self._closed:
+                return False
+
+            if len(self._records) >= self._max_size:
+                if self._overflow_policy == OverflowPolicy.BLOCK:
+                    while len(self._records) >= self._max_size and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        return False
+                elif not self._make_room(droppable):
+                    return False
+
+            self._records.append((record, droppable))
+            self._not_empty.notify()
+            return True
+
+    def _make_room(self, droppable: bool) -> bool:
+        """Apply a DROP_* policy to a full queue. Must be called with the lock held.
+
+        Returns False if the new record is dropped.
+        """
+        if self._overflow_policy == OverflowPolicy.DROP_OLDEST:
+            for index, (_, queued_droppable) in enumerate(self._records):
+                if queued_droppable:
+                    del self._records[index]
+                    self._count_dropped()
+                    return True
+
+        if droppable:
+            self._count_dropped()
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every enqueued record has been written.
+
+        Returns False if the timeout expired before the queue was drained.
+        """
+        with self._lock:
+            return self._all_written.wait_for(lambda: not self._records and self._in_flight == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting records, write the pending ones and stop the writer thread."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _count_dropped(self) -> None:
+        """Record a dropped record. Must be called with the lock held."""
+        self._dropped_count += 1
+        self._unreported_dropped_count += 1
+
+    def _run(self) -> None:
+        """The writer thread loop."""
+        while True:
+            with self._lock:
+                while not self._records and not self._closed:
+                    self._not_empty.wait()
+
+                if not self._records and self._closed:
+                    return
+
+                batch_length = min(self._batch_size, len(self._records))
+                batch = [self._records.popleft()[0] for _ in range(batch_length)]
+                self._in_flight = batch_length
+
+                dropped_count = self._unreported_dropped_count
+                dropped_total = self._dropped_count
+                self._unreported_dropped_count = 0
+
+                self._not_full.notify_all()
+
+            try:
+                self._batch_writer(batch)
+                if dropped_count > 0 and self._on_dropped is not None:
+                    self._on_dropped(dropped_count, dropped_total)
+            except Exception:
+                # The writer thread must survive a failing handler
+                traceback.print_exc(file=sys.stderr)
+            finally:
+                with self._lock:
+                    self._in_flight = 0
+                    self._all_written.notify_all()
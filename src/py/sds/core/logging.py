@@ -1,31 +1,61 @@
-import inspect
-import json
+import atexit
+import functools
 import logging
+import os
 import sys
+import threading
+import time
+import traceback
 from enum import Enum
+from types import CodeType
 from typing import (
     Any,
     Callable,
     Dict,
     List,
+    Mapping,
     Optional,
+    Tuple,
 )
 
-from google.cloud.logging.handlers import StructuredLogHandler
-from google.cloud.logging_v2.handlers import setup_logging
-
 from sds.utils.core.config import Config
+from sds.utils.core.context import get_request_context
+from sds.utils.core.log_encoder import LogEncoder
+from sds.utils.core.log_pipeline import (
+    LogPipeline,
+    OverflowPolicy,
+)
+from sds.utils.core.metrics import (
+    MetricsAggregator,
+    MetricType,
+)
+from sds.utils.core.sampling import LogSampler
+from sds.utils.core.spans import (
+    DisabledSpan,
+    Span,
+    get_disabled_span,
+    pop_benchmark,
+)
+from sds.utils.core.startup import profile_phase
+
 
+@functools.lru_cache(maxsize=1024)
+def _call_site_name(code: CodeType, module_name: Optional[str]) -> str:
+    """Build the module.Class.method name of a call site.
 
-def convert_bytes(obj: Any) -> dict | list | str:
-    if isinstance(obj, dict):
-        return {k: convert_bytes(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_bytes(i) for i in obj]
-    elif isinstance(obj, bytes):
-        return obj.decode("utf-8", errors="replace")
-    else:
-        return str(obj)
+    The result only depends on the code object and its module, so it is memoized (with LRU
+    eviction) and the frame inspection cost is paid once per call site.
+    """
+    name: list[str] = []
+    if module_name:
+        name.append(module_name)
+
+    # co_qualname already carries the class name (e.g. "Class.method")
+    qualname = code.co_qualname.replace("<locals>.", "")
+    if qualname != "<module>":  # top level usually
+        name.append(qualname)  # function or a method
+
+    return ".".join(name)
 
 
 class LogEnvironment(Enum):
@@ -52,12 +82,110 @@ class LogType(Enum):
     API_REQUEST = "API_REQUEST"
 
 
+# The standard logging level of each log type
+LOG_TYPE_LEVELS: Dict[LogType, int] = {
+    LogType.INFO: logging.INFO,
+    LogType.WARNING: logging.WARNING,
+    LogType.ERROR: logging.ERROR,
+    LogType.EXCEPTION: logging.ERROR,
+    LogType.FATAL: logging.FATAL,
+    LogType.DEBUG: logging.DEBUG,
+    LogType.SYS: logging.INFO,
+    LogType.PERF: logging.INFO,
+    LogType.API_REQUEST: logging.INFO,
+}
+
+# A log message can be a string or a callable that builds it (only called if the entry is logged)
+LogMessage = str | Callable[[], str]
+
+
+# The Cloud Logging severity of each log type
+GCP_SEVERITIES: Dict[LogType, str] = {
+    LogType.INFO: "INFO",
+    LogType.WARNING: "WARNING",
+    LogType.ERROR: "ERROR",
+    LogType.EXCEPTION: "ERROR",
+    LogType.FATAL: "CRITICAL",
+    LogType.DEBUG: "DEBUG",
+    LogType.SYS: "NOTICE",
+    LogType.PERF: "INFO",
+    LogType.API_REQUEST: "INFO",
+}
+
+# Special fields of the Cloud Logging structured logs
+GCP_TRACE_FIELD = "logging.googleapis.com/trace"
+GCP_SPAN_ID_FIELD = "logging.googleapis.com/spanId"
+GCP_TRACE_SAMPLED_FIELD = "logging.googleapis.com/trace_sampled"
+GCP_SOURCE_LOCATION_FIELD = "logging.googleapis.com/sourceLocation"
+
+# The time a log entry was created, in nanoseconds since the epoch. Entries can be written later by
+# a background thread, so the write time is not the time of the entry
+LOG_TIMESTAMP_FIELD = "timestamp_ns"
+
+
+class CallSiteMode(Enum):
+    """When to resolve the call site (module.Class.method) stored in the "at" field."""
+
+    ALWAYS = "ALWAYS"
+    WARNING_AND_ABOVE = "WARNING_AND_ABOVE"
+    NEVER = "NEVER"
+
+
+class PerfMode(Enum):
+    """How the Logger.perf() metrics are recorded."""
+
+    # One log entry per call
+    RAW = "RAW"
+    # Aggregated in process, with one summary log entry per metric and flush interval
+    AGGREGATE = "AGGREGATE"
+
+
+# The format of the local log records, when the "logging.format" and "logging.datefmt" config entries are not set
+DEFAULT_LOG_FORMAT = "%(message)s"
+DEFAULT_LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Read on every API request log entry
+SERVICE_NAME_CONFIG_KEY = Config.key("service.name")
+
+# The maximum time an exception entry waits for the entries enqueued before it to be written
+EXCEPTION_FLUSH_TIMEOUT_SECONDS = 1.0
+
+# Log types considered WARNING or more severe
+SEVERE_LOG_TYPES = frozenset({LogType.WARNING, LogType.ERROR, LogType.EXCEPTION, LogType.FATAL})
+
+
+def _in_event_loop() -> bool:
+    """Check if the current thread is running an asyncio event loop."""
+    # No event loop can run if asyncio was never imported, and it's not worth importing it
+    asyncio_module = sys.modules.get("asyncio")
+    return asyncio_module is not None and asyncio_module._get_running_loop() is not None
+
+
 class Logger:
 
     # Attributes set by the initialize() class method
     _app_package_name: Optional[str] = None
     _logging_writer: Optional[Callable] = None
     _logging_functions: Optional[Dict[LogType, Callable]] = None
+    _logger_instance: Optional[logging.Logger] = None
+    _call_site_mode: CallSiteMode = CallSiteMode.ALWAYS
+    _log_pipeline: Optional[LogPipeline] = None
+    _event_loop_pipeline: Optional[LogPipeline] = None
+    _event_loop_pipeline_lock = threading.Lock()
+    _event_loop_sink_enabled: bool = True
+    _metrics_aggregator: Optional[MetricsAggregator] = None
+    _log_sampler: Optional[LogSampler] = None
+    _log_encoder: LogEncoder = LogEncoder()
+    _logging_batch_writer: Optional[Callable] = None
+    _gcp_project_id: Optional[str] = None
+    _gcp_write_lock = threading.Lock()
+    _shutdown_registered: bool = False
+    _config_change_registered: bool = False
+    _log_environment: LogEnvironment = LogEnvironment.LOCAL
+
+    # Cache of the lowest level for which logging.Logger.isEnabledFor() is true.
+    # Reset when the level changes. Before initialization, every level passes the check.
+    _enabled_level: int = logging.NOTSET
 
     @classmethod
     def _get_app_package_name(cls) -> str:
@@ -70,31 +198,102 @@ class Logger:
         return cls._app_package_name
 
     @classmethod
-    def initialize(cls, package_name: str, log_level=logging.INFO):
-        """Prepare the Logger as a Singleton."""
+    def initialize(
+        cls,
+        package_name: str,
+        log_level=logging.INFO,
+        call_site_mode: Optional[CallSiteMode] = None,
+        async_mode: Optional[bool] = None,
+        perf_mode: Optional[PerfMode] = None,
+    ):
+        """Prepare the Logger as a Singleton.
+
+        :param str package_name: The name of the application package
+        :param log_level: The default log level, when "logging.level" is not configured
+        :param CallSiteMode call_site_mode: When to resolve the "at" field. Defaults to the
+            "logging.call_site" config entry (ALWAYS, WARNING_AND_ABOVE or NEVER)
+        :param bool async_mode: If True, log entries are enqueued and written by a background
+            thread. Defaults to the "logging.async.enabled" config entry. The queue is tuned with
+            "logging.async.queue_size", "logging.async.batch_size" and
+            "logging.async.overflow_policy" (BLOCK, DROP_OLDEST or DROP_NEWEST). Without async
+            mode, the entries logged from a running asyncio event loop are still handed off to a
+            background thread, so a slow handler never blocks the loop, unless
+            "logging.asyncio.enabled" is false. That queue is tuned with "logging.asyncio.queue_size"
+            and "logging.asyncio.overflow_policy" (DROP_OLDEST by default, since blocking would
+            block the loop). ERROR and more severe entries are never dropped, and EXCEPTION
+            entries are written by the caller once the queue is flushed. The queued entries are
+            written later and hold references to the logged values: do not mutate a dict or a
+            list after passing it to the logger
+        :param PerfMode perf_mode: How the perf() metrics are recorded. Defaults to the
+            "logging.perf.mode" config entry (RAW or AGGREGATE). Aggregated metrics are flushed
+            every "logging.perf.flush_interval_seconds"
+
+        Entries can be sampled with the "logging.sampling" config entry: "rates" (the fraction of
+        entries kept by log type), "rate_limit.per_second" and "rate_limit.burst" (per call site)
+        and "dedup_window_seconds" (repeated messages from a call site are written once per window).
+        The counts of the suppressed entries not written with a later entry are reported every
+        "report_interval_seconds" (60 by default).
+
+        The JSON serialization of GCP log entries is tuned with "logging.encoder.backend" (AUTO,
+        ORJSON or STDLIB), "logging.encoder.max_depth", "logging.encoder.max_string_length" and
+        "logging.encoder.max_entry_length".
+        """
+        # Write the entries of a previous initialization before replacing the writer
+        cls.shutdown()
+
         cls._app_package_name = package_name
+        _call_site_name.cache_clear()
+
+        if call_site_mode is None:
+            call_site_mode = CallSiteMode[Config.get("logging.call_site", "always").upper()]
+        cls._call_site_mode = call_site_mode
 
         log_environment = LogEnvironment[Config.get("logging.env", "local").upper()]
+        cls._log_environment = log_environment
 
         if log_environment == LogEnvironment.GCP:
-            # Initialize the GCP specific logging client (logs JSON objects instead of strings)
-            handler = StructuredLogHandler()
-            setup_logging(handler)
+            # Our entries are written to stdout as structured logs. The GCP handler formats the
+            # entries of the other libraries using the standard logging module.
+            with profile_phase("GCP_LOGGING_SETUP"):
+                # Imported here, since google-cloud-logging pulls in the grpc and protobuf stacks
+                from google.cloud.logging.handlers import StructuredLogHandler
+                from google.cloud.logging_v2.handlers import setup_logging
+
+                handler = StructuredLogHandler()
+                setup_logging(handler)
+
+            # The project is needed to link the entries to Cloud Trace
+            cls._gcp_project_id = Config.get("gcp.project_id", None) or os.environ.get("GOOGLE_CLOUD_PROJECT")
 
         # Map the functions that actually write the log to the environment type
         log_writers: Dict[LogEnvironment, Callable] = {
             LogEnvironment.LOCAL: cls._create_local_log_entry,
             LogEnvironment.GCP: cls._create_gcp_log_entry,
         }
+        log_batch_writers: Dict[LogEnvironment, Callable] = {
+            LogEnvironment.LOCAL: cls._write_batch,
+            LogEnvironment.GCP: cls._create_gcp_log_entries,
+        }
 
         cls._logging_writer = log_writers[log_environment]
+        cls._logging_batch_writer = log_batch_writers[log_environment]
+
+        encoder_backend: str = Config.get("logging.encoder.backend", "auto").upper()
+        cls._log_encoder = LogEncoder(
+            max_depth=int(Config.get("logging.encoder.max_depth", 16)),
+            max_string_length=int(Config.get("logging.encoder.max_string_length", 16384)),
+            max_entry_length=int(Config.get("logging.encoder.max_entry_length", 256 * 1024)),
+            use_orjson=None if encoder_backend == "AUTO" else encoder_backend == "ORJSON",
+        )
 
         logging.basicConfig(
-            format=Config.get("logging.format", "%(message)"),
-            datefmt=Config.get("logging.datefmt", "%(asctime)s"),
+            format=Config.get("logging.format", DEFAULT_LOG_FORMAT),
+            datefmt=Config.get("logging.datefmt", DEFAULT_LOG_DATE_FORMAT),
             level=Config.get("logging.level", log_level),
         )
         logger_instance: logging.Logger = logging.getLogger(package_name)
+        cls._logger_instance = logger_instance
+        cls._refresh_enabled_level()
 
         # Maps the log type to the corresponding logging function
         cls._logging_functions = {
@@ -109,69 +308,262 @@ class Logger:
             LogType.EXCEPTION: logger_instance.exception,
         }
 
+        if async_mode is None:
+            async_mode = bool(Config.get("logging.async.enabled", False))
+
+        cls._event_loop_sink_enabled = bool(Config.get("logging.asyncio.enabled", True))
+
+        if async_mode:
+            cls._log_pipeline = LogPipeline(
+                batch_writer=cls._logging_batch_writer,
+                max_size=int(Config.get("logging.async.queue_size", 10000)),
+                batch_size=int(Config.get("logging.async.batch_size", 100)),
+                overflow_policy=OverflowPolicy[Config.get("logging.async.overflow_policy", "block").upper()],
+                on_dropped=cls._log_dropped_entries,
+            )
+
+        sampling_config: Optional[Mapping[str, Any]] = Config.get("logging.sampling", None)
+        cls._log_sampler = (
+            LogSampler.from_config(sampling_config, report_callback=cls._log_suppressed_entries)
+            if sampling_config
+            else None
+        )
+
+        if perf_mode is None:
+            perf_mode = PerfMode[Config.get("logging.perf.mode", "raw").upper()]
+
+        if perf_mode == PerfMode.AGGREGATE:
+            cls._metrics_aggregator = MetricsAggregator(
+                flush_callback=cls._log_metric_summary,
+                interval_seconds=float(Config.get("logging.perf.flush_interval_seconds", 60)),
+            )
+
+        if async_mode or perf_mode == PerfMode.AGGREGATE:
+            cls._register_shutdown()
+
+        # Apply the logging settings of a reloaded config without restarting
+        if not cls._config_change_registered:
+            Config.on_change(cls._on_config_change)
+            cls._config_change_registered = True
+
+    @classmethod
+    def _register_shutdown(cls) -> None:
+        """Write the pending entries when the interpreter exits."""
+        if not cls._shutdown_registered:
+            atexit.register(cls.shutdown)
+            cls._shutdown_registered = True
+
     @classmethod
-    def debug(cls, message: str, **kwargs):
-        cls._log(log_type=LogType.DEBUG, message=message, extra_attributes=kwargs)
+    def _get_event_loop_pipeline(cls) -> LogPipeline:
+        """Get the pipeline of the entries logged from an asyncio event loop, created on first use."""
+        with cls._event_loop_pipeline_lock:
+            if cls._event_loop_pipeline is None:
+                if cls._logging_batch_writer is None:
+                    raise ValueError("Logger has not been initialized. Must call 'Logger.initialize()'.")
+                overflow_policy: str = Config.get("logging.asyncio.overflow_policy", "drop_oldest")
+                cls._event_loop_pipeline = LogPipeline(
+                    batch_writer=cls._logging_batch_writer,
+                    max_size=int(Config.get("logging.asyncio.queue_size", 10000)),
+                    batch_size=int(Config.get("logging.async.batch_size", 100)),
+                    overflow_policy=OverflowPolicy[overflow_policy.upper()],
+                    on_dropped=cls._log_dropped_entries,
+                )
+                cls._register_shutdown()
+            return cls._event_loop_pipeline
 
     @classmethod
-    def info(cls, message: str, **kwargs):
-        cls._log(log_type=LogType.INFO, message=message, extra_attributes=kwargs)
+    def _on_config_change(cls, old_config: Mapping[str, Any], new_config: Mapping[str, Any]) -> None:
+        """Apply the level, format and sampling of a reloaded config.
+
+        The writer, the async pipeline and the perf mode are only changed by a new initialization.
+        """
+        if cls._logger_instance is None:
+            return
+
+        log_level = Config.get("logging.level", None)
+        if log_level is not None:
+            cls.set_level(log_level)
+
+        if cls._log_environment == LogEnvironment.LOCAL:
+            formatter = logging.Formatter(
+                fmt=Config.get("logging.format", DEFAULT_LOG_FORMAT),
+                datefmt=Config.get("logging.datefmt", DEFAULT_LOG_DATE_FORMAT),
+            )
+            for handler in logging.getLogger().handlers:
+                handler.setFormatter(formatter)
+
+        # The counts of the entries suppressed by the previous sampler are reported before they're lost
+        log_sampler = cls._log_sampler
+        sampling_config: Optional[Mapping[str, Any]] = Config.get("logging.sampling", None)
+        cls._log_sampler = (
+            LogSampler.from_config(sampling_config, report_callback=cls._log_suppressed_entries)
+            if sampling_config
+            else None
+        )
+        if log_sampler is not None:
+            log_sampler.close()
 
     @classmethod
-    def warning(cls, message: str, **kwargs):
+    def set_level(cls, level: int | str) -> None:
+        """Change the level of the application logger.
+
+        Must be used instead of changing the level of the underlying logging.Logger directly,
+        so the cached level checks are reset.
+        """
+        if cls._logger_instance is None:
+            raise ValueError("Logger has not been initialized. Must call 'Logger.initialize()'.")
+        cls._logger_instance.setLevel(level)
+        cls._refresh_enabled_level()
+
+    @classmethod
+    def _refresh_enabled_level(cls) -> None:
+        """Cache the lowest level for which the application logger is enabled."""
+        logger_instance = cls._logger_instance
+        if logger_instance is None:
+            return
+        cls._enabled_level = max(logger_instance.getEffectiveLevel(), logger_instance.manager.disable + 1)
+
+    @classmethod
+    def is_enabled(cls, log_type: LogType) -> bool:
+        """Check if log entries of a log type are written with the current level."""
+        return LOG_TYPE_LEVELS[log_type] >= cls._enabled_level
+
+    @classmethod
+    def flush(cls, timeout: Optional[float] = None) -> bool:
+        """Wait until the log entries enqueued in async mode are written.
+
+        Returns False if the timeout expired before all entries were written.
+        """
+        return all(
+            log_pipeline.flush(timeout)
+            for log_pipeline in (cls._log_pipeline, cls._event_loop_pipeline)
+            if log_pipeline is not None
+        )
+
+    @classmethod
+    def shutdown(cls, timeout: Optional[float] = 5.0) -> None:
+        """Write the pending log entries and stop the background threads.
+
+        The aggregated metrics are flushed, then the async mode queue is written. Entries logged
+        after shutdown are written synchronously.
+        """
+        metrics_aggregator, cls._metrics_aggregator = cls._metrics_aggregator, None
+        if metrics_aggregator is not None:
+            metrics_aggregator.close()
+
+        if cls._log_sampler is not None:
+            cls._log_sampler.close()
+
+        log_pipeline, cls._log_pipeline = cls._log_pipeline, None
+        if log_pipeline is not None:
+            log_pipeline.close(timeout)
+
+        with cls._event_loop_pipeline_lock:
+            # Until the next initialization, entries logged from an event loop are written synchronously too
+            cls._event_loop_sink_enabled = False
+            log_pipeline, cls._event_loop_pipeline = cls._event_loop_pipeline, None
+        if log_pipeline is not None:
+            log_pipeline.close(timeout)
+
+    @classmethod
+    def debug(cls, message: LogMessage, *args, **kwargs):
+        """Prepares a log entry to record a debug message.
+
+        The message can be a %-style format string with `args`, or a callable returning the
+        message. Neither is evaluated when DEBUG entries are not enabled.
+        """
+        if logging.DEBUG < cls._enabled_level:
+            return
+        cls._log(log_type=LogType.DEBUG, message=message, extra_attributes=kwargs, args=args)
+
+    @classmethod
+    def info(cls, message: LogMessage, *args, **kwargs):
+        if logging.INFO < cls._enabled_level:
+            return
+        cls._log(log_type=LogType.INFO, message=message, extra_attributes=kwargs, args=args)
+
+    @classmethod
+    def warning(cls, message: LogMessage, *args, **kwargs):
         """Prepares a log entry to record a warning."""
+        if logging.WARNING < cls._enabled_level:
+            return
         cls._log(
             log_type=LogType.WARNING,
             message=message,
             extra_attributes=kwargs,
+            args=args,
         )
 
     @classmethod
-    def error(cls, message: str, **kwargs):
+    def error(cls, message: LogMessage, *args, **kwargs):
         """Prepares a log entry to record an error."""
+        if logging.ERROR < cls._enabled_level:
+            return
         cls._log(
             log_type=LogType.ERROR,
             message=message,
             extra_attributes=kwargs,
+            args=args,
         )
 
     @classmethod
-    def exception(cls, message: str, **kwargs):
+    def exception(cls, message: LogMessage, *args, **kwargs):
         """Prepares a log entry to record an error."""
+        if logging.ERROR < cls._enabled_level:
+            return
         cls._log(
             log_type=LogType.EXCEPTION,
             message=message,
             extra_attributes=kwargs,
+            args=args,
         )
 
     @classmethod
-    def fatal(cls, message: str, **kwargs):
+    def fatal(cls, message: LogMessage, *args, **kwargs):
         """Prepares a log entry to record a fatal error."""
+        if logging.FATAL < cls._enabled_level:
+            return
         cls._log(
             log_type=LogType.FATAL,
             message=message,
             extra_attributes=kwargs,
+            args=args,
         )
 
     @classmethod
-    def sys(cls, message: str, **kwargs):
+    def sys(cls, message: LogMessage, *args, **kwargs):
         """Prepares a log entry to record a system message (start, finish, etc..)"""
-        cls._log(log_type=LogType.SYS, message=message, extra_attributes=kwargs)
+        if logging.INFO < cls._enabled_level:
+            return
+        cls._log(log_type=LogType.SYS, message=message, extra_attributes=kwargs, args=args)
 
     @classmethod
     def api_request(cls, route, payload, response, **kwargs):
-        """Prepares a log entry to record an API request."""
+        """Prepares a log entry to record an API request.
+
+        When no `benchmark` is given, the timings of the spans finished during the request are used.
+        The tracking id defaults to the one of the current request context (see sds.core.context).
+        """
+        if logging.INFO < cls._enabled_level:
+            return
+
+        benchmark = kwargs.pop("benchmark", None)
+        span_benchmark = pop_benchmark()
+        if benchmark is None:
+            benchmark = span_benchmark
+
         payload = {
-            "by": Config.get("service.name", None),
+            "by": SERVICE_NAME_CONFIG_KEY(),
             "method": kwargs.get("method", None),
             "route": route,
             "payload": payload,
-            "benchmark": kwargs.pop("benchmark", None),
+            "benchmark": benchmark,
             "response": {
                 "payload": response,
                 "status_code": kwargs.get("status_code", None),
             },
             "tracking_id": kwargs.get("tracking_id", None),
+            "latency_ms": kwargs.get("latency_ms", None),
         }
         cls._log(
             log_type=LogType.API_REQUEST,
@@ -180,50 +572,313 @@ class Logger:
         )
 
     @classmethod
-    def perf(cls, metric_key: str, metric_value: Any, metric_unit: str = "", **kwargs):
+    def perf(
+        cls,
+        metric_key: str,
+        metric_value: Any,
+        metric_unit: str = "",
+        metric_type: Optional[MetricType] = None,
+        raw: bool = False,
+        **kwargs,
+    ):
         """Prepares a log entry to record a performance metric, like elapsed time, counters, etc...
 
+        In AGGREGATE perf mode, the value is aggregated in process instead, and a summary entry
+        is recorded per metric and flush interval. The kwargs are not recorded in that mode,
+        unless `raw` is True: the entry is then recorded as it is, for one-off metrics.
+
         :param str metric_key: The name of the metric lile "FETCH_TIME", "RETRY_COUNT", etc...
         :param Any metric_value: The value of the metric, lile 1, 2, 5.6, "OK", "FAIL", etc...
         :param str metric_unit: The unit, if applicable
+        :param MetricType metric_type: How the values are aggregated, in AGGREGATE perf mode.
+            Defaults to HISTOGRAM for numbers and COUNTER otherwise
         :param dict kwargs: additional fields to add to the metric entry
         """
+        if logging.INFO < cls._enabled_level:
+            return
+
+        cls._record_perf(metric_key, metric_value, metric_unit, metric_type, kwargs, aggregate=not raw)
+
+    @classmethod
+    def _record_perf(
+        cls,
+        metric_key: str,
+        metric_value: Any,
+        metric_unit: str,
+        metric_type: Optional[MetricType],
+        extra_attributes: dict,
+        at: Optional[str] = None,
+        aggregate: bool = True,
+    ) -> None:
+        """Records a performance metric, aggregated or as a log entry depending on the perf mode."""
+        metrics_aggregator = cls._metrics_aggregator
+        if metrics_aggregator is not None and aggregate:
+            metrics_aggregator.record(metric_key, metric_value, metric_unit, metric_type)
+            return
+
         message = f"{metric_key}|{metric_value}" if metric_unit == "" else f"{metric_key}|{metric_value}|{metric_unit}"
         cls._log(
             log_type=LogType.PERF,
             message=message,
-            extra_attributes=kwargs,
+            extra_attributes=extra_attributes,
+            at=at,
+            skip=3,
         )
 
     @classmethod
-    def _log(cls, log_type: LogType, message: str, extra_attributes: dict) -> None:
+    def span(cls, name: str, **attributes) -> DisabledSpan | Span:
+        """Times a block of code, as a context manager or a decorator.
+
+            with Logger.span("FETCH_TIME", source="db"):
+                ...
+
+            @Logger.span("PARSE_TIME")
+            def parse(...):
+                ...
+
+        The elapsed time is recorded with perf() in milliseconds, with the span attributes and the
+        span and parent span ids, and added to the benchmark of the next api_request() entry.
+        Nothing is timed when PERF entries are not enabled.
+        """
+        if logging.INFO < cls._enabled_level:
+            if attributes:
+                return DisabledSpan(name, attributes, cls.span)
+            return get_disabled_span(name, cls.span)
+        return Span(name, attributes, cls.span, cls._record_span)
+
+    @classmethod
+    def _record_span(cls, span: Span) -> None:
+        """Records the elapsed time of a finished span. The span path is used as the call site."""
+        extra_attributes = {
+            "span_id": span.span_id,
+            "parent_span_id": span.parent.span_id if span.parent is not None else None,
+            **span.attributes,
+        }
+        cls._record_perf(span.name, round(span.elapsed_ms, 3), "ms", None, extra_attributes, at=span.path)
+
+    @classmethod
+    def _log(
+        cls,
+        log_type: LogType,
+        message: LogMessage,
+        extra_attributes: dict,
+        args: tuple = (),
+        at: Optional[str] = None,
+        skip: int = 2,
+    ) -> None:
         """Add log environmental entries to log.
 
+        Callers must check the log type is enabled before building the entry.
+
         :param int log_type: The type of log entry to be added
-        :param str message: The log message to be added
+        :param str message: The log message to be added, or a callable returning it
         :param dict extra_attributes: A dict with the data to store in the log
+        :param tuple args: The arguments of a %-style message
+        :param str at: The call site, when it's not the caller of the log method
+        :param int skip: The stack level of the call site, relative to this method (see caller_name)
         """
+        log_sampler = cls._log_sampler
+        if log_sampler is not None and not log_sampler.sample(log_type.name):
+            return
 
-        log_entry = {
+        if callable(message):
+            message = message()
+        if args:
+            message = message % args
+
+        if log_sampler is not None and log_sampler.needs_call_site:
+            if not cls._admit_call_site(log_sampler, log_type, message, extra_attributes, at, skip + 1):
+                return
+
+        log_entry: Dict[str, Any] = {
             "type": log_type.name,
             "message": message,
             "app": cls._get_app_package_name(),
-            "at": cls.caller_name(),
+            "at": at if at is not None else cls.caller_name(skip) if cls._must_resolve_call_site(log_type) else "",
+            LOG_TIMESTAMP_FIELD: time.time_ns(),
         }
 
+        # Entries recorded while handling a request are linked to it
+        request_context = get_request_context()
+        if request_context is not None:
+            if extra_attributes.get("tracking_id") is None and request_context.tracking_id is not None:
+                extra_attributes["tracking_id"] = request_context.tracking_id
+            if request_context.route is not None and log_type != LogType.API_REQUEST:
+                extra_attributes.setdefault("route", request_context.route)
+
         if len(extra_attributes) > 0:
             log_entry["extra"] = extra_attributes
 
-        cls._logging_writer(log_type, log_entry)
+        cls._write_log_entry(log_type, log_entry)
+
+    @classmethod
+    def _admit_call_site(
+        cls,
+        log_sampler: LogSampler,
+        log_type: LogType,
+        message: str,
+        extra_attributes: dict,
+        at: Optional[str],
+        skip: int,
+    ) -> bool:
+        """Check if the rate limit and the deduplication of the call site admit the entry.
+
+        The number of entries suppressed since the last admitted one is added to the entry.
+
+        :param str at: The call site, when it's not the caller of the log method
+        :param int skip: The stack level of the call site, relative to this method
+        """
+        if at is not None:
+            call_site: Any = at
+        else:
+            frame = sys._getframe(skip)
+            call_site = (frame.f_code, frame.f_lineno)
+
+        suppressed_count = log_sampler.admit(call_site, log_type.name, message)
+        if suppressed_count is None:
+            return False
+        if suppressed_count > 0:
+            extra_attributes["suppressed_count"] = suppressed_count
+        return True
+
+    @classmethod
+    def _write_log_entry(cls, log_type: LogType, log_entry: dict) -> None:
+        """Writes a log entry, or enqueues it in async mode or when called from an event loop.
+
+        The entries of other threads are written synchronously, unless in async mode.
+        """
+        log_pipeline = cls._log_pipeline
+        if log_pipeline is None and cls._event_loop_sink_enabled and _in_event_loop():
+            log_pipeline = cls._get_event_loop_pipeline()
+
+        if log_pipeline is None:
+            cls._logging_writer(log_type, log_entry)
+        elif log_type == LogType.EXCEPTION:
+            # Exceptions are written by the caller thread, since the traceback is only available there,
+            # after the entries enqueued before them
+            log_pipeline.flush(EXCEPTION_FLUSH_TIMEOUT_SECONDS)
+            cls._logging_writer(log_type, log_entry)
+        elif not log_pipeline.put((log_type, log_entry), droppable=LOG_TYPE_LEVELS[log_type] < logging.ERROR):
+            if log_pipeline.closed:
+                cls._logging_writer(log_type, log_entry)
+
+    @classmethod
+    def _write_batch(cls, batch: List[Tuple[LogType, dict]]) -> None:
+        """Writes a batch of log entries enqueued in async mode."""
+        for log_type, log_entry in batch:
+            cls._logging_writer(log_type, log_entry)
+
+    @classmethod
+    def _log_metric_summary(cls, metric_key: str, summary: Dict[str, Any]) -> None:
+        """Records a log entry with the summary of an aggregated metric."""
+        log_entry = {
+            "type": LogType.PERF.name,
+            "message": metric_key,
+            "app": cls._get_app_package_name(),
+            "at": "",
+            LOG_TIMESTAMP_FIELD: time.time_ns(),
+            "extra": summary,
+        }
+        cls._write_log_entry(LogType.PERF, log_entry)
+
+    @classmethod
+    def _log_suppressed_entries(cls, suppressed: List[Tuple[str, str, int]]) -> None:
+        """Records the number of rate limited and duplicated entries suppressed and not reported yet."""
+        for log_type_name, message, suppressed_count in suppressed:
+            log_entry = {
+                "type": log_type_name,
+                "message": message,
+                "app": cls._get_app_package_name(),
+                "at": "",
+                LOG_TIMESTAMP_FIELD: time.time_ns(),
+                "extra": {"suppressed_count": suppressed_count},
+            }
+            cls._write_log_entry(LogType[log_type_name], log_entry)
+
+    @classmethod
+    def _log_dropped_entries(cls, dropped_count: int, dropped_total: int) -> None:
+        """Records a metric with the number of log entries dropped because the queue was full."""
+        log_entry = {
+            "type": LogType.PERF.name,
+            "message": f"LOG_DROPPED_ENTRIES|{dropped_count}",
+            "app": cls._get_app_package_name(),
+            "at": "",
+            LOG_TIMESTAMP_FIELD: time.time_ns(),
+            "extra": {"dropped_total": dropped_total},
+        }
+        cls._logging_writer(LogType.PERF, log_entry)
 
     @classmethod
     def _create_gcp_log_entry(cls, log_type: LogType, payload: dict) -> None:
         """Records a log entry in GCP Cloud Logging."""
-        clean_payload = convert_bytes(payload)
-        log_message = json.dumps(clean_payload)
+        log_message = cls._format_gcp_log_entry(log_type, payload)
 
-        # TODO (mauro): make GCP log entry be a true JSON for Cloud Logging querying
-        cls._logging_functions[log_type](log_message)
+        with cls._gcp_write_lock:
+            sys.stdout.write(log_message + "\n")
+            sys.stdout.flush()
+
+    @classmethod
+    def _create_gcp_log_entries(cls, batch: List[Tuple[LogType, dict]]) -> None:
+        """Records a batch of log entries in GCP Cloud Logging, with a single write."""
+        log_messages = "".join(cls._format_gcp_log_entry(log_type, payload) + "\n" for log_type, payload in batch)
+
+        with cls._gcp_write_lock:
+            sys.stdout.write(log_messages)
+            sys.stdout.flush()
+
+    @classmethod
+    def _format_gcp_log_entry(cls, log_type: LogType, payload: dict) -> str:
+        """Formats a log entry as a Cloud Logging structured log (a JSON object in one line).
+
+        The Cloud Run logging agent reads the structured logs from stdout. The special fields
+        (severity, timestamp, trace, etc...) are used as the log entry attributes and the other
+        fields are stored as the jsonPayload, where they can be queried.
+        """
+        timestamp_ns = payload[LOG_TIMESTAMP_FIELD]
+        structured_entry = {
+            "severity": GCP_SEVERITIES[log_type],
+            "timestamp": {"seconds": timestamp_ns // 1_000_000_000, "nanos": timestamp_ns % 1_000_000_000},
+            **payload,
+        }
+        del structured_entry[LOG_TIMESTAMP_FIELD]
+
+        if payload["at"]:
+            structured_entry[GCP_SOURCE_LOCATION_FIELD] = {"function": payload["at"]}
+
+        extra = payload.get("extra")
+        if extra is not None and extra.get("tracking_id"):
+            structured_entry.update(cls._get_gcp_trace_fields(str(extra["tracking_id"])))
+
+        if log_type == LogType.EXCEPTION and sys.exc_info()[0] is not None:
+            # Picked up by Error Reporting
+            structured_entry["stack_trace"] = traceback.format_exc()
+
+        return cls._log_encoder.encode(structured_entry)
+
+    @classmethod
+    def _get_gcp_trace_fields(cls, tracking_id: str) -> dict:
+        """Get the Cloud Logging trace fields of a tracking id.
+
+        The tracking id can be a trace id or the value of the X-Cloud-Trace-Context header
+        ("TRACE_ID/SPAN_ID;o=OPTIONS"), in which case the span is also recorded.
+        """
+        trace_id, _, span = tracking_id.partition("/")
+
+        trace_fields: Dict[str, Any] = {
+            GCP_TRACE_FIELD: f"projects/{cls._gcp_project_id}/traces/{trace_id}" if cls._gcp_project_id else trace_id,
+        }
+
+        if span:
+            span_id, _, options = span.partition(";")
+            if span_id.isdigit():
+                # The header has a decimal span id, Cloud Logging expects 16 hexadecimal characters
+                span_id = format(int(span_id), "016x")
+            if span_id:
+                trace_fields[GCP_SPAN_ID_FIELD] = span_id
+            if options:
+                trace_fields[GCP_TRACE_SAMPLED_FIELD] = options == "o=1"
+
+        return trace_fields
 
     @classmethod
     def _create_local_log_entry(cls, log_type: LogType, payload: dict) -> None:
@@ -232,11 +887,13 @@ class Logger:
         log_message: str = ""
 
         # Log entry prefix with predefined fields
-#        entry_field_names = ["app", "type", "at", "message"]
+        #        entry_field_names = ["app", "type", "at", "message"]
         entry_field_names = ["type", "at", "message"]
         for entry_field in entry_field_names:
             log_message += f"{payload_copy[entry_field]}|"
             del payload_copy[entry_field]
+        # The console handler records its own time
+        del payload_copy[LOG_TIMESTAMP_FIELD]
 
         # Attach other attributes
         for attribute_name, attribute_value in payload_copy.items():
@@ -245,44 +902,36 @@ class Logger:
         cls._logging_functions[log_type](log_message)
 
     @classmethod
-    def caller_name(cls, skip: int = 2):
+    def _must_resolve_call_site(cls, log_type: LogType) -> bool:
+        """Check if the call site must be resolved for a log type, according to the call site mode."""
+        if cls._call_site_mode == CallSiteMode.ALWAYS:
+            return True
+        if cls._call_site_mode == CallSiteMode.WARNING_AND_ABOVE:
+            return log_type in SEVERE_LOG_TYPES
+        return False
+
+    @classmethod
+    def caller_name(cls, skip: int = 2) -> str:
         """Get a name of a caller in the format module.class.method.
 
         `skip` specifies how many levels of stack to skip while getting caller
         name. skip=1 means "who calls me", skip=2 "who calls my caller" etc.
 
+        Only the frames up to the requested one are visited, and the resolved name is
+        cached per code object.
+
         An empty string is returned if skipped levels exceed stack height
         """
-
-        def stack_(frame):
-            framelist = []
-            while frame:
-                framelist.append(frame)
-                frame = frame.f_back
-            return framelist
-
-        stack = stack_(sys._getframe(1))
-        start = 0 + skip
-        if len(stack) < start + 1:
+        try:
+            parentframe = sys._getframe(skip + 1)
+        except ValueError:
             return ""
 
-        parentframe = stack[start]
-
-        name: List[str] = []
-        module = inspect.getmodule(parentframe)
-        if module is not None:
-            # `modname` can be None when frame is executed directly in console
-
-            module_name = module.__name__ if module.__name__ != "__main__" else cls._get_app_package_name()
-            name.append(module_name)
-
-        # detect classname
-        if "self" in parentframe.f_locals:
-            name.append(parentframe.f_locals["self"].__class__.__name__)
+        module_name = parentframe.f_globals.get("__name__")
+        if module_name == "__main__":
+            module_name = cls._get_app_package_name()
 
-        codename = parentframe.f_code.co_name
-        if codename != "<module>":  # top level usually
-            name.append(codename)  # function or a method
+        name = _call_site_name(parentframe.f_code, module_name)
 
         del parentframe
-        return ".".join(name)
+        return name
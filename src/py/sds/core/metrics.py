@@ -0,0 +1,278 @@
+import math
+import sys
+import threading
+import traceback
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
+
+
+class MetricType(Enum):
+    """How the values of a metric are aggregated."""
+
+    # Values are added (or, for non numeric values, the occurrences of each value are counted)
+    COUNTER = "COUNTER"
+    # The last value is kept
+    GAUGE = "GAUGE"
+    # The distribution of the values is kept (count, sum, min, max and percentiles)
+    HISTOGRAM = "HISTOGRAM"
+
+
+class Histogram:
+    """A fixed memory histogram with log-linear buckets.
+
+    Each power of two is split in SUB_BUCKETS linear buckets, so percentiles have a relative error
+    below 1 / (2 * SUB_BUCKETS), whatever the range of the values. Negative values have their own
+    buckets. NaN and infinities can't be bucketed: they're only counted in `non_finite_count`.
+    """
+
+    SUB_BUCKETS = 16
+
+    __slots__ = (
+        "count",
+        "total",
+        "min",
+        "max",
+        "non_finite_count",
+        "_zero_count",
+        "_positive_buckets",
+        "_negative_buckets",
+    )
+
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0
+        self.min: float = math.inf
+        self.max: float = -math.inf
+        self.non_finite_count: int = 0
+        self._zero_count: int = 0
+        self._positive_buckets: Dict[int, int] = {}
+        self._negative_buckets: Dict[int, int] = {}
+
+    @classmethod
+    def _bucket_index(cls, value: float) -> int:
+        """Get the bucket of a positive value."""
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        return exponent * cls.SUB_BUCKETS + int((mantissa - 0.5) * 2 * cls.SUB_BUCKETS)
+
+    @classmethod
+    def _bucket_value(cls, index: int) -> float:
+        """Get the value in the middle of a bucket."""
+        exponent, sub_bucket = divmod(index, cls.SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2 * cls.SUB_BUCKETS), exponent)
+
+    def record(self, value: float) -> None:
+        if not _is_finite(value):
+            # They would also turn the sum and the mean into NaN
+            self.non_finite_count += 1
+            return
+
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value == 0:
+            self._zero_count += 1
+            return
+
+        if value > 0:
+            buckets = self._positive_buckets
+        else:
+            buckets = self._negative_buckets
+            value = -value
+
+        # Same as _bucket_index(), inlined since this is the hot path
+        mantissa, exponent = math.frexp(value)
+        index = exponent * self.SUB_BUCKETS + int((mantissa - 0.5) * 2 * self.SUB_BUCKETS)
+        buckets[index] = buckets.get(index, 0) + 1
+
+    def percentiles(self, quantiles: List[float]) -> List[float]:
+        """Get the approximate values of sorted quantiles (between 0 and 1)."""
+        # (value, count) of every bucket, in increasing order of value
+        buckets = [
+            (-self._bucket_value(index), count) for index, count in sorted(self._negative_buckets.items(), reverse=True)
+        ]
+        if self._zero_count > 0:
+            buckets.append((0.0, self._zero_count))
+        buckets.extend((self._bucket_value(index), count) for index, count in sorted(self._positive_buckets.items()))
+
+        results: List[float] = []
+        cumulative_count = 0
+        bucket_iterator = iter(buckets)
+        value = 0.0
+        for quantile in quantiles:
+            rank = max(1, math.ceil(quantile * self.count))
+            while cumulative_count < rank:
+                value, count = next(bucket_iterator)
+                cumulative_count += count
+            # The bucket value is an approximation: keep it inside the observed range
+            results.append(min(max(value, self.min), self.max))
+
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.percentiles([0.5, 0.95, 0.99])
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+        }
+
+
+class _Metric:
+    """The aggregated values of a metric during a flush interval."""
+
+    __slots__ = ("metric_type", "metric_unit", "count", "total", "last", "values", "histogram")
+
+    def __init__(self, metric_type: MetricType, metric_unit: str):
+        self.metric_type = metric_type
+        self.metric_unit = metric_unit
+        self.count: int = 0
+        self.total: float = 0
+        self.last: Any = None
+        self.values: Optional[Dict[str, int]] = None
+        self.histogram: Optional[Histogram] = Histogram() if metric_type == MetricType.HISTOGRAM else None
+
+    def record(self, metric_value: Any) -> None:
+        self.count += 1
+        self.last = metric_value
+
+        if not _is_number(metric_value):
+            # Non numeric values ("OK", "FAIL", etc...) are counted by value, whatever the type
+            if self.values is None:
+                self.values = {}
+            value_key = str(metric_value)
+            self.values[value_key] = self.values.get(value_key, 0) + 1
+        elif self.histogram is not None:
+            self.histogram.record(metric_value)
+        elif self.metric_type == MetricType.COUNTER:
+            self.total += metric_value
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            "metric_type": self.metric_type.name,
+            "metric_unit": self.metric_unit,
+            "count": self.count,
+        }
+
+        if self.histogram is not None:
+            if self.histogram.count > 0:
+                summary.update(self.histogram.summary())
+            if self.histogram.non_finite_count > 0:
+                summary["non_finite_count"] = self.histogram.non_finite_count
+        elif self.metric_type == MetricType.COUNTER:
+            summary["sum"] = self.total
+        else:
+            summary["last"] = self.last
+
+        if self.values is not None:
+            summary["values"] = self.values
+
+        return summary
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_finite(value: float) -> bool:
+    try:
+        return math.isfinite(value)
+    except OverflowError:
+        # An int too large to be converted to a float
+        return False
+
+
+class MetricsAggregator:
+    """Aggregates metric values in process and flushes one summary per metric periodically.
+
+    The metrics are spread over lock-protected stripes (by metric key), so threads recording
+    different metrics rarely wait for each other. A background thread calls `flush_callback` with
+    the summary of each metric recorded during the interval.
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[str, Dict[str, Any]], None],
+        interval_seconds: float = 60,
+        stripe_count: int = 16,
+    ):
+        """Create the aggregator and start its flush thread.
+
+        :param flush_callback: Called with the metric key and its summary
+        :param float interval_seconds: The time between flushes
+        :param int stripe_count: The number of independently locked groups of metrics
+        """
+        self._flush_callback = flush_callback
+        self._interval_seconds = interval_seconds
+        self._stripe_locks: List[threading.Lock] = [threading.Lock() for _ in range(stripe_count)]
+        self._stripe_metrics: List[Dict[str, _Metric]] = [{} for _ in range(stripe_count)]
+        self._stripe_count = stripe_count
+
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sds-metrics-flush", daemon=True)
+        self._thread.start()
+
+    def record(
+        self,
+        metric_key: str,
+        metric_value: Any,
+        metric_unit: str = "",
+        metric_type: Optional[MetricType] = None,
+    ) -> None:
+        """Add a value to a metric.
+
+        :param MetricType metric_type: How to aggregate the values. Defaults to HISTOGRAM for
+            numbers and COUNTER (of occurrences of each value) otherwise. The type of a metric is
+            set by its first value in each interval.
+        """
+        stripe = hash(metric_key) % self._stripe_count
+        with self._stripe_locks[stripe]:
+            metrics = self._stripe_metrics[stripe]
+            metric = metrics.get(metric_key)
+            if metric is None:
+                if metric_type is None:
+                    metric_type = MetricType.HISTOGRAM if _is_number(metric_value) else MetricType.COUNTER
+                metric = _Metric(metric_type, metric_unit)
+                metrics[metric_key] = metric
+            metric.record(metric_value)
+
+    def flush(self) -> None:
+        """Call the flush callback with the summary of the metrics recorded since the previous flush."""
+        for stripe in range(self._stripe_count):
+            with self._stripe_locks[stripe]:
+                metrics = self._stripe_metrics[stripe]
+                self._stripe_metrics[stripe] = {}
+
+            # The callback is called without holding the lock, so recording is never blocked by I/O
+            for metric_key, metric in metrics.items():
+                self._flush_callback(metric_key, metric.summary())
+
+    def close(self) -> None:
+        """Stop the flush thread and flush the pending metrics."""
+        self._closed.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        """The flush thread loop."""
+        while not self._closed.wait(self._interval_seconds):
+            try:
+                self.flush()
+            except Exception:
+                # The flush thread must survive a failing callback
+                traceback.print_exc(file=sys.stderr)
@@ -0,0 +1,62 @@
+import math
+import os
+from typing import Optional
+
+# The CPU limit of the container: "<quota> <period>" (cgroup v2) or the quota and period files (cgroup v1)
+_CGROUP_V2_CPU_MAX_PATH = "/sys/fs/cgroup/cpu.max"
+_CGROUP_V1_CPU_QUOTA_PATH = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+_CGROUP_V1_CPU_PERIOD_PATH = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read_file(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def _get_cgroup_cpu_limit() -> Optional[float]:
+    """Get the CPU limit of the container in CPUs (e.g. 1.5), or None if it's not limited."""
+    cpu_max = _read_file(_CGROUP_V2_CPU_MAX_PATH)
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota_us = _read_file(_CGROUP_V1_CPU_QUOTA_PATH)
+    period_us = _read_file(_CGROUP_V1_CPU_PERIOD_PATH)
+    if quota_us is not None and period_us is not None and int(quota_us) > 0:
+        return int(quota_us) / int(period_us)
+    return None
+
+
+def get_available_cpu_count() -> float:
+    """Get the number of CPUs the process can use, e.g. 0.5, 1 or 4.
+
+    It's the CPU quota of the container (Cloud Run "--cpu") when there is one, which can be lower
+    than os.cpu_count() (the CPUs of the host) and fractional, limited by the CPU affinity.
+    """
+    try:
+        cpu_count: float = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cpu_count = os.cpu_count() or 1
+
+    try:
+        cpu_limit = _get_cgroup_cpu_limit()
+    except ValueError:
+        cpu_limit = None
+
+    return min(cpu_count, cpu_limit) if cpu_limit is not None else cpu_count
+
+
+def get_worker_count(override: Optional[int] = None, per_cpu: float = 1) -> int:
+    """Get a number of workers (processes or threads) sized to the CPU quota, at least 1.
+
+    :param int override: A configured number of workers, used as it is when set
+    :param float per_cpu: The number of workers per available CPU
+    """
+    if override:
+        return max(1, int(override))
+    return max(1, math.ceil(get_available_cpu_count() * per_cpu))
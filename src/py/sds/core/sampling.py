@@ -0,0 +1,245 @@
+import collections
+import random
+import sys
+import threading
+import time
+import traceback
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+
+class _TokenBucket:
+    """The rate limit state of a call site, with the last entry suppressed."""
+
+    __slots__ = ("tokens", "updated_at", "suppressed_count", "log_type_name", "message")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+        self.suppressed_count: int = 0
+        self.log_type_name: str = ""
+        self.message: str = ""
+
+
+class _DuplicateState:
+    """The deduplication state of a message."""
+
+    __slots__ = ("window_start", "suppressed_count")
+
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.suppressed_count: int = 0
+
+
+class LogSampler:
+    """Decides which log entries are written, before they are built and serialized.
+
+    Three mechanisms can be combined:
+    - Sample rates: a fraction of the entries of each log type is kept (randomly).
+    - Rate limits: a token bucket per call site limits the entries per second, with bursts.
+    - Deduplication: the same message from the same call site is written once per window.
+
+    Rate limited and duplicated entries are counted, and the count is attached to the next entry
+    written for the same call site (or message) as its suppressed count. The counts of the call
+    sites and messages not written again are reported periodically with `report_callback`, or
+    when the sampler is closed.
+    """
+
+    def __init__(
+        self,
+        sample_rates: Optional[Mapping[str, float]] = None,
+        rate_limit_per_second: Optional[float] = None,
+        rate_limit_burst: Optional[int] = None,
+        dedup_window_seconds: Optional[float] = None,
+        max_keys: int = 10000,
+        report_callback: Optional[Callable[[List[Tuple[str, str, int]]], None]] = None,
+        report_interval_seconds: float = 60,
+    ):
+        """Create a sampler, and its report thread if there is a report callback.
+
+        :param dict sample_rates: The fraction (0 to 1) of entries kept, by log type name
+        :param float rate_limit_per_second: Maximum entries per second and call site
+        :param int rate_limit_burst: Maximum entries in a burst, per call site. Defaults to the
+            rate limit per second
+        :param float dedup_window_seconds: Time during which repeated messages are suppressed
+        :param int max_keys: Maximum call sites and messages tracked (least recently used are evicted)
+        :param report_callback: Called with the entries suppressed and not reported yet (see
+            pop_suppressed()), when there are some
+        :param float report_interval_seconds: The time between reports
+        """
+        self._sample_rates: Dict[str, float] = {
+            log_type_name.upper(): float(rate) for log_type_name, rate in (sample_rates or {}).items()
+        }
+        self._rate_limit_per_second = rate_limit_per_second
+        self._rate_limit_burst = float(rate_limit_burst or rate_limit_per_second or 0)
+        self._dedup_window_seconds = dedup_window_seconds
+        self._max_keys = max_keys
+
+        self._lock = threading.Lock()
+        self._token_buckets: collections.OrderedDict[Hashable, _TokenBucket] = collections.OrderedDict()
+        self._duplicates: collections.OrderedDict[Tuple[Hashable, str, str], _DuplicateState] = (
+            collections.OrderedDict()
+        )
+        # The suppressed counts of the evicted states, by log type name and message
+        self._evicted_counts: Dict[Tuple[str, str], int] = {}
+
+        self._report_callback = report_callback
+        self._report_interval_seconds = report_interval_seconds
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if report_callback is not None and self.needs_call_site:
+            self._thread = threading.Thread(target=self._run, name="sds-log-sampler-report", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_config(
+        cls,
+        sampling_config: Mapping[str, Any],
+        report_callback: Optional[Callable[[List[Tuple[str, str, int]]], None]] = None,
+    ) -> "LogSampler":
+        """Create a sampler from the "logging.sampling" config entry."""
+        rate_limit: Mapping[str, Any] = sampling_config.get("rate_limit") or {}
+        return cls(
+            sample_rates=sampling_config.get("rates"),
+            rate_limit_per_second=rate_limit.get("per_second"),
+            rate_limit_burst=rate_limit.get("burst"),
+            dedup_window_seconds=sampling_config.get("dedup_window_seconds"),
+            max_keys=int(sampling_config.get("max_keys", 10000)),
+            report_callback=report_callback,
+            report_interval_seconds=float(sampling_config.get("report_interval_seconds", 60)),
+        )
+
+    @property
+    def needs_call_site(self) -> bool:
+        """True if the call site is used (by the rate limits or the deduplication)."""
+        return self._rate_limit_per_second is not None or self._dedup_window_seconds is not None
+
+    def sample(self, log_type_name: str) -> bool:
+        """Check if an entry of a log type is kept by its sample rate."""
+        rate = self._sample_rates.get(log_type_name)
+        return rate is None or random.random() < rate
+
+    def admit(self, call_site: Hashable, log_type_name: str, message: str) -> Optional[int]:
+        """Apply the rate limit and the deduplication to an entry.
+
+        Returns None if the entry must be suppressed, or the number of entries suppressed since
+        the previous entry written for the same call site or message.
+        """
+        now = time.monotonic()
+        suppressed_count = 0
+
+        with self._lock:
+            # Duplicates are suppressed first, so they don't use the rate limit tokens
+            duplicate: Optional[_DuplicateState] = None
+            if self._dedup_window_seconds is not None:
+                message_key = (call_site, log_type_name, message)
+                duplicate = self._get_state(self._duplicates, message_key)
+                if duplicate is not None and now - duplicate.window_start < self._dedup_window_seconds:
+                    duplicate.suppressed_count += 1
+                    return None
+
+            if self._rate_limit_per_second is not None:
+                bucket = self._get_state(self._token_buckets, call_site)
+                if bucket is None:
+                    bucket = _TokenBucket(self._rate_limit_burst, now)
+                    self._set_state(self._token_buckets, call_site, bucket)
+                else:
+                    bucket.tokens = min(
+                        self._rate_limit_burst,
+                        bucket.tokens + (now - bucket.updated_at) * self._rate_limit_per_second,
+                    )
+                    bucket.updated_at = now
+
+                if bucket.tokens < 1:
+                    bucket.suppressed_count += 1
+                    bucket.log_type_name = log_type_name
+                    bucket.message = message
+                    return None
+
+                bucket.tokens -= 1
+                suppressed_count += bucket.suppressed_count
+                bucket.suppressed_count = 0
+
+            if self._dedup_window_seconds is not None:
+                # A new window starts with the entry written
+                if duplicate is not None:
+                    suppressed_count += duplicate.suppressed_count
+                self._set_state(self._duplicates, message_key, _DuplicateState(now))
+
+        return suppressed_count
+
+    def pop_suppressed(self) -> List[Tuple[str, str, int]]:
+        """Get the (log type name, message, count) of the entries suppressed and not reported yet.
+
+        The rate limited entries of a call site are reported with the last message suppressed.
+        The suppressed counts are reset.
+        """
+        with self._lock:
+            suppressed = [
+                (log_type_name, message, suppressed_count)
+                for (log_type_name, message), suppressed_count in self._evicted_counts.items()
+            ]
+            self._evicted_counts.clear()
+
+            for (_, log_type_name, message), duplicate in self._duplicates.items():
+                if duplicate.suppressed_count > 0:
+                    suppressed.append((log_type_name, message, duplicate.suppressed_count))
+            self._duplicates.clear()
+
+            for bucket in self._token_buckets.values():
+                if bucket.suppressed_count > 0:
+                    suppressed.append((bucket.log_type_name, bucket.message, bucket.suppressed_count))
+                    bucket.suppressed_count = 0
+        return suppressed
+
+    def report(self) -> None:
+        """Call the report callback with the entries suppressed and not reported yet, if any."""
+        suppressed = self.pop_suppressed()
+        if suppressed and self._report_callback is not None:
+            self._report_callback(suppressed)
+
+    def close(self) -> None:
+        """Stop the report thread and report the pending suppressed counts."""
+        self._closed.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.report()
+
+    def _run(self) -> None:
+        """The report thread loop."""
+        while not self._closed.wait(self._report_interval_seconds):
+            try:
+                self.report()
+            except Exception:
+                # The report thread must survive a failing callback
+                traceback.print_exc(file=sys.stderr)
+
+    def _get_state(self, states: collections.OrderedDict, key: Hashable) -> Any:
+        state = states.get(key)
+        if state is not None:
+            states.move_to_end(key)
+        return state
+
+    def _set_state(self, states: collections.OrderedDict, key: Hashable, state: Any) -> None:
+        states[key] = state
+        states.move_to_end(key)
+        if len(states) > self._max_keys:
+            evicted_key, evicted_state = states.popitem(last=False)
+            if evicted_state.suppressed_count > 0:
+                # Kept until the next report, instead of being lost with the state
+                if isinstance(evicted_state, _TokenBucket):
+                    report_key = (evicted_state.log_type_name, evicted_state.message)
+                else:
+                    _, log_type_name, message = evicted_key
+                    report_key = (log_type_name, message)
+                self._evicted_counts[report_key] = (
+                    self._evicted_counts.get(report_key, 0) + evicted_state.suppressed_count
+                )
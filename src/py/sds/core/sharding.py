@@ -0,0 +1,340 @@
+import itertools
+import os
+import time
+import zlib
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from enum import Enum
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from sds.utils.core.checkpoint import Checkpoint
+from sds.utils.core.logging import Logger
+from sds.utils.core.runtime import get_worker_count
+
+T = TypeVar("T")
+
+# Set by Cloud Run jobs in every task. Set them by hand to simulate a task locally.
+TASK_INDEX_ENVVAR = "CLOUD_RUN_TASK_INDEX"
+TASK_COUNT_ENVVAR = "CLOUD_RUN_TASK_COUNT"
+
+
+class ExecutorType(Enum):
+    """How the shards of a task are run in parallel."""
+
+    # For I/O bound work (API calls, queries, etc...)
+    THREAD = "THREAD"
+    # For CPU bound work. The function and the items must be picklable.
+    PROCESS = "PROCESS"
+
+
+def get_task_index() -> int:
+    """Get the index of the Cloud Run job task running this process (0 when not in a job)."""
+    return int(os.environ.get(TASK_INDEX_ENVVAR, 0))
+
+
+def get_task_count() -> int:
+    """Get the number of tasks of the Cloud Run job execution (1 when not in a job)."""
+    return int(os.environ.get(TASK_COUNT_ENVVAR, 1))
+
+
+def get_task_items(
+    items: Iterable[T],
+    task_index: Optional[int] = None,
+    task_count: Optional[int] = None,
+    key: Optional[Callable[[T], Any]] = None,
+) -> Iterator[T]:
+    """Get the items handled by a task, so the tasks of a job share the work without overlap.
+
+    Without `key`, the items are dealt by position (item i goes to task i % task_count), so the
+    input must be in the same order in every task. With `key`, an item goes to the task given by
+    a stable hash of its key, whatever the order of the input.
+
+    :param items: All the items of the job
+    :param int task_index: The index of the task. Defaults to CLOUD_RUN_TASK_INDEX
+    :param int task_count: The number of tasks. Defaults to CLOUD_RUN_TASK_COUNT
+    :param key: Function getting the key of an item (e.g. its id)
+    """
+    task_index = get_task_index() if task_index is None else task_index
+    task_count = get_task_count() if task_count is None else task_count
+    if not 0 <= task_index < task_count:
+        raise ValueError(f"Invalid task index {task_index} for {task_count} tasks.")
+
+    if task_count == 1:
+        yield from items
+    elif key is None:
+        yield from itertools.islice(items, task_index, None, task_count)
+    else:
+        for item in items:
+            # crc32 is stable across processes, unlike hash() of strings
+            if zlib.crc32(str(key(item)).encode()) % task_count == task_index:
+                yield item
+
+
+def _process_shard(process_item: Callable[[T], Any], shard: List[T]) -> Tuple[List[int], Optional[str]]:
+    """Process the items of a shard. Module level, so it can run in a process pool.
+
+    A failed item doesn't stop the shard. Returns the positions of the failed items in the shard,
+    and the first error (as a string, since exceptions are not always picklable).
+    """
+    failed_positions: List[int] = []
+    first_error: Optional[str] = None
+    for position, item in enumerate(shard):
+        try:
+            process_item(item)
+        except Exception as e:
+            failed_positions.append(position)
+            if first_error is None:
+                first_error = str(e)
+    return failed_positions, first_error
+
+
+class ShardingResult:
+    """The outcome of run_sharded()."""
+
+    __slots__ = ("item_count", "shard_count", "failed_shards", "elapsed_seconds")
+
+    def __init__(self):
+        self.item_count: int = 0
+        self.shard_count: int = 0
+        # The items that still failed after the retries, by shard index
+        self.failed_shards: Dict[int, List[Any]] = {}
+        self.elapsed_seconds: float = 0
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.failed_shards
+
+
+def run_sharded(
+    items: Iterable[T],
+    process_item: Callable[[T], Any],
+    shard_size: int = 100,
+    executor_type: ExecutorType = ExecutorType.THREAD,
+    max_workers: Optional[int] = None,
+    max_retries: int = 2,
+    retry_delay_seconds: float = 1.0,
+    key: Optional[Callable[[T], Any]] = None,
+    metric_prefix: str = "SHARD",
+    checkpoint: Optional[Checkpoint] = None,
+) -> ShardingResult:
+    """Process the items of this Cloud Run job task, in parallel shards.
+
+    The items of the task are selected with get_task_items(), split in shards of `shard_size`
+    items, and the shards run in a pool sized to the CPU quota of the container. Only the failed
+    items of a shard are retried, after `retry_delay_seconds` times the attempt number: the items
+    that succeeded are not processed again, and are marked as completed in the checkpoint. The
+    progress and the throughput are recorded with Logger.perf() as each shard finishes.
+
+        def main():
+            result = run_sharded(load_ids(), process_id, shard_size=50)
+            if not result.succeeded:
+                raise RuntimeError(f"Items of {len(result.failed_shards)} shards failed")
+
+    :param items: All the items of the job, in the same order in every task (or with a `key`)
+    :param process_item: The function processing an item. Must be picklable for a process pool
+    :param int shard_size: The number of items of a shard (the unit of progress)
+    :param ExecutorType executor_type: Threads (I/O bound work) or processes (CPU bound work)
+    :param int max_workers: The size of the pool. Defaults to the number of CPUs of the quota for
+        processes, and 4 per CPU for threads
+    :param int max_retries: The number of retries of the failed items of a shard
+    :param float retry_delay_seconds: The delay before the first retry of a shard
+    :param key: See get_task_items(). Also the key of the items in the checkpoint
+    :param str metric_prefix: The prefix of the perf metric keys
+    :param Checkpoint checkpoint: When given, the items already completed are skipped, and the items
+        processed successfully are marked as completed (and saved in batches by the checkpoint)
+    """
+    executor, max_workers = _create_executor(executor_type, max_workers)
+
+    task_items = get_task_items(items, key=key)
+    if checkpoint is not None:
+        # Filtered after the partition, so the items of each task don't depend on the progress of the others
+        task_items = checkpoint.pending(task_items, key=key or str)
+    shards: Iterator[List[T]] = iter(lambda: list(itertools.islice(task_items, shard_size)), [])
+
+    Logger.sys(
+        "SHARDING_START",
+        task_index=get_task_index(),
+        task_count=get_task_count(),
+        executor_type=executor_type.name,
+        max_workers=max_workers,
+    )
+
+    # Keep twice as many shards in flight as workers, so the workers never wait
+    shard_runner = _ShardRunner(
+        executor,
+        process_item,
+        shards,
+        max_in_flight=max_workers * 2,
+        max_retries=max_retries,
+        retry_delay_seconds=retry_delay_seconds,
+        metric_prefix=metric_prefix,
+        checkpoint_key=key or str,
+        checkpoint=checkpoint,
+    )
+    try:
+        shard_runner.run()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if checkpoint is not None:
+            checkpoint.flush()
+
+    result = shard_runner.result
+    result.elapsed_seconds = time.perf_counter() - shard_runner.start_time
+    Logger.sys(
+        "SHARDING_FINISH",
+        item_count=result.item_count,
+        shard_count=result.shard_count,
+        failed_shard_count=len(result.failed_shards),
+        elapsed_seconds=round(result.elapsed_seconds, 3),
+    )
+    return result
+
+
+def _create_executor(executor_type: ExecutorType, max_workers: Optional[int]) -> Tuple[Executor, int]:
+    """Create the pool running the shards, sized to the CPU quota of the container unless `max_workers` is set."""
+    if executor_type == ExecutorType.PROCESS:
+        # Imported here, since multiprocessing is slow to import and only needed by process pools
+        from concurrent.futures import ProcessPoolExecutor
+
+        max_workers = get_worker_count(max_workers)
+        return ProcessPoolExecutor(max_workers=max_workers), max_workers
+
+    max_workers = get_worker_count(max_workers, per_cpu=4)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sds-shard"), max_workers
+
+
+class _ShardRunner:
+    """Runs the shards of run_sharded() in an executor, and retries the failed ones.
+
+    Shards are created as workers get free, so a huge input is never loaded at once.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        process_item: Callable[[Any], Any],
+        shards: Iterator[List[Any]],
+        max_in_flight: int,
+        max_retries: int,
+        retry_delay_seconds: float,
+        metric_prefix: str,
+        checkpoint_key: Callable[[Any], Any],
+        checkpoint: Optional[Checkpoint],
+    ):
+        self.executor = executor
+        self.process_item = process_item
+        self.shards = shards
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_delay_seconds = retry_delay_seconds
+        self.metric_prefix = metric_prefix
+        self.checkpoint_key = checkpoint_key
+        self.checkpoint = checkpoint
+
+        self.result = ShardingResult()
+        self.start_time = time.perf_counter()
+
+        self._pending: Dict[Future, int] = {}
+        self._shard_items: Dict[int, List[Any]] = {}
+        self._attempts: Dict[int, int] = {}
+        self._retry_times: Dict[int, float] = {}
+        self._shard_indexes = itertools.count()
+        self._has_more_shards = True
+
+    def run(self) -> None:
+        """Run the shards until they all succeeded or failed after their retries."""
+        while self._has_more_shards or self._pending or self._retry_times:
+            self._submit_new_shards()
+            now = time.perf_counter()
+            self._submit_due_retries(now)
+
+            # The wait ends when a shard finishes, or when the next retry is due
+            timeout = max(0.0, min(self._retry_times.values()) - now) if self._retry_times else None
+            if not self._pending:
+                time.sleep(timeout or 0)
+                continue
+
+            done, _ = wait(self._pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._finish_shard(self._pending.pop(future), future)
+
+    def _submit(self, shard_index: int) -> None:
+        future = self.executor.submit(_process_shard, self.process_item, self._shard_items[shard_index])
+        self._pending[future] = shard_index
+
+    def _submit_new_shards(self) -> None:
+        while self._has_more_shards and len(self._pending) < self.max_in_flight:
+            shard = next(self.shards, None)
+            if shard is None:
+                self._has_more_shards = False
+                return
+            shard_index = next(self._shard_indexes)
+            self._shard_items[shard_index] = shard
+            self._attempts[shard_index] = 1
+            self._submit(shard_index)
+
+    def _submit_due_retries(self, now: float) -> None:
+        for shard_index, retry_time in list(self._retry_times.items()):
+            if retry_time <= now:
+                del self._retry_times[shard_index]
+                self._submit(shard_index)
+
+    def _finish_shard(self, shard_index: int, future: Future) -> None:
+        try:
+            failed_positions, error = future.result()
+        except Exception as e:
+            # The whole shard failed, e.g. a worker process died
+            self._retry_or_fail(shard_index, str(e))
+            return
+
+        shard = self._shard_items.pop(shard_index)
+        done_items = shard
+        if failed_positions:
+            failed_position_set = set(failed_positions)
+            done_items = [item for position, item in enumerate(shard) if position not in failed_position_set]
+            # Only the failed items are retried
+            self._shard_items[shard_index] = [shard[position] for position in failed_positions]
+
+        if self.checkpoint is not None:
+            self.checkpoint.mark_all_done(map(self.checkpoint_key, done_items))
+        result = self.result
+        result.item_count += len(done_items)
+
+        elapsed_seconds = time.perf_counter() - self.start_time
+        Logger.perf(f"{self.metric_prefix}_ITEMS_DONE", result.item_count, "items", shard_index=shard_index)
+        Logger.perf(f"{self.metric_prefix}_THROUGHPUT", round(result.item_count / elapsed_seconds, 3), "items/s")
+
+        if failed_positions:
+            self._retry_or_fail(shard_index, str(error))
+        else:
+            result.shard_count += 1
+
+    def _retry_or_fail(self, shard_index: int, error: str) -> None:
+        """Schedule the retry of the failed items of a shard, after `retry_delay_seconds` times the attempt number."""
+        attempt = self._attempts[shard_index]
+        item_count = len(self._shard_items[shard_index])
+        if attempt <= self.max_retries:
+            Logger.warning(
+                f"SHARD_RETRY|{item_count} items of shard {shard_index} failed with {error}", attempt=attempt
+            )
+            self._retry_times[shard_index] = time.perf_counter() + self.retry_delay_seconds * attempt
+            self._attempts[shard_index] = attempt + 1
+        else:
+            Logger.error(f"SHARD_FAILED|{item_count} items of shard {shard_index} failed with {error}")
+            self.result.failed_shards[shard_index] = self._shard_items.pop(shard_index)
+            Logger.perf(f"{self.metric_prefix}_FAILED", shard_index)
@@ -0,0 +1,183 @@
+import functools
+import inspect
+import itertools
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from contextvars import (
+    ContextVar,
+    Token,
+)
+from time import perf_counter_ns
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+)
+
+# The innermost span running in the current context (thread or asyncio task)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("sds_current_span", default=None)
+
+# The elapsed milliseconds of the spans finished in the current context, by span name.
+# It is the "benchmark" of the next API request log entry.
+_benchmark: ContextVar[Optional[Dict[str, float]]] = ContextVar("sds_span_benchmark", default=None)
+
+# Span ids are unique in the process (next() on a count is atomic in CPython)
+_span_ids = itertools.count(1)
+
+
+def get_current_span() -> Optional["Span"]:
+    """Get the innermost span running in the current context."""
+    return _current_span.get()
+
+
+def start_benchmark() -> None:
+    """Start collecting the span timings of a new request in the current context.
+
+    Must be called at the start of a request when its spans run in several asyncio tasks, so
+    the tasks share the same collection.
+    """
+    _benchmark.set({})
+
+
+def pop_benchmark() -> Optional[Dict[str, float]]:
+    """Get the span timings collected in the current context and stop collecting them."""
+    benchmark = _benchmark.get()
+    if benchmark is not None:
+        _benchmark.set(None)
+    return benchmark
+
+
+def _add_to_benchmark(name: str, elapsed_ms: float) -> None:
+    benchmark = _benchmark.get()
+    if benchmark is None:
+        benchmark = {}
+        _benchmark.set(benchmark)
+    benchmark[name] = round(benchmark.get(name, 0) + elapsed_ms, 3)
+
+
+class _BaseSpan(ABC):
+    """Common behavior of the spans: usage as a decorator."""
+
+    __slots__ = ("name", "attributes", "_span_factory")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], span_factory: Callable[..., "_BaseSpan"]):
+        self.name = name
+        self.attributes = attributes
+        self._span_factory = span_factory
+
+    @abstractmethod
+    def __enter__(self) -> "_BaseSpan":
+        """Start the span."""
+
+    @abstractmethod
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Finish the span."""
+
+    def __call__(self, func: Callable) -> Callable:
+        """Time every call of a function (or coroutine function) in a new span."""
+        name = self.name
+        attributes = self.attributes
+        span_factory = self._span_factory
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span_factory(name, **attributes):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span_factory(name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+class DisabledSpan(_BaseSpan):
+    """A span that records nothing, used when the metrics are not enabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "DisabledSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        # Disabled spans can be shared, their attributes are never changed
+        pass
+
+
+@functools.lru_cache(maxsize=1024)
+def get_disabled_span(name: str, span_factory: Callable[..., _BaseSpan]) -> DisabledSpan:
+    """Get a shared disabled span without attributes, so disabled spans cost no allocation."""
+    return DisabledSpan(name, {}, span_factory)
+
+
+class Span(_BaseSpan):
+    """Times a block of code, as a context manager or a decorator.
+
+    Spans started inside another span are its children. The current span is kept in a context
+    variable, so nesting is tracked per thread and per asyncio task. When a span finishes, its
+    elapsed time is added to the benchmark of the current request and `on_finish` is called.
+    """
+
+    __slots__ = ("span_id", "parent", "start_ns", "elapsed_ns", "_on_finish", "_token")
+
+    def __init__(
+        self,
+        name: str,
+        attributes: Dict[str, Any],
+        span_factory: Callable[..., _BaseSpan],
+        on_finish: Callable[["Span"], None],
+    ):
+        super().__init__(name, attributes, span_factory)
+        self._on_finish = on_finish
+        self.span_id: int = 0
+        self.parent: Optional[Span] = None
+        self.start_ns: int = 0
+        self.elapsed_ns: int = 0
+        self._token: Optional[Token[Optional[Span]]] = None
+
+    @property
+    def elapsed_ms(self) -> float:
+        return self.elapsed_ns / 1_000_000
+
+    @property
+    def path(self) -> str:
+        """The names of the span and its ancestors, like "REQUEST/FETCH/PARSE"."""
+        names = []
+        span: Optional[Span] = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return "/".join(reversed(names))
+
+    def __enter__(self) -> "Span":
+        self.span_id = next(_span_ids)
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start_ns = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.elapsed_ns = perf_counter_ns() - self.start_ns
+        token, self._token = self._token, None
+        if token is not None:
+            _current_span.reset(token)
+
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+
+        _add_to_benchmark(self.name, self.elapsed_ms)
+        self._on_finish(self)
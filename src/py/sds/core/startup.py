@@ -0,0 +1,195 @@
+import builtins
+import contextlib
+import importlib.util
+import os
+import sys
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+if TYPE_CHECKING:
+    import cProfile
+
+# Set to 1 (or true) to profile the startup of the process
+PROFILE_ENVVAR = "SDS_STARTUP_PROFILE"
+
+# Set to a file path to also dump a cProfile of the startup, to analyze with pstats or snakeviz
+PSTATS_PATH_ENVVAR = "SDS_STARTUP_PROFILE_PSTATS"
+
+# The number of slowest imports recorded in the summary
+SLOWEST_IMPORT_COUNT = 25
+
+# Errors of an invalid relative import name, which the real import reports
+_RESOLVE_NAME_ERRORS = (ImportError, ValueError)
+
+# Errors when not on Linux (no /proc), or with an unexpected format of the /proc files
+_PROC_READ_ERRORS = (OSError, IndexError, ValueError)
+
+
+class _ImportTimer:
+    """Times the imports of modules not imported yet, by wrapping builtins.__import__."""
+
+    def __init__(self):
+        # Module name: [inclusive ms, self ms] (self excludes the time of the nested imports)
+        self.import_times: Dict[str, List[float]] = {}
+        self._original_import = builtins.__import__
+        # The time of the nested imports of each import running, to compute their self time
+        self._nested_times: List[float] = []
+
+    def install(self) -> None:
+        builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        if builtins.__import__ is self._import:
+            builtins.__import__ = self._original_import
+
+    def _import(self, name: str, globals=None, locals=None, fromlist=(), level: int = 0) -> Any:
+        module_name = name
+        if level > 0:
+            package = (globals or {}).get("__package__") or ""
+            try:
+                module_name = importlib.util.resolve_name("." * level + name, package)
+            except _RESOLVE_NAME_ERRORS:
+                pass
+
+        # Already imported modules cost nothing worth reporting
+        if module_name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._nested_times.append(0.0)
+        start_time = perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed_ms = (perf_counter() - start_time) * 1000
+            nested_ms = self._nested_times.pop()
+            if self._nested_times:
+                self._nested_times[-1] += elapsed_ms
+            self.import_times[module_name] = [elapsed_ms, elapsed_ms - nested_ms]
+
+
+class StartupProfiler:
+    """Records where the startup time of a process goes.
+
+    - The import time of every module imported during the startup (total and self time).
+    - The time of the startup phases, like Config.initialize(), Logger.initialize() or the first
+      call to main().
+    - Optionally, a cProfile of the whole startup, dumped to a pstats file.
+
+    The result is recorded as a single STARTUP_TIME perf entry by finish().
+    """
+
+    def __init__(self, pstats_path: Optional[str] = None):
+        self.start_time = perf_counter()
+        self.phase_times: Dict[str, float] = {}
+        self.pstats_path = pstats_path
+        self._import_timer = _ImportTimer()
+        self._profile: Optional["cProfile.Profile"] = None
+
+    def start(self) -> None:
+        self._import_timer.install()
+        if self.pstats_path:
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = round((perf_counter() - start_time) * 1000, 3)
+
+    def finish(self) -> Dict[str, Any]:
+        """Stop profiling and record the summary. Returns the summary."""
+        total_ms = round((perf_counter() - self.start_time) * 1000, 3)
+        self._import_timer.uninstall()
+
+        if self._profile is not None and self.pstats_path:
+            self._profile.disable()
+            self._profile.dump_stats(self.pstats_path)
+
+        import_times = self._import_timer.import_times
+        slowest_imports = sorted(import_times.items(), key=lambda item: item[1][1], reverse=True)
+        summary: Dict[str, Any] = {
+            "phases": self.phase_times,
+            "import_count": len(import_times),
+            # The self times add up to the total import time, without counting nested imports twice
+            "import_ms": round(sum(self_ms for _, self_ms in import_times.values()), 3),
+            "slowest_imports": [
+                {"module": module_name, "self_ms": round(self_ms, 3), "total_ms": round(total_ms, 3)}
+                for module_name, (total_ms, self_ms) in slowest_imports[:SLOWEST_IMPORT_COUNT]
+            ],
+            # Includes the interpreter startup, before the profiling started
+            "process_age_ms": _get_process_age_ms(),
+        }
+        if self.pstats_path:
+            summary["pstats_path"] = self.pstats_path
+
+        from sds.utils.core.logging import Logger
+
+        # Recorded raw, since a startup profile is a one-off entry that can't be aggregated
+        Logger.perf("STARTUP_TIME", total_ms, "ms", raw=True, **summary)
+        return summary
+
+
+def _get_process_age_ms() -> Optional[float]:
+    """Get the time since the process started, when it's available (Linux only)."""
+    try:
+        with open("/proc/self/stat", "r") as file:
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as file:
+            uptime_seconds = float(file.read().split()[0])
+    except _PROC_READ_ERRORS:
+        return None
+    process_age_ms = (uptime_seconds - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000
+    return round(process_age_ms, 3)
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def is_profiling() -> bool:
+    return _profiler is not None
+
+
+def start_profiling() -> None:
+    """Start profiling the startup, if the SDS_STARTUP_PROFILE environment variable is set.
+
+    Must be called as early as possible, before the imports to profile.
+    """
+    global _profiler
+    if _profiler is not None or os.environ.get(PROFILE_ENVVAR, "").lower() not in ("1", "true"):
+        return
+
+    _profiler = StartupProfiler(pstats_path=os.environ.get(PSTATS_PATH_ENVVAR) or None)
+    _profiler.start()
+
+
+def profile_phase(name: str) -> contextlib.AbstractContextManager:
+    """Time a startup phase. Costs nothing when not profiling.
+
+    Example:
+        with profile_phase("CONFIG_INITIALIZE"):
+            Config.initialize(this_package)
+    """
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.phase(name)
+
+
+def finish_profiling() -> Optional[Dict[str, Any]]:
+    """Stop profiling the startup and record the STARTUP_TIME perf entry, if profiling."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return None
+    return profiler.finish()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+from typing import (
+    Any,
+    Dict,
+    List,
+    Sequence,
+)
+
+import pytest
+
+from sds.utils.core.asgi import (
+    CLOUD_TRACE_HEADER,
+    Message,
+    Receive,
+    RequestLoggingMiddleware,
+    Scope,
+    Send,
+    ServiceApp,
+)
+from sds.utils.core.config import Config
+from sds.utils.core.context import get_request_context
+from sds.utils.core.logging import Logger
+
+APP_PACKAGE_NAME = "sds_test"
+
+
+@pytest.fixture
+def logger():
+    Config._set_instance({"logging": {"format": "%(message)s"}})
+    Logger.initialize(APP_PACKAGE_NAME)
+    Logger.set_level(logging.INFO)
+    yield Logger
+    Logger.shutdown()
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    """An application answering 201, or failing on the /fail path."""
+    if scope["path"] == "/fail":
+        raise ValueError("failed")
+    await send({"type": "http.response.start", "status": 201, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def request(asgi_app: Any, path: str, headers: Sequence[Any] = ()) -> List[Message]:
+    """Send a GET request to an ASGI application and get the messages it sent."""
+    sent: List[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    await asgi_app({"type": "http", "method": "GET", "path": path, "headers": headers}, receive, send)
+    return sent
+
+
+def api_request_entries(caplog: pytest.LogCaptureFixture) -> List[str]:
+    assert Logger.flush(timeout=5)
+    return [
+        record.getMessage()
+        for record in caplog.records
+        if record.name == APP_PACKAGE_NAME and record.getMessage().startswith("API_REQUEST|")
+    ]
+
+
+def test_requests_are_logged_with_their_tracking_id(logger, caplog):
+    headers = [(CLOUD_TRACE_HEADER, b"105445aa7843bc8bf206b12000100000/1;o=1")]
+
+    sent = asyncio.run(request(RequestLoggingMiddleware(app), "/orders", headers))
+    with pytest.raises(ValueError):
+        asyncio.run(request(RequestLoggingMiddleware(app), "/fail"))
+
+    assert sent[0]["status"] == 201
+    created, failed = api_request_entries(caplog)
+    assert "'status_code': 201" in created and "'tracking_id': '105445aa7843bc8bf206b12000100000/1;o=1'" in created
+    assert "'status_code': 500" in failed
+
+
+def test_request_context_is_reset_when_logging_fails(logger, monkeypatch):
+    def fail(*args, **kwargs) -> None:
+        raise RuntimeError("logging failed")
+
+    monkeypatch.setattr(Logger, "api_request", fail)
+
+    async def handle_requests() -> None:
+        with pytest.raises(RuntimeError):
+            await request(RequestLoggingMiddleware(app), "/orders")
+        assert get_request_context() is None
+
+    asyncio.run(handle_requests())
+
+
+def test_health_check_follows_the_lifespan(logger):
+    service_app = ServiceApp(app)
+    lifespan_messages = asyncio.Queue[Message]()
+    sent: List[Dict[str, Any]] = []
+
+    async def receive() -> Message:
+        return await lifespan_messages.get()
+
+    async def send(message: Message) -> None:
+        sent.append(dict(message))
+
+    async def run() -> List[int]:
+        statuses = [(await request(service_app, "/health"))[0]["status"]]
+        lifespan = asyncio.create_task(service_app({"type": "lifespan"}, receive, send))
+        await lifespan_messages.put({"type": "lifespan.startup"})
+        while not service_app.started:
+            await asyncio.sleep(0)
+        statuses.append((await request(service_app, "/health"))[0]["status"])
+        await lifespan_messages.put({"type": "lifespan.shutdown"})
+        await lifespan
+        statuses.append((await request(service_app, "/health"))[0]["status"])
+        return statuses
+
+    assert asyncio.run(run()) == [503, 200, 503]
+    assert [message["type"] for message in sent] == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert json.loads((asyncio.run(request(service_app, "/health"))[1]["body"])) == {"status": "unavailable"}
@@ -0,0 +1,132 @@
+import logging
+from typing import (
+    Dict,
+    List,
+)
+
+import pytest
+
+from sds.utils.core.checkpoint import (
+    EXECUTION_ENVVAR,
+    Checkpoint,
+    GcsCheckpointBackend,
+    LocalFileCheckpointBackend,
+    get_default_backend,
+)
+from sds.utils.core.config import Config
+from sds.utils.core.logging import Logger
+
+
+class FakeBlob:
+    def __init__(self, objects: Dict[str, str], name: str):
+        self.objects = objects
+        self.name = name
+
+    def download_as_text(self) -> str:
+        return self.objects[self.name]
+
+    def upload_from_string(self, data: str) -> None:
+        self.objects[self.name] = data
+
+    def delete(self) -> None:
+        del self.objects[self.name]
+
+
+class FakeBucket:
+    """The part of the google.cloud.storage bucket API used by the backend, storing the objects in a dict."""
+
+    def __init__(self):
+        self.objects: Dict[str, str] = {}
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self.objects, name)
+
+    def list_blobs(self, prefix: str) -> List[FakeBlob]:
+        return [FakeBlob(self.objects, name) for name in sorted(self.objects) if name.startswith(prefix)]
+
+
+class FakeClient:
+    def __init__(self):
+        self.buckets: Dict[str, FakeBucket] = {}
+
+    def bucket(self, bucket_name: str) -> FakeBucket:
+        return self.buckets.setdefault(bucket_name, FakeBucket())
+
+
+@pytest.fixture
+def logger():
+    Config._set_instance({"logging": {"format": "%(message)s"}})
+    Logger.initialize("sds_test")
+    Logger.set_level(logging.DEBUG)
+    yield Logger
+    Logger.shutdown()
+
+
+def test_gcs_backend_resumes_the_completed_items(logger):
+    client = FakeClient()
+    backend = GcsCheckpointBackend("jobs", client=client)
+
+    with Checkpoint("execution/1", backend, interval_items=2) as checkpoint:
+        checkpoint.mark_all_done(["a", "b"])
+        checkpoint.mark_done("c")
+
+    assert len(client.buckets["jobs"].objects) == 2
+    assert all(name.startswith("checkpoints/execution_1/") for name in client.buckets["jobs"].objects)
+    checkpoint = Checkpoint("execution/1", GcsCheckpointBackend("jobs", client=client))
+    assert list(checkpoint.pending(["a", "c", "d"])) == ["d"]
+    # The objects were compacted by the load
+    assert list(client.buckets["jobs"].objects.values()) == ["a\nb\nc\n"]
+
+    checkpoint.clear()
+    assert client.buckets["jobs"].objects == {}
+
+
+class FlakyBackend(LocalFileCheckpointBackend):
+    """A backend whose first save fails."""
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.save_count = 0
+
+    def save(self, checkpoint_id: str, keys: List[str]) -> None:
+        self.save_count += 1
+        if self.save_count == 1:
+            raise ConnectionError("unavailable")
+        super().save(checkpoint_id, keys)
+
+
+def test_keys_that_failed_to_save_are_saved_with_the_next_batch(logger, tmp_path, caplog):
+    backend = FlakyBackend(str(tmp_path))
+
+    with Checkpoint("job", backend, interval_items=2) as checkpoint:
+        checkpoint.mark_all_done(["a", "b"])
+        checkpoint.mark_all_done(["c", "d"])
+
+    assert backend.save_count == 2
+    assert backend.load("job") == {"a", "b", "c", "d"}
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert [warning.split("|")[2:4] for warning in warnings] == [["CHECKPOINT_SAVE_ERROR", "unavailable"]]
+
+
+def test_local_backend_ignores_a_line_cut_by_a_crash(tmp_path):
+    backend = LocalFileCheckpointBackend(str(tmp_path))
+    backend.save("job", ["a", "b"])
+    with open(tmp_path / "job.checkpoint", "a") as file:
+        file.write("c")
+
+    assert backend.load("job") == {"a", "b"}
+
+
+def test_default_backend(monkeypatch, tmp_path):
+    monkeypatch.delenv(EXECUTION_ENVVAR, raising=False)
+    Config._set_instance({})
+    assert isinstance(get_default_backend(), LocalFileCheckpointBackend)
+
+    # The local disk of a Cloud Run job is lost on restart
+    monkeypatch.setenv(EXECUTION_ENVVAR, "job-abc12")
+    with pytest.raises(RuntimeError, match="CHECKPOINT_LOCATION_MISSING"):
+        get_default_backend()
+
+    Config._set_instance({"checkpoint": {"directory": str(tmp_path)}})
+    backend = get_default_backend()
+    assert isinstance(backend, LocalFileCheckpointBackend) and backend.directory == str(tmp_path)
@@ -0,0 +1,305 @@
+import sys
+import time
+import timeit
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+)
+
+import pytest
+import yaml
+
+from sds.utils.core.config import (
+    CONFIG_ENV_ENVVAR,
+    CONFIG_ENVVAR,
+    CONFIG_FILENAME,
+    CONFIG_PATH_ENVVAR,
+    SNAPSHOT_FILENAME,
+    Config,
+)
+
+
+def nested_config(depth: int) -> Dict[str, Any]:
+    """A config with a value at the key path "level1.level2...level<depth>"."""
+    config_dict: Dict[str, Any] = {f"level{depth}": "value", "other": 1}
+    for level in range(depth - 1, 0, -1):
+        config_dict = {f"level{level}": config_dict, "other": 1}
+    return config_dict
+
+
+def nested_key_path(depth: int) -> str:
+    return ".".join(f"level{level}" for level in range(1, depth + 1))
+
+
+def walk_key_path(config_dict: Dict[str, Any], key_path: str, default_value: Any = None) -> Any:
+    """The previous Config.get(), which split the key path and walked the config on every call."""
+    current_level: Any = config_dict
+    for key_part in key_path.split("."):
+        if isinstance(current_level, dict) and key_part in current_level:
+            current_level = current_level[key_part]
+        else:
+            return default_value
+    return current_level
+
+
+@pytest.mark.parametrize("flatten", [False, True])
+def test_get(flatten):
+    Config._set_instance({"service": {"name": "orders", "ports": [80, 443]}, "empty": None}, flatten)
+
+    assert Config.get("service.name") == "orders"
+    assert Config.get("service.ports") == (80, 443)
+    assert Config.get("service")["name"] == "orders"
+    assert Config.get("empty", "default") is None
+    assert Config.get("service.missing", "default") == "default"
+    assert Config.get("service.name.missing", "default") == "default"
+    # Missing key paths are cached too, the default value is not
+    assert Config.get("service.missing") is None
+
+
+def test_values_are_read_only():
+    Config._set_instance({"service": {"name": "orders"}})
+
+    with pytest.raises(TypeError):
+        Config.get("service")["name"] = "payments"
+
+
+def test_reload_invalidates_the_cached_values():
+    Config._set_instance({"service": {"name": "orders"}})
+    service_name = Config.key("service.name", "unknown")
+    assert (Config.get("service.name"), service_name()) == ("orders", "orders")
+
+    Config._set_instance({"service": {"name": "payments"}})
+    assert (Config.get("service.name"), service_name()) == ("payments", "payments")
+
+    Config._set_instance({})
+    assert (Config.get("service.name"), service_name()) == (None, "unknown")
+
+
+def test_values_resolved_during_a_reload_are_not_cached_in_the_new_config(monkeypatch):
+    Config._set_instance({"service": {"name": "orders"}})
+    resolve = Config._resolve.__func__  # type: ignore[attr-defined]
+
+    def resolve_then_reload(cls, key_path: str) -> Any:
+        value = resolve(cls, key_path)
+        monkeypatch.undo()
+        Config._set_instance({"service": {"name": "payments"}})
+        return value
+
+    monkeypatch.setattr(Config, "_resolve", classmethod(resolve_then_reload))
+
+    assert Config.get("service.name") == "orders"
+    assert Config.get("service.name") == "payments"
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("depth", [1, 4, 8])
+def test_benchmark_get(depth):
+    """Compares the cost of the cached, precompiled and flattened lookups with a walk of the config."""
+    config_dict = nested_config(depth)
+    key_path = nested_key_path(depth)
+    number = 100_000
+
+    Config._set_instance(config_dict)
+    config_key = Config.key(key_path)
+    walk_seconds = min(timeit.repeat(lambda: walk_key_path(config_dict, key_path), number=number, repeat=3))
+    get_seconds = min(timeit.repeat(lambda: Config.get(key_path), number=number, repeat=3))
+    key_seconds = min(timeit.repeat(config_key, number=number, repeat=3))
+    Config._set_instance(config_dict, flatten=True)
+    flattened_seconds = min(timeit.repeat(lambda: Config.get(key_path), number=number, repeat=3))
+
+    print(
+        f"depth {depth}: get {get_seconds / number * 1e9:.0f} ns, key {key_seconds / number * 1e9:.0f} ns, "
+        f"flattened get {flattened_seconds / number * 1e9:.0f} ns (walk: {walk_seconds / number * 1e9:.0f} ns)"
+    )
+    assert Config.get(key_path) == config_key() == walk_key_path(config_dict, key_path) == "value"
+    if depth > 1:
+        assert get_seconds < walk_seconds
+    assert key_seconds < walk_seconds
+
+
+@pytest.fixture
+def service_package(tmp_path, monkeypatch):
+    """An importable package with a config.yaml file, as large as the config of a big service."""
+    package_path = tmp_path / "sds_test_service"
+    package_path.mkdir()
+    (package_path / "__init__.py").write_text("")
+    config_dict = {
+        f"section{section}": {
+            f"key{key}": {"enabled": True, "timeout": 1.5, "name": f"value {key}", "tags": ["a", "b"]}
+            for key in range(50)
+        }
+        for section in range(10)
+    }
+    (package_path / CONFIG_FILENAME).write_text(yaml.safe_dump(config_dict))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for envvar_name in [CONFIG_ENV_ENVVAR, CONFIG_PATH_ENVVAR, CONFIG_ENVVAR]:
+        monkeypatch.delenv(envvar_name, raising=False)
+    yield package_path, config_dict
+    # The next test imports its own package
+    sys.modules.pop(package_path.name, None)
+
+
+def test_snapshot_is_loaded_only_for_the_same_content(service_package):
+    package_path, config_dict = service_package
+    assert Config.compile_snapshot(package_path.name)
+
+    Config.initialize(package_path.name)
+    assert Config.get("section1.key2.name") == "value 2"
+
+    # The snapshot of another content is ignored
+    config_dict["section1"]["key2"]["name"] = "changed"
+    (package_path / CONFIG_FILENAME).write_text(yaml.safe_dump(config_dict))
+    Config.initialize(package_path.name)
+    assert Config.get("section1.key2.name") == "changed"
+
+    # A corrupted snapshot is ignored
+    (package_path / SNAPSHOT_FILENAME).write_bytes(b"corrupted")
+    Config.initialize(package_path.name)
+    assert Config.get("section1.key2.name") == "changed"
+
+
+@pytest.mark.benchmark
+def test_benchmark_startup(service_package):
+    """Compares the config loading time of a cold start with the pure Python loader, libyaml and the snapshot."""
+    package_path, _ = service_package
+    config_content = (package_path / CONFIG_FILENAME).read_text()
+    number = 3
+
+    python_seconds = min(
+        timeit.repeat(lambda: yaml.load(config_content, Loader=yaml.SafeLoader), number=number, repeat=3)
+    )
+    yaml_seconds = min(timeit.repeat(lambda: Config.initialize(package_path.name), number=number, repeat=3))
+    assert Config.compile_snapshot(package_path.name)
+    snapshot_seconds = min(timeit.repeat(lambda: Config.initialize(package_path.name), number=number, repeat=3))
+
+    print(
+        f"Config.initialize(): {yaml_seconds / number * 1e3:.2f} ms parsing the YAML "
+        f"({'libyaml' if hasattr(yaml, 'CSafeLoader') else 'pure Python loader'}), "
+        f"{snapshot_seconds / number * 1e3:.2f} ms with the snapshot "
+        f"(pure Python loader parsing alone: {python_seconds / number * 1e3:.2f} ms)"
+    )
+    assert snapshot_seconds < yaml_seconds
+    assert snapshot_seconds < python_seconds
+
+
+def test_sources_are_merged_by_precedence(service_package, monkeypatch, tmp_path):
+    package_path, _ = service_package
+    (package_path / CONFIG_FILENAME).write_text("service: {name: orders, port: 80, workers: 1}\nlogging: {level: INFO}")
+    (package_path / "config.prod.yaml").write_text("service: {port: 443}")
+    secret_path = tmp_path / "secret.yaml"
+    secret_path.write_text("service: {workers: 4}\ndb: {password: secret}")
+    monkeypatch.setenv(CONFIG_ENV_ENVVAR, "prod")
+    monkeypatch.setenv(CONFIG_PATH_ENVVAR, str(secret_path))
+    monkeypatch.setenv(CONFIG_ENVVAR, "db: {host: db.internal}")
+    monkeypatch.setenv("SDS__logging__level", "DEBUG")
+    monkeypatch.setenv("SDS__service__workers", "8")
+
+    Config.initialize(package_path.name)
+
+    assert Config.get("service") == {"name": "orders", "port": 443, "workers": 8}
+    assert Config.get("db") == {"password": "secret", "host": "db.internal"}
+    assert Config.get("logging.level") == "DEBUG"
+    assert Config.get_source("service.name") == CONFIG_FILENAME
+    assert Config.get_source("service.port") == "config.prod.yaml"
+    assert Config.get_source("db.password") == str(secret_path)
+    assert Config.get_source("db.host") == CONFIG_ENVVAR
+    assert Config.get_source("service.workers") == "SDS__service__workers"
+
+
+def test_missing_config(service_package, monkeypatch):
+    package_path, _ = service_package
+    (package_path / CONFIG_FILENAME).unlink()
+
+    with pytest.raises(RuntimeError, match="CONFIG_NOT_FOUND"):
+        Config.initialize(package_path.name)
+
+
+@pytest.fixture
+def change_callbacks(monkeypatch):
+    """The config change callbacks registered by the test."""
+    callbacks: List[Callable[[Mapping[str, Any], Mapping[str, Any]], None]] = []
+    monkeypatch.setattr(Config, "_change_callbacks", callbacks)
+    yield callbacks
+    Config.stop_watching()
+
+
+def test_reload_replaces_the_config_and_calls_the_change_callbacks(service_package, change_callbacks):
+    package_path, _ = service_package
+    (package_path / CONFIG_FILENAME).write_text("service: {name: orders, port: 80}")
+    Config.initialize(package_path.name, watch=False)
+    service_port = Config.key("service.port")
+    changes = []
+    Config.on_change(lambda old_config, new_config: changes.append((old_config["service"], new_config["service"])))
+
+    (package_path / CONFIG_FILENAME).write_text("service: {name: orders, port: 443}")
+
+    assert Config.reload()
+    assert (Config.get("service.port"), service_port()) == (443, 443)
+    assert changes == [({"name": "orders", "port": 80}, {"name": "orders", "port": 443})]
+    # Nothing changed since
+    assert not Config.reload()
+    assert len(changes) == 1
+
+
+def test_reload_keeps_the_config_when_the_new_content_is_invalid(service_package, change_callbacks):
+    package_path, _ = service_package
+    (package_path / CONFIG_FILENAME).write_text("service: {name: orders}")
+    Config.initialize(package_path.name, watch=False)
+    changes = []
+    Config.on_change(lambda old_config, new_config: changes.append(new_config))
+
+    (package_path / CONFIG_FILENAME).write_text("service: {name: [orders")
+
+    with pytest.raises(RuntimeError, match="CONFIG_PARSE_ERROR"):
+        Config.reload()
+    assert Config.get("service.name") == "orders"
+    assert changes == []
+
+
+def test_change_callbacks_rejecting_a_value_do_not_stop_the_others(service_package, change_callbacks, caplog):
+    package_path, _ = service_package
+    (package_path / CONFIG_FILENAME).write_text("service: {workers: 1}")
+    Config.initialize(package_path.name, watch=False)
+    changes = []
+
+    def apply_workers(old_config: Mapping[str, Any], new_config: Mapping[str, Any]) -> None:
+        int(new_config["service"]["workers"])
+
+    Config.on_change(apply_workers)
+    Config.on_change(lambda old_config, new_config: changes.append(new_config["service"]["workers"]))
+
+    (package_path / CONFIG_FILENAME).write_text("service: {workers: many}")
+
+    assert Config.reload()
+    assert changes == ["many"]
+    assert [record.getMessage() for record in caplog.records] == ["CONFIG_CHANGE_CALLBACK_ERROR"]
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_watch_reloads_the_config_when_its_file_changes(service_package, change_callbacks, caplog):
+    package_path, _ = service_package
+    (package_path / CONFIG_FILENAME).write_text("service: {name: orders}")
+    Config.initialize(package_path.name, watch=False)
+    Config.watch(interval_seconds=0.01)
+
+    # Replaced like a Secret mounted as a volume
+    new_config_path = package_path / "config.new.yaml"
+    new_config_path.write_text("service: {name: payments}")
+    new_config_path.replace(package_path / CONFIG_FILENAME)
+    assert wait_until(lambda: Config.get("service.name") == "payments")
+
+    # An invalid file is reported, and the current config is kept
+    (package_path / CONFIG_FILENAME).write_text("service: {name: [billing")
+    assert wait_until(lambda: any("CONFIG_RELOAD_ERROR" in record.getMessage() for record in caplog.records))
+    assert Config.get("service.name") == "payments"
@@ -0,0 +1,135 @@
+import dataclasses
+import enum
+from typing import (
+    Any,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import pytest
+
+from sds.utils.core.config_schema import (
+    ConfigValidationError,
+    load_schema,
+)
+
+
+class Mode(enum.Enum):
+    FAST = "fast"
+    SAFE = "safe"
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class HttpSettings:
+    port: int = 8080
+    host: str = "0.0.0.0"
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Settings:
+    name: str
+    http: HttpSettings
+    debug: bool = False
+    ratio: float = 1.0
+    mode: Mode = Mode.SAFE
+    level: Literal["INFO", "DEBUG"] = "INFO"
+    timeout: Optional[int] = None
+    limit: Union[int, str] = 0
+    tags: List[str] = dataclasses.field(default_factory=list)
+    pair: Tuple[str, int] = ("a", 1)
+    ports: Sequence[int] = ()
+    labels: Dict[str, int] = dataclasses.field(default_factory=dict)
+    extra: Mapping[str, Any] = dataclasses.field(default_factory=dict)
+    is_async: bool = dataclasses.field(default=False, metadata={"key": "async"})
+
+
+def test_values_are_converted_to_the_annotated_types():
+    settings = load_schema(
+        Settings,
+        {
+            "name": 1.0,
+            "http": {"port": "8000"},
+            "debug": "yes",
+            "ratio": 2,
+            "mode": "FAST",
+            "level": "DEBUG",
+            "timeout": 30.0,
+            "limit": "unlimited",
+            "tags": ["a", 1],
+            "pair": ["b", "2"],
+            "ports": [80, "443"],
+            "labels": {"a": "1"},
+            "extra": {"any": [1]},
+            "async": "on",
+            "unknown": "ignored",
+        },
+    )
+
+    assert settings == Settings(
+        name="1.0",
+        http=HttpSettings(port=8000),
+        debug=True,
+        ratio=2.0,
+        mode=Mode.FAST,
+        level="DEBUG",
+        timeout=30,
+        limit="unlimited",
+        tags=["a", "1"],
+        pair=("b", 2),
+        ports=(80, 443),
+        labels={"a": 1},
+        extra={"any": [1]},
+        is_async=True,
+    )
+    assert isinstance(settings.extra, Mapping) and not isinstance(settings.extra, dict)
+
+
+def test_defaults():
+    settings = load_schema(Settings, {"name": "orders", "http": {}, "timeout": None})
+
+    assert settings == Settings(name="orders", http=HttpSettings())
+
+
+def test_every_invalid_key_path_is_reported():
+    with pytest.raises(ConfigValidationError) as error_info:
+        load_schema(
+            Settings,
+            {
+                "http": {"port": True},
+                "debug": "maybe",
+                "ratio": "fast",
+                "mode": "slow",
+                "level": "TRACE",
+                "limit": [1],
+                "pair": ["a"],
+                "ports": [80, "x"],
+                "labels": [],
+            },
+        )
+
+    errors = dict(error_info.value.errors)
+    # The name of a Union type depends on the Python version
+    assert errors.pop("limit").endswith(", got [1]")
+    assert errors == {
+        "name": "missing",
+        "http.port": "expected int, got True",
+        "debug": "expected bool, got 'maybe'",
+        "ratio": "expected float, got 'fast'",
+        "mode": "expected one of FAST, SAFE, got 'slow'",
+        "level": "expected one of 'INFO', 'DEBUG', got 'TRACE'",
+        "pair": "expected 2 items, got 1",
+        "ports[1]": "expected int, got 'x'",
+        "labels": "expected a mapping, got []",
+    }
+    assert str(error_info.value).startswith("FATAL|CONFIG_INVALID|10 invalid config key(s): ")
+
+
+def test_the_root_must_be_a_mapping():
+    with pytest.raises(ConfigValidationError, match="<root>: expected a mapping"):
+        load_schema(Settings, [])  # type: ignore[arg-type]
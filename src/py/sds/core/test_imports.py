@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+# Modules that are slow to import, and that importing the package must not pull in
+HEAVY_MODULES = ["google.cloud.logging", "grpc", "yaml", "multiprocessing"]
+
+
+def get_imported_modules(code: str) -> List[str]:
+    """Run code in a fresh interpreter and get the names of the modules it imported."""
+    completed_process = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return completed_process.stdout.splitlines()
+
+
+def test_importing_the_package_imports_no_module():
+    imported_modules = get_imported_modules("import sds.utils.core")
+
+    assert [name for name in imported_modules if name.startswith("sds.utils.core.")] == []
+    assert not set(HEAVY_MODULES) & set(imported_modules)
+
+
+def test_public_names_are_imported_on_first_access():
+    imported_modules = get_imported_modules("from sds.utils.core import Logger")
+
+    assert "sds.utils.core.logging" in imported_modules
+    assert "google.cloud.logging" not in imported_modules
+
+
+@pytest.mark.parametrize("module_name", ["logging", "sharding", "checkpoint", "startup"])
+def test_modules_import_no_heavy_dependency(module_name):
+    imported_modules = get_imported_modules(f"import sds.utils.core.{module_name}")
+
+    assert not {"google.cloud.logging", "grpc", "multiprocessing"} & set(imported_modules)
+
+
+def test_local_logging_imports_no_gcp_dependency():
+    imported_modules = get_imported_modules(
+        "from sds.utils.core import Config, Logger\n"
+        "Config._set_instance({'logging': {'env': 'local', 'format': '%(message)s'}})\n"
+        "Logger.initialize('sds_test')\n"
+        "Logger.shutdown()"
+    )
+
+    assert "google.cloud.logging" not in imported_modules
@@ -0,0 +1,171 @@
+import dataclasses
+import datetime
+import enum
+import json
+import timeit
+import tracemalloc
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+)
+
+import pytest
+
+from sds.utils.core.log_encoder import (
+    DEPTH_EXCEEDED_MARKER,
+    LogEncoder,
+    orjson,
+)
+
+BACKENDS = [False, pytest.param(True, marks=pytest.mark.skipif(orjson is None, reason="orjson is not installed"))]
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+class Status(enum.IntEnum):
+    OK = 200
+
+
+class Name(str):
+    pass
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: float
+
+
+def api_request_entry() -> dict:
+    """A log entry like the ones recorded by Logger.api_request()."""
+    return {
+        "type": "API_REQUEST",
+        "message": "/v1/orders",
+        "app": "orders",
+        "at": "orders.api.OrdersApi.create",
+        "extra": {
+            "by": "orders-service",
+            "method": "POST",
+            "route": "/v1/orders",
+            "payload": {
+                "customer_id": 1234,
+                "items": [{"sku": f"SKU-{i}", "quantity": i, "price": 9.99 * i} for i in range(20)],
+                "notes": b"leave at the door",
+                "tags": ("priority", "gift"),
+            },
+            "benchmark": {"DB_FETCH_TIME": 12.5, "RENDER_TIME": 3.25},
+            "response": {"payload": {"order_id": "a1b2c3", "accepted": True}, "status_code": 201},
+            "tracking_id": "105445aa7843bc8bf206b12000100000/1;o=1",
+            "latency_ms": 18.75,
+        },
+    }
+
+
+def convert_bytes(obj: Any) -> Any:
+    """The previous payload conversion, which rebuilt the payload and stringified every leaf."""
+    if isinstance(obj, dict):
+        return {k: convert_bytes(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_bytes(i) for i in obj]
+    elif isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    else:
+        return str(obj)
+
+
+@pytest.mark.parametrize("use_orjson", BACKENDS)
+@pytest.mark.parametrize("with_limits", [False, True])
+def test_encode_types(use_orjson, with_limits):
+    encoder = LogEncoder(use_orjson=use_orjson)
+    encode = encoder.encode_with_limits if with_limits else encoder.encode
+    entry = {
+        "str": "text",
+        "int": 1,
+        "float": 1.5,
+        "bool": True,
+        "none": None,
+        "bytes": b"caf\xc3\xa9",
+        "tuple": (1, 2),
+        "set": {3},
+        "mapping": MappingProxyType({"a": 1}),
+        "enum": Color.RED,
+        "int_enum": Status.OK,
+        "str_subclass": Name("name"),
+        "date": datetime.date(2024, 1, 31),
+        "datetime": datetime.datetime(2024, 1, 31, 12, 30),
+        "dataclass": Point(1, 2.5),
+        "object": object,
+    }
+
+    assert json.loads(encode(entry)) == {
+        "str": "text",
+        "int": 1,
+        "float": 1.5,
+        "bool": True,
+        "none": None,
+        "bytes": "café",
+        "tuple": [1, 2],
+        "set": [3],
+        "mapping": {"a": 1},
+        "enum": "red",
+        "int_enum": 200,
+        "str_subclass": "name",
+        "date": "2024-01-31",
+        "datetime": "2024-01-31T12:30:00",
+        "dataclass": {"x": 1, "y": 2.5},
+        "object": "<class 'object'>",
+    }
+
+
+def test_limits():
+    encoder = LogEncoder(max_depth=2, max_string_length=4)
+
+    entry = {"nested": {"list": [1]}, "text": "abcdefgh", "bytes": b"abcdef", "nan": float("nan")}
+
+    assert json.loads(encoder.encode_with_limits(entry)) == {
+        "nested": {"list": DEPTH_EXCEEDED_MARKER},
+        "text": "abcd...<truncated 4 chars>",
+        "bytes": "abcd...<truncated 2 bytes>",
+        "nan": "nan",
+    }
+
+
+@pytest.mark.parametrize("use_orjson", BACKENDS)
+def test_entries_rejected_or_too_long_are_encoded_with_limits(use_orjson):
+    encoder = LogEncoder(max_string_length=8, max_entry_length=64, use_orjson=use_orjson)
+
+    assert json.loads(encoder.encode({"value": float("inf"), (1, 2): "key"})) == {"value": "inf", "(1, 2)": "key"}
+    assert json.loads(encoder.encode({"text": "x" * 100})) == {"text": "xxxxxxxx...<truncated 92 chars>"}
+
+
+def measure(function: Callable[[], Any], number: int) -> tuple[float, int]:
+    """Get the seconds per call and the peak memory allocated by a call."""
+    seconds = min(timeit.repeat(function, number=number, repeat=3)) / number
+
+    tracemalloc.start()
+    function()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak_bytes
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("use_orjson", BACKENDS)
+def test_benchmark_api_request_entry(use_orjson):
+    """Compares the encoder with the previous convert_bytes + json.dumps serialization."""
+    encoder = LogEncoder(use_orjson=use_orjson)
+    entry = api_request_entry()
+    number = 2000
+
+    encoder_seconds, encoder_bytes = measure(lambda: encoder.encode(entry), number)
+    previous_seconds, previous_bytes = measure(lambda: json.dumps(convert_bytes(entry)), number)
+
+    print(
+        f"encoder: {1 / encoder_seconds:.0f} entries/s, {encoder_bytes} bytes peak "
+        f"(convert_bytes + json.dumps: {1 / previous_seconds:.0f} entries/s, {previous_bytes} bytes peak)"
+    )
+    assert encoder_seconds < previous_seconds
+    assert encoder_bytes < previous_bytes
@@ -0,0 +1,146 @@
+import threading
+from typing import (
+    Any,
+    List,
+    Tuple,
+)
+
+import pytest
+
+from sds.utils.core.log_pipeline import (
+    LogPipeline,
+    OverflowPolicy,
+)
+
+
+class BlockingWriter:
+    """A batch writer that waits to be released, so the records pile up in the queue."""
+
+    def __init__(self):
+        self.written: List[Any] = []
+        self.released = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self, batch: List[Any]) -> None:
+        self.started.set()
+        self.released.wait(timeout=5)
+        self.written.extend(batch)
+
+
+@pytest.fixture
+def writer():
+    blocking_writer = BlockingWriter()
+    yield blocking_writer
+    blocking_writer.released.set()
+
+
+def create_pipeline(writer: BlockingWriter, overflow_policy: OverflowPolicy, dropped: List[Tuple[int, int]]):
+    """A pipeline of one record, whose writer holds the first record until it's released."""
+    log_pipeline = LogPipeline(
+        writer,
+        max_size=1,
+        batch_size=10,
+        overflow_policy=overflow_policy,
+        on_dropped=lambda count, total: dropped.append((count, total)),
+    )
+    assert log_pipeline.put("first")
+    assert writer.started.wait(timeout=5)
+    return log_pipeline
+
+
+def test_block_waits_for_room_in_the_queue(writer):
+    log_pipeline = create_pipeline(writer, OverflowPolicy.BLOCK, [])
+    assert log_pipeline.put("second")
+
+    third_put = threading.Thread(target=log_pipeline.put, args=("third",))
+    third_put.start()
+    third_put.join(timeout=0.1)
+    assert third_put.is_alive()
+
+    writer.released.set()
+    third_put.join(timeout=5)
+    assert log_pipeline.flush(timeout=5)
+    assert writer.written == ["first", "second", "third"]
+    assert log_pipeline.dropped_count == 0
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, put_result, expected_written",
+    [
+        (OverflowPolicy.DROP_OLDEST, True, ["first", "third"]),
+        (OverflowPolicy.DROP_NEWEST, False, ["first", "second"]),
+    ],
+)
+def test_dropped_records_are_reported(writer, overflow_policy, put_result, expected_written):
+    dropped: List[Tuple[int, int]] = []
+    log_pipeline = create_pipeline(writer, overflow_policy, dropped)
+    assert log_pipeline.put("second")
+
+    assert log_pipeline.put("third") is put_result
+
+    writer.released.set()
+    assert log_pipeline.flush(timeout=5)
+    assert writer.written == expected_written
+    assert log_pipeline.dropped_count == 1
+    # Reported by the writer thread, with the next batch
+    assert dropped == [(1, 1)]
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, expected_written",
+    [
+        # The oldest droppable record is dropped instead
+        (OverflowPolicy.DROP_OLDEST, ["first", "error", "other error"]),
+        (OverflowPolicy.DROP_NEWEST, ["first", "second", "error", "other error"]),
+    ],
+)
+def test_records_that_are_not_droppable_are_never_dropped(writer, overflow_policy, expected_written):
+    log_pipeline = create_pipeline(writer, overflow_policy, [])
+    assert log_pipeline.put("second")
+
+    # The queue grows beyond its maximum size, without waiting
+    assert log_pipeline.put("error", droppable=False)
+    assert log_pipeline.put("other error", droppable=False)
+    assert not log_pipeline.put("third")
+
+    writer.released.set()
+    assert log_pipeline.flush(timeout=5)
+    assert writer.written == expected_written
+
+
+def test_flush_times_out_while_records_are_pending(writer):
+    log_pipeline = create_pipeline(writer, OverflowPolicy.BLOCK, [])
+
+    assert not log_pipeline.flush(timeout=0.05)
+
+    writer.released.set()
+    assert log_pipeline.flush(timeout=5)
+
+
+def test_close_writes_the_pending_records(writer):
+    log_pipeline = create_pipeline(writer, OverflowPolicy.BLOCK, [])
+    assert log_pipeline.put("second")
+
+    writer.released.set()
+    log_pipeline.close(timeout=5)
+
+    assert writer.written == ["first", "second"]
+    assert log_pipeline.closed
+    assert not log_pipeline.put("after close")
+
+
+def test_writer_thread_survives_a_failing_writer():
+    written: List[Any] = []
+
+    def fail_once(batch: List[Any]) -> None:
+        if batch == ["fail"]:
+            raise ValueError("handler failed")
+        written.extend(batch)
+
+    log_pipeline = LogPipeline(fail_once)
+    log_pipeline.put("fail")
+    assert log_pipeline.flush(timeout=5)
+    log_pipeline.put("next")
+    log_pipeline.close(timeout=5)
+
+    assert written == ["next"]
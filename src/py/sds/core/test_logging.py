@@ -0,0 +1,401 @@
+import asyncio
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import timeit
+from types import FrameType
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+
+import pytest
+
+from sds.utils.core.config import Config
+from sds.utils.core.logging import (
+    GCP_SOURCE_LOCATION_FIELD,
+    GCP_SPAN_ID_FIELD,
+    GCP_TRACE_FIELD,
+    GCP_TRACE_SAMPLED_FIELD,
+    CallSiteMode,
+    Logger,
+    LogType,
+    _call_site_name,
+)
+
+APP_PACKAGE_NAME = "sds_test"
+
+
+@pytest.fixture
+def logger():
+    Config._set_instance({})
+    Logger.initialize(APP_PACKAGE_NAME)
+    Logger.set_level(logging.DEBUG)
+    yield Logger
+    Logger.shutdown()
+
+
+def logged_entries(caplog: pytest.LogCaptureFixture) -> List[List[str]]:
+    """Get the type|at|message fields of the entries written by the local writer."""
+    return [record.getMessage().split("|")[:3] for record in caplog.records if record.name == APP_PACKAGE_NAME]
+
+
+class Service:
+    def handle(self) -> None:
+        Logger.info("handled")
+
+    def handle_nested(self) -> None:
+        def nested() -> None:
+            Logger.warning("nested")
+
+        nested()
+
+
+def call_at_depth(depth: int, function: Callable[[], str]) -> str:
+    """Call a function with `depth` more frames on the stack."""
+    if depth == 0:
+        return function()
+    return call_at_depth(depth - 1, function)
+
+
+def full_stack_caller_name(skip: int = 2) -> str:
+    """The previous call site resolver, which walked the whole stack on every call."""
+    import inspect
+
+    frame: Optional[FrameType] = sys._getframe(1)
+    stack = []
+    while frame:
+        stack.append(frame)
+        frame = frame.f_back
+    if len(stack) < skip + 1:
+        return ""
+    parentframe = stack[skip]
+
+    name: List[str] = []
+    module = inspect.getmodule(parentframe)
+    if module is not None:
+        name.append(module.__name__)
+    if "self" in parentframe.f_locals:
+        name.append(parentframe.f_locals["self"].__class__.__name__)
+    if parentframe.f_code.co_name != "<module>":
+        name.append(parentframe.f_code.co_name)
+    return ".".join(name)
+
+
+def test_call_site_is_the_method_calling_the_logger(logger, caplog):
+    Service().handle()
+    Service().handle_nested()
+
+    assert logged_entries(caplog) == [
+        ["INFO", f"{__name__}.Service.handle", "handled"],
+        ["WARNING", f"{__name__}.Service.handle_nested.nested", "nested"],
+    ]
+
+
+def test_call_site_is_resolved_at_any_stack_depth(logger, caplog):
+    call_at_depth(500, lambda: Logger.info("deep"))
+
+    assert logged_entries(caplog) == [
+        ["INFO", f"{__name__}.test_call_site_is_resolved_at_any_stack_depth.<lambda>", "deep"]
+    ]
+
+
+def test_caller_name_beyond_the_stack_is_empty(logger):
+    assert Logger.caller_name(10_000) == ""
+
+
+def test_call_site_names_are_cached_with_a_bound():
+    assert _call_site_name.cache_info().maxsize == 1024
+
+
+def log_all() -> None:
+    Logger.info("info")
+    Logger.error("error")
+
+
+@pytest.mark.parametrize(
+    ("call_site_mode", "expected_call_sites"),
+    [
+        (CallSiteMode.ALWAYS, [f"{__name__}.log_all", f"{__name__}.log_all"]),
+        (CallSiteMode.WARNING_AND_ABOVE, ["", f"{__name__}.log_all"]),
+        (CallSiteMode.NEVER, ["", ""]),
+    ],
+)
+def test_call_site_mode(caplog, call_site_mode, expected_call_sites):
+    Config._set_instance({})
+    Logger.initialize(APP_PACKAGE_NAME, call_site_mode=call_site_mode)
+    Logger.set_level(logging.INFO)
+    log_all()
+    Logger.shutdown()
+
+    assert [at for _, at, _ in logged_entries(caplog)] == expected_call_sites
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("depth", [10, 50, 200])
+def test_benchmark_caller_name(logger, depth):
+    """Compares the per-call cost of the call site resolver with a full stack walk."""
+    number = 2000
+    bounded_seconds = min(timeit.repeat(lambda: call_at_depth(depth, Logger.caller_name), number=number, repeat=3))
+    full_stack_seconds = min(
+        timeit.repeat(lambda: call_at_depth(depth, full_stack_caller_name), number=number, repeat=3)
+    )
+
+    print(
+        f"depth {depth}: {bounded_seconds / number * 1e6:.2f} us per call "
+        f"(full stack walk: {full_stack_seconds / number * 1e6:.2f} us)"
+    )
+    # Both include the recursion to reach the depth, which is the same for both
+    assert bounded_seconds < full_stack_seconds
+
+
+def test_disabled_levels_build_nothing(logger, caplog):
+    Logger.set_level(logging.INFO)
+
+    def expensive_message() -> str:
+        raise AssertionError("The message of a disabled level must not be built")
+
+    Logger.debug(expensive_message)
+    Logger.debug("%s", expensive_message)
+
+    assert not Logger.is_enabled(LogType.DEBUG)
+    assert logged_entries(caplog) == []
+
+
+def test_level_change_invalidates_the_enabled_level(logger, caplog):
+    Logger.set_level(logging.INFO)
+    Logger.debug("hidden")
+    Logger.set_level(logging.DEBUG)
+    Logger.debug("lazy %s", "message")
+    Logger.debug(lambda: "lazy callable")
+
+    assert logged_entries(caplog) == [
+        ["DEBUG", f"{__name__}.test_level_change_invalidates_the_enabled_level", "lazy message"],
+        ["DEBUG", f"{__name__}.test_level_change_invalidates_the_enabled_level", "lazy callable"],
+    ]
+
+
+@pytest.mark.benchmark
+def test_benchmark_disabled_debug(logger):
+    """Compares the cost of a disabled Logger.debug call with a disabled stdlib debug call."""
+    Logger.set_level(logging.INFO)
+    stdlib_logger = logging.getLogger(APP_PACKAGE_NAME)
+    number = 100_000
+
+    disabled_seconds = min(timeit.repeat(lambda: Logger.debug("value %s", number), number=number, repeat=3))
+    stdlib_seconds = min(timeit.repeat(lambda: stdlib_logger.debug("value %s", number), number=number, repeat=3))
+
+    print(
+        f"disabled debug: {disabled_seconds / number * 1e9:.0f} ns per call "
+        f"(stdlib: {stdlib_seconds / number * 1e9:.0f} ns)"
+    )
+    assert disabled_seconds < stdlib_seconds * 1.5
+
+
+# The LogSeverity values of Cloud Logging
+GCP_LOG_SEVERITIES = {"DEFAULT", "DEBUG", "INFO", "NOTICE", "WARNING", "ERROR", "CRITICAL", "ALERT", "EMERGENCY"}
+
+
+@pytest.fixture
+def gcp_logger():
+    # The GCP setup replaces the handlers of the root logger
+    root_handlers = list(logging.root.handlers)
+    Config._set_instance({"logging": {"env": "gcp"}, "gcp": {"project_id": "sds-project"}})
+    Logger.initialize(APP_PACKAGE_NAME)
+    Logger.set_level(logging.DEBUG)
+    yield Logger
+    Logger.shutdown()
+    logging.root.handlers[:] = root_handlers
+
+
+def validate_structured_log_entry(line: str) -> dict:
+    """Check a stdout line is a structured log entry, as read by the Cloud Run logging agent."""
+    entry = json.loads(line)
+
+    assert isinstance(entry, dict)
+    assert entry["severity"] in GCP_LOG_SEVERITIES
+    assert isinstance(entry["message"], str)
+    assert isinstance(entry["timestamp"]["seconds"], int)
+    assert 0 <= entry["timestamp"]["nanos"] < 1_000_000_000
+    if GCP_SOURCE_LOCATION_FIELD in entry:
+        assert isinstance(entry[GCP_SOURCE_LOCATION_FIELD]["function"], str)
+    if GCP_TRACE_FIELD in entry:
+        assert re.fullmatch(r"projects/[^/]+/traces/[0-9a-f]{32}", entry[GCP_TRACE_FIELD])
+    if GCP_SPAN_ID_FIELD in entry:
+        assert re.fullmatch(r"[0-9a-f]{16}", entry[GCP_SPAN_ID_FIELD])
+    if GCP_TRACE_SAMPLED_FIELD in entry:
+        assert isinstance(entry[GCP_TRACE_SAMPLED_FIELD], bool)
+    return entry
+
+
+def test_gcp_entries_are_structured_logs(gcp_logger, capsys):
+    Logger.info("started")
+    Logger.fatal("failed", code=7, data=b"bytes")
+    Logger.api_request(
+        "/v1/orders",
+        {"id": 1},
+        {"ok": True},
+        status_code=201,
+        tracking_id="105445aa7843bc8bf206b12000100000/1;o=1",
+    )
+
+    entries = [validate_structured_log_entry(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [(entry["severity"], entry["type"], entry["message"]) for entry in entries] == [
+        ("INFO", "INFO", "started"),
+        ("CRITICAL", "FATAL", "failed"),
+        ("INFO", "API_REQUEST", "/v1/orders"),
+    ]
+    assert entries[0][GCP_SOURCE_LOCATION_FIELD] == {"function": f"{__name__}.test_gcp_entries_are_structured_logs"}
+    # The payload keeps its native JSON types
+    assert entries[1]["extra"] == {"code": 7, "data": "bytes"}
+    assert entries[2]["extra"]["response"] == {"payload": {"ok": True}, "status_code": 201}
+    assert entries[2][GCP_TRACE_FIELD] == "projects/sds-project/traces/105445aa7843bc8bf206b12000100000"
+    assert entries[2][GCP_SPAN_ID_FIELD] == "0000000000000001"
+    assert entries[2][GCP_TRACE_SAMPLED_FIELD] is True
+
+
+def test_gcp_exception_entries_have_a_stack_trace(gcp_logger, capsys):
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        Logger.exception("request failed")
+
+    (entry,) = [validate_structured_log_entry(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert entry["severity"] == "ERROR"
+    assert "RuntimeError: boom" in entry["stack_trace"]
+
+
+def test_gcp_timestamp_is_the_time_the_entry_was_logged(gcp_logger, capsys, monkeypatch):
+    create_gcp_log_entries = Logger._create_gcp_log_entries.__func__  # type: ignore[attr-defined]
+
+    def create_late_gcp_log_entries(cls, batch) -> None:
+        time.sleep(0.05)
+        create_gcp_log_entries(cls, batch)
+
+    # The entries are written by the background thread, well after they are logged
+    monkeypatch.setattr(Logger, "_create_gcp_log_entries", classmethod(create_late_gcp_log_entries))
+    Config._set_instance({"logging": {"env": "gcp", "async": {"enabled": True}}})
+    Logger.initialize(APP_PACKAGE_NAME)
+
+    logged_after_ns = time.time_ns()
+    Logger.info("queued")
+    logged_before_ns = time.time_ns()
+    Logger.shutdown()
+
+    (entry,) = [validate_structured_log_entry(line) for line in capsys.readouterr().out.splitlines()]
+
+    timestamp_ns = entry["timestamp"]["seconds"] * 1_000_000_000 + entry["timestamp"]["nanos"]
+    assert logged_after_ns <= timestamp_ns <= logged_before_ns
+    assert "timestamp_ns" not in entry
+
+
+def test_config_change_reports_the_entries_suppressed_by_the_previous_sampler(caplog):
+    logging_config = {"format": "%(message)s", "sampling": {"rate_limit": {"per_second": 0.001, "burst": 1}}}
+    Config._set_instance({"logging": logging_config})
+    Logger.initialize(APP_PACKAGE_NAME, call_site_mode=CallSiteMode.NEVER)
+    Logger.set_level(logging.INFO)
+    for i in range(3):
+        Logger.info("retrying %s", i)
+
+    Config._set_instance({"logging": {"format": "%(message)s"}})
+    Logger._on_config_change({}, {})
+    Logger.info("not sampled anymore")
+    Logger.shutdown()
+
+    assert [record.getMessage() for record in caplog.records if record.name == APP_PACKAGE_NAME] == [
+        "INFO||retrying 0|app:sds_test|",
+        "INFO||retrying 2|app:sds_test|extra:{'suppressed_count': 2}|",
+        "INFO||not sampled anymore|app:sds_test|",
+    ]
+
+
+def test_reloaded_config_changes_the_level(tmp_path, monkeypatch, caplog):
+    package_path = tmp_path / "sds_test_reload"
+    package_path.mkdir()
+    (package_path / "__init__.py").write_text("")
+    (package_path / "config.yaml").write_text("logging: {level: INFO}")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    # Only the callback of the logger is registered
+    monkeypatch.setattr(Config, "_change_callbacks", [])
+    monkeypatch.setattr(Logger, "_config_change_registered", False)
+    Config.initialize(package_path.name, watch=False)
+    Logger.initialize(APP_PACKAGE_NAME, call_site_mode=CallSiteMode.NEVER)
+    Logger.set_level(logging.INFO)
+
+    Logger.debug("hidden")
+    # Without a logging.format entry, the default format is used
+    (package_path / "config.yaml").write_text("logging: {level: DEBUG}")
+    assert Config.reload()
+    Logger.debug("shown")
+    Logger.shutdown()
+    sys.modules.pop(package_path.name, None)
+
+    assert Logger.is_enabled(LogType.DEBUG)
+    assert [record.getMessage() for record in caplog.records] == ["DEBUG||shown|app:sds_test|"]
+
+
+def test_shutdown_writes_the_entries_queued_in_async_mode(caplog):
+    Config._set_instance({"logging": {"format": "%(message)s", "async": {"enabled": True, "batch_size": 10}}})
+    Logger.initialize(APP_PACKAGE_NAME, call_site_mode=CallSiteMode.NEVER)
+    Logger.set_level(logging.INFO)
+
+    for i in range(100):
+        Logger.info("entry %s", i)
+    # As the entrypoints do when the job or the service stops
+    Logger.shutdown()
+    Logger.info("after shutdown")
+
+    records = [record for record in caplog.records if record.name == APP_PACKAGE_NAME]
+    assert [record.getMessage() for record in records] == [f"INFO||entry {i}|app:sds_test|" for i in range(100)] + [
+        "INFO||after shutdown|app:sds_test|"
+    ]
+    assert all(record.thread != threading.get_ident() for record in records[:-1])
+    assert records[-1].thread == threading.get_ident()
+
+
+def test_entries_logged_from_an_event_loop_are_written_by_a_background_thread(logger, caplog):
+    async def handle() -> None:
+        Logger.info("from the event loop")
+
+    asyncio.run(handle())
+    assert Logger.flush(timeout=5)
+
+    (record,) = [record for record in caplog.records if record.name == APP_PACKAGE_NAME]
+    assert record.getMessage().startswith("INFO|")
+    assert record.thread != threading.get_ident()
+
+
+def test_only_the_entries_logged_from_an_event_loop_are_enqueued(logger, caplog):
+    async def handle() -> None:
+        Logger.info("from the event loop")
+
+    asyncio.run(handle())
+    Logger.info("from the main thread")
+    assert Logger.flush(timeout=5)
+
+    threads = {record.getMessage().split("|")[2]: record.thread for record in caplog.records}
+    assert threads["from the event loop"] != threading.get_ident()
+    assert threads["from the main thread"] == threading.get_ident()
+
+
+def test_exceptions_logged_from_an_event_loop_are_written_after_the_enqueued_entries(logger, caplog):
+    async def handle() -> None:
+        for i in range(100):
+            Logger.info("entry %s", i)
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            Logger.exception("failed")
+
+    asyncio.run(handle())
+    assert Logger.flush(timeout=5)
+
+    entries = logged_entries(caplog)
+    assert [message for _, _, message in entries] == [f"entry {i}" for i in range(100)] + ["failed"]
+    assert caplog.records[-1].exc_info is not None
@@ -0,0 +1,86 @@
+import math
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+)
+
+import pytest
+
+from sds.utils.core.metrics import (
+    Histogram,
+    MetricsAggregator,
+    MetricType,
+)
+
+
+@pytest.fixture
+def aggregator():
+    flushed: List[Tuple[str, Dict[str, Any]]] = []
+    metrics_aggregator = MetricsAggregator(lambda key, summary: flushed.append((key, summary)), interval_seconds=3600)
+    yield metrics_aggregator, flushed
+    metrics_aggregator.close()
+
+
+def test_histogram_percentiles_have_a_bounded_relative_error():
+    histogram = Histogram()
+    for value in range(1, 10001):
+        histogram.record(value)
+
+    p50, p95, p99 = histogram.percentiles([0.5, 0.95, 0.99])
+
+    max_relative_error = 1 / (2 * Histogram.SUB_BUCKETS)
+    assert p50 == pytest.approx(5000, rel=max_relative_error)
+    assert p95 == pytest.approx(9500, rel=max_relative_error)
+    assert p99 == pytest.approx(9900, rel=max_relative_error)
+
+
+def test_histogram_negative_and_zero_values():
+    histogram = Histogram()
+    for value in [-8, -4, 0, 0, 4]:
+        histogram.record(value)
+
+    summary = histogram.summary()
+
+    assert (summary["count"], summary["sum"], summary["min"], summary["max"]) == (5, -8, -8, 4)
+    assert summary["p50"] == 0
+    assert histogram.percentiles([0.2])[0] == pytest.approx(-8, rel=1 / 32)
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf, 10**400])
+def test_histogram_counts_non_finite_values_apart(value):
+    histogram = Histogram()
+    histogram.record(1)
+    histogram.record(value)
+
+    summary = histogram.summary()
+
+    assert histogram.non_finite_count == 1
+    assert (summary["count"], summary["sum"], summary["max"], summary["p99"]) == (1, 1, 1, 1)
+
+
+def test_aggregator_summaries(aggregator):
+    metrics_aggregator, flushed = aggregator
+    metrics_aggregator.record("FETCH_TIME", 10.0, "ms")
+    metrics_aggregator.record("FETCH_TIME", math.nan, "ms")
+    metrics_aggregator.record("RETRY_COUNT", 2, metric_type=MetricType.COUNTER)
+    metrics_aggregator.record("RETRY_COUNT", 3)
+    metrics_aggregator.record("STATUS", "OK")
+    metrics_aggregator.record("STATUS", "OK")
+    metrics_aggregator.record("QUEUE_SIZE", 7, metric_type=MetricType.GAUGE)
+
+    metrics_aggregator.flush()
+    summaries = dict(flushed)
+
+    assert summaries["FETCH_TIME"]["count"] == 1
+    assert summaries["FETCH_TIME"]["non_finite_count"] == 1
+    assert summaries["FETCH_TIME"]["metric_unit"] == "ms"
+    assert summaries["RETRY_COUNT"] == {"metric_type": "COUNTER", "metric_unit": "", "count": 2, "sum": 5}
+    assert summaries["STATUS"]["values"] == {"OK": 2}
+    assert summaries["QUEUE_SIZE"]["last"] == 7
+
+    # Each flush only reports the metrics recorded since the previous one
+    flushed.clear()
+    metrics_aggregator.flush()
+    assert flushed == []
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from sds.utils.core import sampling
+from sds.utils.core.sampling import LogSampler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sampling.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_sample_rates():
+    log_sampler = LogSampler(sample_rates={"debug": 0, "info": 1})
+
+    assert not log_sampler.sample("DEBUG")
+    assert log_sampler.sample("INFO")
+    assert log_sampler.sample("WARNING")
+
+
+def test_rate_limit_reports_the_suppressed_count_with_the_next_entry(clock):
+    log_sampler = LogSampler(rate_limit_per_second=1, rate_limit_burst=2)
+
+    admitted = [log_sampler.admit("call_site", "INFO", f"message {i}") for i in range(5)]
+    clock[0] += 1
+
+    assert admitted == [0, 0, None, None, None]
+    assert log_sampler.admit("call_site", "INFO", "message 5") == 3
+    assert log_sampler.admit("other_call_site", "INFO", "message") == 0
+
+
+def test_rate_limited_entries_are_popped_when_the_call_site_stops_logging(clock):
+    log_sampler = LogSampler(rate_limit_per_second=1, rate_limit_burst=1)
+    for i in range(4):
+        log_sampler.admit("call_site", "WARNING", f"message {i}")
+
+    assert log_sampler.pop_suppressed() == [("WARNING", "message 3", 3)]
+    assert log_sampler.pop_suppressed() == []
+
+
+def test_duplicates_are_suppressed_during_the_window(clock):
+    log_sampler = LogSampler(dedup_window_seconds=10)
+
+    admitted = [log_sampler.admit("call_site", "ERROR", "failed") for _ in range(3)]
+    assert log_sampler.admit("call_site", "ERROR", "other failure") == 0
+    clock[0] += 10
+
+    assert admitted == [0, None, None]
+    assert log_sampler.admit("call_site", "ERROR", "failed") == 2
+    log_sampler.admit("call_site", "ERROR", "failed")
+    assert log_sampler.pop_suppressed() == [("ERROR", "failed", 1)]
+
+
+def test_least_recently_used_keys_are_evicted(clock):
+    log_sampler = LogSampler(dedup_window_seconds=10, max_keys=2)
+    for message in ["a", "b", "c"]:
+        log_sampler.admit("call_site", "INFO", message)
+
+    # "a" was evicted, so it's not a duplicate anymore
+    assert log_sampler.admit("call_site", "INFO", "a") == 0
+    assert log_sampler.admit("call_site", "INFO", "c") is None
+
+
+def test_evicted_keys_report_their_suppressed_count(clock):
+    log_sampler = LogSampler(rate_limit_per_second=1, rate_limit_burst=1, dedup_window_seconds=10, max_keys=1)
+    for message in ["a", "a", "a", "b"]:
+        log_sampler.admit("call_site", "INFO", message)
+    for i in range(3):
+        log_sampler.admit("other_call_site", "WARNING", f"message {i}")
+
+    # The duplicates of "a" were evicted by "b", and the first call site by the other one
+    assert sorted(log_sampler.pop_suppressed()) == [("INFO", "a", 2), ("INFO", "b", 1), ("WARNING", "message 2", 2)]
+    assert log_sampler.pop_suppressed() == []
+
+
+def test_suppressed_counts_are_reported_periodically(clock):
+    reports = []
+    report_sent = threading.Event()
+
+    def report_callback(suppressed) -> None:
+        reports.append(suppressed)
+        report_sent.set()
+
+    log_sampler = LogSampler(
+        rate_limit_per_second=1, rate_limit_burst=1, report_callback=report_callback, report_interval_seconds=0.01
+    )
+    for i in range(4):
+        log_sampler.admit("call_site", "WARNING", f"message {i}")
+
+    assert report_sent.wait(5)
+    log_sampler.admit("call_site", "WARNING", "message 4")
+    log_sampler.close()
+
+    assert reports == [[("WARNING", "message 3", 3)], [("WARNING", "message 4", 1)]]
+
+
+def test_samplers_without_call_site_limits_have_no_report_thread():
+    log_sampler = LogSampler(sample_rates={"debug": 0}, report_callback=print)
+
+    assert log_sampler._thread is None
+    log_sampler.close()
@@ -0,0 +1,118 @@
+import logging
+import threading
+from typing import List
+
+import pytest
+
+from sds.utils.core.checkpoint import (
+    Checkpoint,
+    LocalFileCheckpointBackend,
+)
+from sds.utils.core.config import Config
+from sds.utils.core.logging import Logger
+from sds.utils.core.sharding import (
+    get_task_items,
+    run_sharded,
+)
+
+
+@pytest.fixture
+def logger():
+    Config._set_instance({"logging": {"format": "%(message)s"}})
+    Logger.initialize("sds_test")
+    Logger.set_level(logging.DEBUG)
+    yield Logger
+    Logger.shutdown()
+
+
+@pytest.mark.parametrize("key", [None, str])
+def test_tasks_share_the_items_without_overlap(key):
+    task_items = [list(get_task_items(range(100), task_index, 3, key=key)) for task_index in range(3)]
+
+    assert sorted(item for items in task_items for item in items) == list(range(100))
+    assert all(items for items in task_items)
+
+
+def test_invalid_task_index():
+    with pytest.raises(ValueError, match="Invalid task index 3 for 3 tasks"):
+        list(get_task_items(range(10), 3, 3))
+
+
+def test_every_item_is_processed(logger):
+    processed: List[int] = []
+    lock = threading.Lock()
+
+    def process_item(item: int) -> None:
+        with lock:
+            processed.append(item)
+
+    result = run_sharded(range(95), process_item, shard_size=10, max_workers=2)
+
+    assert result.succeeded
+    assert (result.item_count, result.shard_count) == (95, 10)
+    assert sorted(processed) == list(range(95))
+
+
+def test_failed_items_are_retried_then_reported(logger):
+    attempts: List[int] = []
+
+    def process_item(item: int) -> None:
+        if item == 5:
+            attempts.append(item)
+            raise ValueError("failed")
+
+    result = run_sharded(range(20), process_item, shard_size=10, max_retries=2, retry_delay_seconds=0)
+
+    assert len(attempts) == 3
+    assert (result.item_count, result.shard_count) == (19, 1)
+    assert result.failed_shards == {0: [5]}
+
+
+def test_only_the_failed_items_are_processed_again(logger):
+    processed: List[int] = []
+    lock = threading.Lock()
+
+    def fail_once(item: int) -> None:
+        with lock:
+            processed.append(item)
+            if item % 4 == 0 and processed.count(item) == 1:
+                raise ValueError("failed")
+
+    result = run_sharded(range(20), fail_once, shard_size=10, max_retries=1, retry_delay_seconds=0)
+
+    assert result.succeeded
+    assert (result.item_count, result.shard_count) == (20, 2)
+    assert sorted(processed) == sorted(list(range(20)) + [0, 4, 8, 12, 16])
+
+
+def test_completed_items_are_skipped_on_restart(logger, tmp_path):
+    backend = LocalFileCheckpointBackend(str(tmp_path))
+
+    def fail_after_first_shard(item: int) -> None:
+        if item >= 10:
+            raise ValueError("failed")
+
+    with Checkpoint("job", backend, interval_items=1) as checkpoint:
+        run_sharded(range(20), fail_after_first_shard, shard_size=10, max_retries=0, checkpoint=checkpoint)
+
+    processed: List[int] = []
+    with Checkpoint("job", backend) as checkpoint:
+        result = run_sharded(range(20), processed.append, shard_size=10, max_workers=1, checkpoint=checkpoint)
+
+    assert result.succeeded
+    assert sorted(processed) == list(range(10, 20))
+    assert backend.load("job") == {str(item) for item in range(20)}
+
+
+def test_items_processed_before_a_failure_are_completed(logger, tmp_path):
+    backend = LocalFileCheckpointBackend(str(tmp_path))
+
+    def fail_on_5(item: int) -> None:
+        if item == 5:
+            raise ValueError("failed")
+
+    with Checkpoint("job", backend, interval_items=1) as checkpoint:
+        result = run_sharded(range(10), fail_on_5, shard_size=10, max_retries=0, checkpoint=checkpoint)
+
+    assert result.failed_shards == {0: [5]}
+    assert backend.load("job") == {str(item) for item in range(10) if item != 5}
@@ -0,0 +1,178 @@
+import asyncio
+import inspect
+import logging
+from typing import (
+    Any,
+    List,
+    Tuple,
+)
+
+import pytest
+
+from sds.utils.core.config import Config
+from sds.utils.core.logging import (
+    Logger,
+    LogType,
+)
+from sds.utils.core.spans import (
+    DisabledSpan,
+    Span,
+    _BaseSpan,
+    get_current_span,
+    pop_benchmark,
+    start_benchmark,
+)
+
+APP_PACKAGE_NAME = "sds_test"
+
+
+class SpanRecorder:
+    """Creates spans and keeps them once they are finished."""
+
+    def __init__(self):
+        self.finished_spans: List[Span] = []
+
+    def span(self, name: str, **attributes) -> Span:
+        return Span(name, attributes, self.span, self.finished_spans.append)
+
+
+@pytest.fixture
+def recorder():
+    yield SpanRecorder()
+    # The benchmark of the spans is collected per context, like the one of a request
+    pop_benchmark()
+
+
+@pytest.fixture
+def log_entries(monkeypatch):
+    Config._set_instance({"logging": {"format": "%(message)s"}})
+    Logger.initialize(APP_PACKAGE_NAME)
+    Logger.set_level(logging.DEBUG)
+    entries: List[Tuple[LogType, dict]] = []
+    monkeypatch.setattr(Logger, "_logging_writer", lambda log_type, log_entry: entries.append((log_type, log_entry)))
+    yield entries
+    Logger.shutdown()
+    pop_benchmark()
+
+
+def test_base_span_is_abstract(recorder):
+    with pytest.raises(TypeError):
+        _BaseSpan("REQUEST", {}, recorder.span)  # type: ignore[abstract]
+
+
+def test_nested_spans_are_children_of_the_enclosing_span(recorder):
+    with recorder.span("REQUEST") as request_span:
+        with recorder.span("FETCH") as fetch_span:
+            assert get_current_span() is fetch_span
+        with recorder.span("PARSE") as parse_span:
+            pass
+        assert get_current_span() is request_span
+    assert get_current_span() is None
+
+    assert request_span.parent is None
+    assert fetch_span.parent is request_span
+    assert parse_span.parent is request_span
+    assert fetch_span.path == "REQUEST/FETCH"
+    assert len({request_span.span_id, fetch_span.span_id, parse_span.span_id}) == 3
+    assert recorder.finished_spans == [fetch_span, parse_span, request_span]
+    assert request_span.elapsed_ns >= fetch_span.elapsed_ns + parse_span.elapsed_ns
+
+
+def test_failed_spans_record_the_error(recorder):
+    with pytest.raises(ValueError):
+        with recorder.span("PARSE"):
+            raise ValueError("invalid")
+
+    (parse_span,) = recorder.finished_spans
+    assert parse_span.attributes == {"error": "ValueError"}
+    assert get_current_span() is None
+
+
+def test_decorator_times_sync_and_async_functions(recorder):
+    @recorder.span("PARSE", source="file")
+    def parse(content: str) -> Any:
+        current_span = get_current_span()
+        return content.upper(), current_span.name if current_span is not None else None
+
+    @recorder.span("FETCH")
+    async def fetch(key: str) -> Any:
+        await asyncio.sleep(0)
+        current_span = get_current_span()
+        return key, current_span.name if current_span is not None else None
+
+    assert parse.__name__ == "parse"
+    assert inspect.iscoroutinefunction(fetch)
+
+    assert parse("content") == ("CONTENT", "PARSE")
+    assert asyncio.run(fetch("key")) == ("key", "FETCH")
+    # Every call has its own span
+    assert parse("content") == ("CONTENT", "PARSE")
+
+    assert [span.name for span in recorder.finished_spans] == ["PARSE", "FETCH", "PARSE"]
+    assert recorder.finished_spans[0] is not recorder.finished_spans[2]
+    assert recorder.finished_spans[0].attributes == {"source": "file"}
+
+
+def test_current_span_propagates_to_asyncio_tasks(recorder):
+    async def fetch(name: str) -> Span:
+        with recorder.span(name) as fetch_span:
+            # Let the other task start its span in between
+            await asyncio.sleep(0)
+            assert get_current_span() is fetch_span
+        return fetch_span
+
+    async def handle_request() -> Tuple[Span, Tuple[Span, Span]]:
+        with recorder.span("REQUEST") as request_span:
+            fetch_spans = await asyncio.gather(fetch("FETCH_ORDERS"), fetch("FETCH_USERS"))
+        return request_span, fetch_spans
+
+    request_span, fetch_spans = asyncio.run(handle_request())
+
+    assert [fetch_span.parent for fetch_span in fetch_spans] == [request_span, request_span]
+    assert [fetch_span.path for fetch_span in fetch_spans] == ["REQUEST/FETCH_ORDERS", "REQUEST/FETCH_USERS"]
+
+
+def test_api_request_benchmark_has_the_span_timings(log_entries):
+    start_benchmark()
+    with Logger.span("REQUEST") as request_span:
+        assert isinstance(request_span, Span)
+        for _ in range(2):
+            with Logger.span("FETCH", source="db"):
+                pass
+    Logger.api_request("/v1/orders", {"id": 1}, {"ok": True}, status_code=200)
+
+    perf_entries = [log_entry for log_type, log_entry in log_entries if log_type == LogType.PERF]
+    (api_request_entry,) = [log_entry for log_type, log_entry in log_entries if log_type == LogType.API_REQUEST]
+
+    assert [perf_entry["at"] for perf_entry in perf_entries] == ["REQUEST/FETCH", "REQUEST/FETCH", "REQUEST"]
+    assert perf_entries[0]["extra"]["source"] == "db"
+    assert perf_entries[0]["extra"]["parent_span_id"] == request_span.span_id
+    assert perf_entries[2]["extra"]["parent_span_id"] is None
+
+    benchmark = api_request_entry["extra"]["benchmark"]
+    assert set(benchmark) == {"REQUEST", "FETCH"}
+    assert 0 <= benchmark["FETCH"] <= benchmark["REQUEST"]
+    # The benchmark belongs to a single request
+    assert pop_benchmark() is None
+
+
+def test_disabled_span_is_a_noop(log_entries):
+    Logger.set_level(logging.WARNING)
+
+    @Logger.span("PARSE")
+    def parse(content: str) -> str:
+        assert get_current_span() is None
+        return content.upper()
+
+    fetch_span = Logger.span("FETCH")
+    with fetch_span:
+        fetch_span.set_attribute("rows", 10)
+        assert get_current_span() is None
+
+    assert isinstance(fetch_span, DisabledSpan)
+    # Disabled spans without attributes are shared
+    assert Logger.span("FETCH") is fetch_span
+    assert fetch_span.attributes == {}
+    assert parse("content") == "CONTENT"
+    assert log_entries == []
+    assert pop_benchmark() is None